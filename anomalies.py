@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+# كشف الارتفاعات غير المعتادة في العدد اليومي لكل سلسلة (مقدّم خدمة × منطقة × شركة × نوع خدمة)
+# بمتوسط وتباين أسيّين (EWMA): كل يوم يُقارن بحالة السلسلة قبله (z = (x - μ) / σ)، ثم يُطوى فيها.
+# الحالة (μ، σ²، عدد الأيام المطوية وآخر يوم مطوي لكل مقدّم خدمة) تبقى بين نسخ البيانات، فنسخة
+# جديدة (إلحاق أسطر) تطوي الأيام الجديدة فقط من خلايا مكعب العدّ بدل المرور على التاريخ كله،
+# وكل يوم يحدّث آلاف السلاسل بعمليات مصفوفات. آخر يوم لكل مقدّم خدمة "مفتوح" (قد تُلحق به أسطر
+# أخرى): يُقيَّم ولا يُطوى حتى يظهر يوم بعده. إن تغيّرت أعداد أيام مطوية (ملف أُعيدت كتابته لا
+# إلحاق) تُبنى الحالة من جديد. مثل ingestion.py، هذا الملف لا يستورد streamlit.
+import numpy as np
+import pandas as pd
+
+from ingestion import DATE_COL
+
+PROVIDER_COL = "مقدم الخدمة (ملف)"
+SERIES_KEYS = [PROVIDER_COL, "المنطقة", "الشركة", "نوع الخدمة"]
+EWMA_ALPHA = 0.1        # نصف عمر ~7 أيام
+Z_THRESHOLD = 3.0
+MIN_COUNT = 3           # أقل عدد يومي يُعدّ ارتفاعًا (سلاسل متفرقة: 0 ثم 1 ليس موجة)
+WARMUP_DAYS = 14        # أيام مطوية قبل أول تنبيه للسلسلة
+VAR_FLOOR = 1.0
+ANOMALY_COLUMNS = SERIES_KEYS + ["التاريخ", "العدد", "المتوقع", "z", "اليوم مفتوح"]
+
+def empty_detector():
+    return {
+        "keys": pd.DataFrame(columns=SERIES_KEYS),   # صف لكل سلسلة بترتيب ظهورها
+        "index": {},                                  # مفاتيح السلسلة -> صفها
+        "mu": np.zeros(0), "var": np.zeros(0), "days": np.zeros(0, dtype=int),
+        "first": {},         # مقدّم الخدمة -> أول يوم له
+        "folded": {},        # مقدّم الخدمة -> آخر يوم مطوي
+        "folded_total": 0,   # مجموع الاتصالات في الأيام المطوية (فحص أن الإلحاق لم يغيّرها)
+        "flags": [],         # تنبيهات الأيام المطوية (إطارات بأعمدة ANOMALY_COLUMNS)
+        "open": pd.DataFrame(columns=ANOMALY_COLUMNS),   # تنبيهات آخر يوم مفتوح لكل مقدّم خدمة
+        "last_update": {"days": 0, "rebuilt": True, "cells": 0},   # أيام مطوية وخلايا مجمّعة في آخر تحديث
+    }
+
+def _copy_state(state):
+    """نسخة قابلة للتحديث: الحالة المحفوظة مشتركة بين الجلسات فلا تُعدَّل في مكانها."""
+    return {
+        **state,
+        "index": dict(state["index"]),
+        "mu": state["mu"].copy(), "var": state["var"].copy(), "days": state["days"].copy(),
+        "first": dict(state["first"]), "folded": dict(state["folded"]), "flags": list(state["flags"]),
+    }
+
+def _series_cells(cells: pd.DataFrame) -> pd.DataFrame:
+    """خلايا مجمّعة على (مفاتيح السلسلة، اليوم) بأنواعها الأصلية (رموز الفئات، بلا تحويل إلى نص)."""
+    keys = [k for k in SERIES_KEYS if k in cells.columns]
+    frame = cells.groupby(keys + [DATE_COL], observed=True, dropna=False, sort=False)["n"].sum().reset_index()
+    return frame.assign(**{k: "" for k in SERIES_KEYS if k not in keys})
+
+def _per_provider(codes, categories, days):
+    """يوم لكل خلية من قاموس مقدّم الخدمة -> يوم (NaT لمقدّم غير موجود فيه)، عبر رموز الفئات."""
+    by_code = pd.to_datetime(pd.Series(categories).map(days)).to_numpy(dtype="datetime64[ns]")
+    return by_code[codes]
+
+def _add_series(state, keys: pd.DataFrame):
+    """
+    صف السلسلة لكل خلية، ويضيف السلاسل الجديدة بحالة μ = σ² = 0 وأيام = أيام مقدّم خدمتها
+    المطوية (أي أصفار مطوية). المفاتيح تُحوَّل إلى نص (الفارغ "") للسلاسل المختلفة فقط.
+    """
+    group = keys.groupby(SERIES_KEYS, observed=True, dropna=False, sort=False).ngroup().to_numpy()
+    unique = keys.drop_duplicates()   # بترتيب رموز group
+    unique = pd.DataFrame({k: unique[k].astype(object).fillna("") for k in SERIES_KEYS})
+    key_tuples = list(unique.itertuples(index=False, name=None))
+    new = [t for t in key_tuples if t not in state["index"]]
+    if new:
+        start = len(state["mu"])
+        state["index"].update({t: start + i for i, t in enumerate(new)})
+        state["keys"] = pd.concat([state["keys"], pd.DataFrame(new, columns=SERIES_KEYS)], ignore_index=True)
+        folded_days = [
+            (state["folded"][t[0]] - state["first"][t[0]]).days + 1 if t[0] in state["folded"] else 0 for t in new
+        ]
+        state["mu"] = np.concatenate([state["mu"], np.zeros(len(new))])
+        state["var"] = np.concatenate([state["var"], np.zeros(len(new))])
+        state["days"] = np.concatenate([state["days"], np.array(folded_days, dtype=int)])
+    return np.array([state["index"][t] for t in key_tuples], dtype=np.int64)[group]
+
+def _score(state, rows, x):
+    """z لكل (سلسلة، عدد) مقابل حالة السلسلة الحالية، وقناع التنبيه."""
+    z = (x - state["mu"][rows]) / np.sqrt(np.maximum(state["var"][rows], VAR_FLOOR))
+    flag = (z >= Z_THRESHOLD) & (x >= MIN_COUNT) & (state["days"][rows] >= WARMUP_DAYS)
+    return z, flag
+
+def _flag_frame(state, rows, day, x, z, is_open):
+    frame = state["keys"].iloc[rows].reset_index(drop=True)
+    return frame.assign(**{
+        "التاريخ": day, "العدد": x, "المتوقع": state["mu"][rows], "z": z, "اليوم مفتوح": is_open,
+    })
+
+def update_detector(state, cube: pd.DataFrame):
+    """
+    يطوي في نسخة من state (أو حالة جديدة إن كانت None أو تغيّرت أيام مطوية) كل يوم بعد آخر يوم
+    مطوي لكل مقدّم خدمة وحتى اليوم الذي يسبق آخر يوم له، ثم يقيّم آخر يوم. الخلايا المطوية سابقًا
+    لا تُجمَّع ولا تُطوى مرة أخرى (تُجمع فقط للفحص). يعيد الحالة المحدّثة؛ state نفسها لا تتغير.
+    """
+    if PROVIDER_COL not in cube.columns or DATE_COL not in cube.columns:
+        return state if state is not None else empty_detector()
+    cells = cube.loc[cube[DATE_COL].notna() & (cube["n"] > 0)]
+    # مقدّم الخدمة كرموز فئات: الأيام لكل خلية بفهرسة مصفوفة، بلا تحويل كل الخلايا إلى نص
+    providers = pd.Categorical(cells[PROVIDER_COL])
+    codes, categories = providers.codes, providers.categories
+    dates = cells[DATE_COL].to_numpy(dtype="datetime64[ns]")
+    counts_n = cells["n"].to_numpy()
+    span = cells[DATE_COL].groupby(providers, observed=True).agg(["min", "max"])
+    first_day, last_day = span["min"].to_dict(), span["max"].to_dict()
+    if state is not None:
+        folded = dates <= _per_provider(codes, categories, state["folded"])
+        if int(counts_n[folded].sum()) != state["folded_total"]:
+            state = None
+    rebuilt = state is None
+    state = empty_detector() if state is None else _copy_state(state)
+    for p in last_day:
+        state["first"].setdefault(p, first_day[p])
+        state["folded"].setdefault(p, first_day[p] - pd.Timedelta(days=1))
+    folded_before = dict(state["folded"])
+
+    # الخلايا بعد آخر يوم مطوي فقط: الأيام الجديدة + آخر يوم (مفتوح) لكل مقدّم خدمة
+    recent = _series_cells(cells[dates > _per_provider(codes, categories, folded_before)])
+    rows = _add_series(state, recent[SERIES_KEYS])
+    recent_last = pd.to_datetime(recent[PROVIDER_COL].astype(object).map(last_day))
+    is_open = (recent[DATE_COL] == recent_last).to_numpy()
+    pending, pending_rows = recent[~is_open], rows[~is_open]
+    days = pd.date_range(
+        min((folded_before[p] for p in last_day), default=pd.Timestamp(0)) + pd.Timedelta(days=1),
+        max(last_day.values(), default=pd.Timestamp(0)) - pd.Timedelta(days=1),
+    )
+    if len(days):
+        # مصفوفة (سلسلة × يوم) للأيام الجديدة فقط
+        flat = pending_rows * len(days) + days.get_indexer(pending[DATE_COL])
+        counts = np.bincount(flat, weights=pending["n"].to_numpy(dtype=float), minlength=len(state["mu"]) * len(days))
+        counts = counts.reshape(len(state["mu"]), len(days))
+        series_provider = state["keys"][PROVIDER_COL]
+        start = pd.to_datetime(series_provider.map(folded_before)).to_numpy()
+        stop = (pd.to_datetime(series_provider.map(last_day)) - pd.Timedelta(days=1)).to_numpy()
+        for j, day in enumerate(days.to_numpy()):
+            active = np.flatnonzero((day > start) & (day <= stop))
+            x = counts[active, j]
+            z, flag = _score(state, active, x)
+            if flag.any():
+                state["flags"].append(_flag_frame(state, active[flag], day, x[flag], z[flag], False))
+            diff = x - state["mu"][active]
+            incr = EWMA_ALPHA * diff
+            state["mu"][active] += incr
+            state["var"][active] = (1 - EWMA_ALPHA) * (state["var"][active] + diff * incr)
+            state["days"][active] += 1
+    for p in last_day:
+        state["folded"][p] = max(folded_before[p], last_day[p] - pd.Timedelta(days=1))
+    state["folded_total"] += int(pending["n"].sum())
+
+    # آخر يوم لكل مقدّم خدمة: يُقيَّم مقابل الحالة المطوية ولا يُطوى
+    open_rows, x = rows[is_open], recent["n"].to_numpy(dtype=float)[is_open]
+    z, flag = _score(state, open_rows, x)
+    state["open"] = _flag_frame(state, open_rows[flag], recent[DATE_COL].to_numpy()[is_open][flag], x[flag], z[flag], True)
+    state["last_update"] = {"days": len(days), "rebuilt": rebuilt, "cells": len(recent)}
+    return state
+
+def anomaly_table(state) -> pd.DataFrame:
+    """كل التنبيهات (الأيام المطوية + آخر يوم مفتوح)، الأحدث أولًا ثم الأعلى z."""
+    frames = [f for f in state["flags"] + [state["open"]] if len(f)]
+    if not frames:
+        return pd.DataFrame(columns=ANOMALY_COLUMNS)
+    table = pd.concat(frames, ignore_index=True)
+    return table.sort_values(["التاريخ", "z"], ascending=[False, False], kind="stable", ignore_index=True)
@@ -1,22 +1,48 @@
 # -*- coding: utf-8 -*-
-import os, glob, io, base64, re
+import os, sys, glob, io, base64, re, threading
+from collections import OrderedDict
+from concurrent.futures import BrokenExecutor
 import numpy as np
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
+import plotly.io as pio
 import streamlit as st
 import matplotlib.pyplot as plt
 from wordcloud import WordCloud
 import arabic_reshaper
 from bidi.algorithm import get_display
+from ingestion import (
+    MONTH_ORDER, MONTH_AR,
+    INGEST_PIPELINE_VERSION, snapshot_dir, read_snapshot_manifest, write_snapshot_manifest,
+    write_snapshot, read_snapshot, file_fingerprint,
+    ingest_worker_count, make_ingest_pool, ingest_file, ingest_files, payload_to_frame,
+    should_stream, is_append_of, read_appended_rows, append_provider_rows, bad_lines_message,
+    unify_categories, frame_memory_report, build_row_index, rows_in_ranges,
+    intersect_rows, union_rows,
+    build_date_index, rows_in_date_range, date_range_bounds,
+    build_count_cube, build_search_index, search_rows, structure_bytes, freeze_arrays,
+    PHONE_COL, PHONE_WIDTH_COL, phone_digits,
+)
+from query_engine import (
+    open_engine, register_calls, query_months, query_week_firsts, query_rows, query_cube,
+    query_count, query_page,
+)
+from forecasting import (
+    fit_month_forecast, trend_at, batch_month_forecast, fit_period_forecast, GRANULARITIES, MODEL_LABELS,
+)
+from anomalies import update_detector, anomaly_table, SERIES_KEYS, Z_THRESHOLD, MIN_COUNT, WARMUP_DAYS
+from staffing import (
+    staffing_table, DEFAULT_AHT_SECONDS, DEFAULT_SERVICE_LEVEL, DEFAULT_ANSWER_SECONDS, DEFAULT_OPEN_HOURS,
+)
 
 
-# ========== (إضافة جديدة) سكikit-learn اختياري للتنبؤ ==========
-_SK_OK = True
+# ========== psutil اختياري لقراءة ذاكرة العملية ==========
+_PSUTIL_OK = True
 try:
-    from sklearn.linear_model import LinearRegression
+    import psutil
 except Exception:
-    _SK_OK = False
+    _PSUTIL_OK = False
 # ============================================================
 
 # =============== إعداد عام + شعار ===============
@@ -67,10 +93,6 @@ st.set_page_config(page_title="تقرير قسم خدمة العملاء 2025",
 if "theme_mode" not in st.session_state:
     st.session_state["theme_mode"] = "dark"
 
-if "figures" not in st.session_state:
-    st.session_state["figures"] = {}
-figures = st.session_state["figures"]
-
 # =============== Design System Variables ===============
 DESIGN_TOKENS = {
     "dark": {
@@ -494,10 +516,7 @@ st.markdown(
 
 
 # =============== إعداد الشهور وترجَمات الأسماء ===============
-MONTH_ORDER = ["Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]  # المعتمدة
-MONTH_INDEX = {m:i for i,m in enumerate(MONTH_ORDER)}
-MONTH_MAP = {"Jan":1,"Feb":2,"Mar":3,"Apr":4,"May":5,"Jun":6,"Jul":7,"Aug":8,"Sep":9,"Oct":10,"Nov":11,"Dec":12}
-INV_MONTH_MAP = {v:k for k,v in MONTH_MAP.items()}
+# ثوابت الأشهر وخط المعالجة في ingestion.py (يستخدمها أيضًا عمّال التحميل المتوازي)
 
 PROVIDER_AR = {
     "Aljauhara": "الجوهرة",
@@ -515,335 +534,436 @@ def ar_to_provider(ar_name: str) -> str:
     return rev.get(ar_name, ar_name)
 
 # دالة مساعدة لترجمة أسماء الأشهر
-MONTH_AR = {
-    "Jul": "يوليو", "Aug": "أغسطس", "Sep": "سبتمبر", 
-    "Oct": "أكتوبر", "Nov": "نوفمبر", "Dec": "ديسمبر"
-}
 def month_to_ar(month: str) -> str:
     return MONTH_AR.get(month, month)
 
-# --- توحيد قيم الشهر (Oct/October/أكتوبر… -> Oct) ---
-MONTH_SYNONYMS = {
-    "jul": "Jul", "jul.": "Jul", "july": "Jul", "يوليو": "Jul",
-    "aug": "Aug", "aug.": "Aug", "august": "Aug", "أغسطس": "Aug", "اغسطس": "Aug",
-    "sep": "Sep", "sep.": "Sep", "september": "Sep", "سبتمبر": "Sep",
-    "oct": "Oct", "oct.": "Oct", "october": "Oct", "أكتوبر": "Oct", "اكتوبر": "Oct",
-    "nov": "Nov", "nov.": "Nov", "november": "Nov", "نوفمبر": "Nov",
-    "dec": "Dec", "dec.": "Dec", "december": "Dec", "ديسمبر": "Dec",
-}
-def normalize_month_value(val, dt):
-    # معالجة القيم الفارغة أو NaN
-    if pd.isna(val) or val is None:
-        if pd.notna(dt):
-            mnum = int(dt.month)
-            canon = INV_MONTH_MAP.get(mnum)
-            return canon if canon and canon in MONTH_ORDER else np.nan
-        return np.nan
-    
-    # تحويل إلى نص وتنظيف
-    s = str(val).strip()
-    if not s or s.lower() in ['nan', 'none', '']:
-        if pd.notna(dt):
-            mnum = int(dt.month)
-            canon = INV_MONTH_MAP.get(mnum)
-            return canon if canon and canon in MONTH_ORDER else np.nan
-        return np.nan
-    
-    # ✅ أولاً: فحص إذا كانت القيمة موجودة مباشرة في MONTH_ORDER
-    if s in MONTH_ORDER:
-        return s
-    
-    # البحث في المرادفات (case-insensitive)
-    s_lower = s.lower()
-    if s_lower in MONTH_SYNONYMS:
-        canon = MONTH_SYNONYMS[s_lower]
-        return canon if canon in MONTH_ORDER else np.nan
-    
-    # محاولة المطابقة مع أول 3 أحرف
-    if len(s) >= 3:
-        s_3 = s[:3].title()
-        if s_3 in MONTH_MAP:
-            canon = s_3
-            return canon if canon in MONTH_ORDER else np.nan
-    
-    # إذا فشل كل شيء ولكن التاريخ موجود، نستخدم التاريخ
-    if pd.notna(dt):
-        mnum = int(dt.month)
-        canon = INV_MONTH_MAP.get(mnum)
-        return canon if canon and canon in MONTH_ORDER else np.nan
-    
-    return np.nan
-
-# =============== توحيد الأعمدة ===============
-def normalize_columns(df: pd.DataFrame) -> pd.DataFrame:
-    if df is None or df.empty:
-        return df
-    df = df.rename(columns=lambda c: str(c).strip())
-    mapping = {
-        "التاريخ ": "التاريخ",
-        "Date": "التاريخ", "date": "التاريخ",
-        "المنطقه": "المنطقة",
-        "المدينه ": "المدينة", "المدينه": "المدينة",
-        "الخدمة المطلوبة": "الخدمه المطلوبه",
-        "نوع الخدمه": "نوع الخدمة",
-        "اسم العميل ": "اسم العميل",
-        "رقم الجوال ": "رقم الجوال",
+# أسماء العرض العربية التي يطابقها البحث أيضًا (فهرس البحث ومحرك SQL)
+SEARCH_ALIASES = {"مقدم الخدمة (ملف)": provider_to_ar, "الشهر": month_to_ar}
+
+# =============== كاش التحميل حسب بصمة الملف ===============
+# كل rerun في ستريمليت يعيد تنفيذ السكربت بالكامل، لذلك نحفظ الإطارات المعالجة
+# في مخزن مشترك (cache_resource) مفتاحه بصمة الملف: المسار + الحجم + mtime + hash المحتوى.
+# الملف الذي تغيّر فقط يُعاد تحليله، و "__ALL__" يُعاد بناؤه من الإطارات المخزّنة.
+# المخزن مرتبط بـ INGEST_PIPELINE_VERSION: رفع النسخة ينشئ مخزنًا جديدًا فارغًا ويُخلى القديم.
+@st.cache_resource(show_spinner=False, max_entries=1)
+def get_ingest_cache(pipeline_version=INGEST_PIPELINE_VERSION):
+    return {
+        "lock": threading.Lock(),
+        "files": {},        # path -> {"fingerprint", "provider", "df", "messages", "bad_lines"}
+        "all": None,        # {"key": مفتاح البصمات, "df": __ALL__, "ranges": provider -> (start, stop), "views", "index", "dates", "week_month", "cube", "search", "sort_orders", "forecasts", "bytes", "lock"}
+        "hits": 0,
+        "misses": 0,
+        "report": [],       # تقرير آخر تحميل (إصابة/إخفاق لكل ملف)
+        "memory": None,     # {"before", "after"} بالبايت للإطار الأساسي __ALL__ (يُحسب مع كل إعادة بناء)
+        "evictions": {"sort_orders": 0, "search": 0},   # إخلاءات ميزانية الذاكرة منذ تشغيل الخادم
+        "anomalies": None,  # {"key", "state", "table"}: كاشف الارتفاعات؛ حالته تبقى بين النسخ (anomaly_alerts)
+    }
+
+# =============== مجمّع عمليات التحميل المتوازي ===============
+# يبقى حيًّا بين الـ reruns؛ العمّال (spawn) يُنشؤون عند الحاجة فقط.
+@st.cache_resource(show_spinner=False)
+def get_ingest_pool(workers):
+    return make_ingest_pool(workers) if workers > 1 else None
+
+# =============== محرك SQL اختياري (DuckDB/SQLite) ===============
+# CALLCENTER_QUERY_ENGINE = pandas (الافتراضي) | auto | duckdb | sqlite | postgres. مع محرك SQL
+# تُسجَّل كل نسخة بيانات جدولًا مرة واحدة (query_engine.py)، وتُجاب أسئلة المرشّحات والمكعب
+# والبحث وصفحات الجدول التفصيلي باستعلامات في القاعدة. CALLCENTER_QUERY_DB ملف قاعدة البيانات
+# (افتراضيًا في الذاكرة)، ومع postgres هو DSN الاتصال (مجمّع psycopg_pool بحد
+# CALLCENTER_PG_POOL_MAX). أي فشل في فتح المحرك أو التسجيل يعيد التطبيق لمسار pandas.
+QUERY_ENGINE_ENV = "CALLCENTER_QUERY_ENGINE"
+QUERY_DB_ENV = "CALLCENTER_QUERY_DB"
+
+@st.cache_resource(show_spinner=False)
+def get_query_engine(kind, path):
+    if kind == "pandas":
+        return None
+    try:
+        return open_engine(kind, path)
+    except Exception as e:
+        return {"error": f"{type(e).__name__}: {e}"}
+
+# =============== كاش النتائج لكل تركيبة تصفية (LRU مشترك بين الجلسات) ===============
+# المفتاح: (نسخة البيانات، قيم كل مرشّح مختار، نطاق التاريخ، الثيم). القيمة: KPIs والنصوص
+# وأشكال Plotly الجاهزة وصورة سحابة الكلمات، فالتنقل بين الاختيارات لا يعيد بناءها.
+# الأشكال المحفوظة مشتركة بين الجلسات فتُعامل للقراءة فقط (st.plotly_chart لا يعدّلها).
+# الحدود من CALLCENTER_RESULT_CACHE_ENTRIES و CALLCENTER_RESULT_CACHE_MB (0 = تعطيل).
+RESULT_CACHE_ENTRIES_ENV = "CALLCENTER_RESULT_CACHE_ENTRIES"
+RESULT_CACHE_MB_ENV = "CALLCENTER_RESULT_CACHE_MB"
+RESULT_CACHE_ENTRIES = 64
+RESULT_CACHE_MB = 64
+
+@st.cache_resource(show_spinner=False)
+def get_result_cache():
+    return {
+        "lock": threading.Lock(),
+        "entries": OrderedDict(),   # key -> (results, bytes) بترتيب الاستخدام (الأقدم أولًا)
+        "version": None,            # نسخة البيانات الحالية؛ تغيّرها يفرّغ الكاش
+        "bytes": 0,
+        "hits": 0,
+        "misses": 0,
+        "evictions": 0,
     }
-    df = df.rename(columns={c: mapping.get(c, c) for c in df.columns})
-    return df
-
-# =============== بناء التاريخ من (الشهر + اليوم) ===============
-def build_date_from_month_day(row: pd.Series):
-    # محاولة قراءة التاريخ مباشرة إذا كان موجوداً بتنسيق تاريخ
-    raw_date = row.get("التاريخ","")
-    if pd.notna(raw_date) and raw_date != "":
-        raw_str = str(raw_date).strip()
-        if "/" in raw_str or "-" in raw_str:
-            dt = pd.to_datetime(raw_str, dayfirst=True, errors="coerce")
-            if pd.notna(dt):
-                return dt
-    
-    # محاولة بناء التاريخ من الشهر واليوم
-    month_val = row.get("الشهر","")
-    day_val = row.get("التاريخ","")
-    
-    # معالجة الشهر
-    month_str = ""
-    if pd.notna(month_val) and month_val != "":
-        month_str = str(month_val).strip()
-    
-    # إذا كان الشهر في MONTH_MAP مباشرة (مثل "Nov", "Oct")
-    if month_str in MONTH_MAP:
-        try:
-            # محاولة استخراج اليوم من عمود التاريخ
-            day_str = str(day_val).strip() if pd.notna(day_val) and day_val != "" else "1"
-            # إزالة أي تنسيقات تاريخية
-            if "/" in day_str:
-                day_str = day_str.split("/")[0].strip()
-            elif "-" in day_str:
-                day_str = day_str.split("-")[0].strip()
-            day = int(float(day_str)) if day_str and day_str.replace(".","").isdigit() else 1
-            # التأكد من أن اليوم صحيح (1-31)
-            day = max(1, min(31, day))
-            return pd.Timestamp(year=2025, month=MONTH_MAP[month_str], day=day)
-        except (ValueError, TypeError) as e:
-            # إذا فشل، نرجع NaT
-            return pd.NaT
-    
-    # محاولة استخدام normalize_month_value للشهر
-    if month_str:
-        month_lower = month_str.lower()
-        if month_lower in MONTH_SYNONYMS:
-            canon_month = MONTH_SYNONYMS[month_lower]
-            if canon_month in MONTH_MAP:
-                try:
-                    day_str = str(day_val).strip() if pd.notna(day_val) and day_val != "" else "1"
-                    if "/" in day_str:
-                        day_str = day_str.split("/")[0].strip()
-                    elif "-" in day_str:
-                        day_str = day_str.split("-")[0].strip()
-                    day = int(float(day_str)) if day_str and day_str.replace(".","").isdigit() else 1
-                    day = max(1, min(31, day))
-                    return pd.Timestamp(year=2025, month=MONTH_MAP[canon_month], day=day)
-                except (ValueError, TypeError):
-                    return pd.NaT
-    
-    return pd.NaT
-
-# =============== أسابيع الأحد→السبت وترقيمها داخل الشهر ===============
-def add_week_columns(df: pd.DataFrame) -> pd.DataFrame:
-    if df.empty or "التاريخ/Date" not in df.columns:
-        df["ISO_Year"]=np.nan; df["ISO_Week"]=np.nan
-        df["WeekStart"]=pd.NaT; df["WeekEnd"]=pd.NaT
-        df["رقم الأسبوع"]=np.nan; df["وسم الأسبوع"]=""
-        return df
-
-    d = df.copy()
-    wd = d["التاريخ/Date"].dt.weekday              # Monday=0..Sunday=6
-    start_offset = (wd + 1) % 7                     # للأحد
-    d["WeekStart"] = d["التاريخ/Date"] - pd.to_timedelta(start_offset, unit="D")
-    d["WeekEnd"]   = d["WeekStart"] + pd.to_timedelta(6, unit="D")  # السبت (أسبوع كامل)
-
-    d["ISO_Year"]  = d["WeekStart"].dt.isocalendar().year
-    d["ISO_Week"]  = d["WeekStart"].dt.isocalendar().week
-
-    if "الشهر" in d.columns:
-        # نستخدم التاريخ الفعلي (WeekStart) كـ identifier موحّد بدلاً من ترقيم منفصل لكل مقدم خدمة
-        # هذا يضمن أن نفس الأسبوع له نفس الوسم في جميع الملفات
-        def label_week(ws, we, month):
-            if pd.isna(ws) or pd.isna(we):
-                return ""
-            month_name_ar = MONTH_AR.get(month, month)
-            # نستخدم التاريخ الفعلي للأسبوع كـ identifier
-            return f"{month_name_ar} - الأسبوع ({ws.strftime('%d/%m')}–{we.strftime('%d/%m')})"
-        
-        d["وسم الأسبوع"] = [
-            label_week(ws, we, m) 
-            for ws, we, m in zip(d["WeekStart"], d["WeekEnd"], d["الشهر"])
-        ]
-        
-        # رقم الأسبوع يُحسب بناءً على ترتيب WeekStart داخل كل شهر
-        # لكن الوسم يعتمد على التاريخ الفعلي فقط
-        def rank_weeks_in_month(g):
-            mnum = MONTH_MAP.get(g.name, None)
-            if not mnum:
-                gg = g.copy()
-                gg["رقم الأسبوع"] = np.nan
-                return gg
-            
-            # جمع كل الأسابيع الفريدة في هذا الشهر (بناءً على WeekStart)
-            weeks = (
-                g.dropna(subset=["WeekStart"])
-                [["WeekStart"]]
-                .drop_duplicates()
-                .sort_values("WeekStart")
-                .reset_index(drop=True)
-            )
-            weeks["rank"] = range(1, len(weeks) + 1)
-            rank_map = {ws: int(r) for ws, r in zip(weeks["WeekStart"], weeks["rank"])}
-            
-            gg = g.copy()
-            gg["رقم الأسبوع"] = gg["WeekStart"].map(rank_map).astype("float")
-            return gg
-        
-        d = d.groupby("الشهر", group_keys=False).apply(rank_weeks_in_month)
-    else:
-        d["رقم الأسبوع"] = np.nan
-        d["وسم الأسبوع"] = ""
 
-    return d
+def result_cache_limits():
+    try:
+        max_entries = int(os.environ.get(RESULT_CACHE_ENTRIES_ENV, "").strip() or RESULT_CACHE_ENTRIES)
+    except ValueError:
+        max_entries = RESULT_CACHE_ENTRIES
+    try:
+        max_mb = float(os.environ.get(RESULT_CACHE_MB_ENV, "").strip() or RESULT_CACHE_MB)
+    except ValueError:
+        max_mb = RESULT_CACHE_MB
+    return max(0, max_entries), max(0.0, max_mb) * (1 << 20)
+
+def result_size(value):
+    """حجم تقريبي بالبايت لنتائج صفحة (الأشكال بحجم مواصفاتها JSON، وصور base64 هي الغالبة)."""
+    if isinstance(value, go.Figure):
+        return len(pio.to_json(value, validate=False))
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(result_size(k) + result_size(v) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(result_size(v) for v in value)
+    return sys.getsizeof(value)
+
+def result_cache_get(key):
+    cache = get_result_cache()
+    with cache["lock"]:
+        item = cache["entries"].get(key)
+        if item is None:
+            cache["misses"] += 1
+            return None
+        cache["entries"].move_to_end(key)
+        cache["hits"] += 1
+        return item[0]
+
+def result_cache_put(key, results):
+    cache = get_result_cache()
+    size = result_size(results)
+    max_entries, max_bytes = result_cache_limits()
+    with cache["lock"]:
+        entries = cache["entries"]
+        if cache["version"] != key[0]:
+            # نسخة بيانات جديدة: نتائج النسخ السابقة لن تُطلب مجددًا
+            cache["version"] = key[0]
+            entries.clear()
+            cache["bytes"] = 0
+        if key in entries:
+            cache["bytes"] -= entries.pop(key)[1]
+        if max_entries == 0 or size > max_bytes:
+            return
+        entries[key] = (results, size)
+        cache["bytes"] += size
+        while len(entries) > max_entries or cache["bytes"] > max_bytes:
+            _, (_, evicted) = entries.popitem(last=False)
+            cache["bytes"] -= evicted
+            cache["evictions"] += 1
+
+# =============== ميزانية ذاكرة البيانات المشتركة ===============
+# البيانات نسخة واحدة للعملية كلها: الإطار الأساسي والفهارس والمكعب وفهرس البحث وترتيبات
+# الأعمدة في get_ingest_cache، والنتائج في get_result_cache، وكل الجلسات تقرأ منها فقط
+# (مصفوفات الفهارس للقراءة فقط)، فالذاكرة لا تكبر مع عدد المشاهدين. CALLCENTER_MEMORY_BUDGET_MB
+# حد لمجموعها (0 = بلا حد): عند تجاوزه تُخلى البنى التي يمكن إعادة بنائها بالترتيب: كاش
+# النتائج (الأقدم أولًا) ثم ترتيبات الأعمدة ثم فهرس البحث (يُعاد بناؤه عند أول بحث).
+# الإطار الأساسي وفهرس الصفوف والمكعب لا تُخلى؛ إن تجاوزت الميزانية وحدها لا نخلي شيئًا
+# (الإخلاء لن يبلغ الحد وسيعيد البناء في كل rerun) ويظهر ذلك في لوحة حالة الكاش.
+MEMORY_BUDGET_ENV = "CALLCENTER_MEMORY_BUDGET_MB"
+MEMORY_BUDGET_MB = 1024
+EVICTABLE_PARTS = ("results", "sort_orders", "search")
+
+def memory_budget_bytes():
+    try:
+        budget_mb = float(os.environ.get(MEMORY_BUDGET_ENV, "").strip() or MEMORY_BUDGET_MB)
+    except ValueError:
+        budget_mb = MEMORY_BUDGET_MB
+    return max(0.0, budget_mb) * (1 << 20)
+
+def shared_memory_report(all_state):
+    """البايتات المقيمة لكل بنية مشتركة في نسخة البيانات الحالية (وكاش النتائج)."""
+    sizes = dict(all_state["bytes"])
+    if all_state["search"] is None:
+        sizes["search"] = 0
+    sizes["sort_orders"] = sum(order.nbytes for order in list(all_state["sort_orders"].values()))
+    sizes["results"] = get_result_cache()["bytes"]
+    return sizes
+
+def enforce_memory_budget(all_state):
+    """يفرّغ نتائج النسخ القديمة، ثم يخلي البنى القابلة لإعادة البناء حتى يعود المجموع تحت الميزانية."""
+    results = get_result_cache()
+    with results["lock"]:
+        if results["version"] is not None and results["version"] != all_state["key"]:
+            results["version"] = all_state["key"]
+            results["entries"].clear()
+            results["bytes"] = 0
+    budget = memory_budget_bytes()
+    if not budget:
+        return
+    sizes = shared_memory_report(all_state)
+    excess = sum(sizes.values()) - budget
+    if excess <= 0 or excess > sum(sizes[part] for part in EVICTABLE_PARTS):
+        return
+    with results["lock"]:
+        entries = results["entries"]
+        while entries and excess > 0:
+            _, (_, size) = entries.popitem(last=False)
+            results["bytes"] -= size
+            results["evictions"] += 1
+            excess -= size
+    evictions = get_ingest_cache(INGEST_PIPELINE_VERSION)["evictions"]
+    if excess > 0 and sizes["sort_orders"]:
+        all_state["sort_orders"].clear()
+        evictions["sort_orders"] += 1
+        excess -= sizes["sort_orders"]
+    if excess > 0 and sizes["search"]:
+        all_state["search"] = None
+        evictions["search"] += 1
+
+def search_index(all_state):
+    """فهرس البحث للنسخة الحالية؛ يُبنى مرة أخرى (لكل الجلسات) إن أخلته ميزانية الذاكرة."""
+    index = all_state["search"]
+    if index is None:
+        with all_state["lock"]:
+            index = all_state["search"]
+            if index is None:
+                index = freeze_arrays(build_search_index(all_state["df"], aliases=SEARCH_ALIASES))
+                all_state["bytes"]["search"] = structure_bytes(index)
+                all_state["search"] = index
+    return index
 
 # =============== تحميل كل CSV مع معالجة الأخطاء ===============
 def load_all(folder="data"):
     files = sorted(glob.glob(os.path.join(folder, "*.csv")))
+    cache = get_ingest_cache(INGEST_PIPELINE_VERSION)
     datasets = {}
-    for path in files:
-        provider = os.path.splitext(os.path.basename(path))[0].strip()
-
-        df = None
-        err_msg = None
-        for attempt in range(2):
+    report = []
+
+    with cache["lock"]:
+        entries = cache["files"]
+        manifest = None         # يُقرأ فقط عند أول إخفاق في الذاكرة
+        manifest_dirty = False
+        status = {}
+        to_parse = []           # [(path, fingerprint)] ملفات تحتاج مسار CSV
+
+        def remember(path, fp, provider, payload, messages, bad_lines):
+            """يحفظ لقطة الملف ويحدّث manifest (payload = None لملف بلا بيانات: رسائله فقط)."""
+            nonlocal manifest_dirty
+            base = os.path.basename(path)
+            name = write_snapshot(folder, provider, payload) if payload is not None else None
+            if payload is None or name is not None:
+                manifest[base] = {"hash": fp["hash"], "size": fp["size"], "lines": fp["lines"],
+                                  "tail": fp["tail"], "ends_nl": fp["ends_nl"], "provider": provider,
+                                  "snapshot": name, "messages": messages, "bad_lines": bad_lines}
+            else:
+                manifest.pop(base, None)
+            manifest_dirty = True
+
+        # 1) الذاكرة (مع الإلحاق) ثم اللقطات العمودية
+        for path in files:
+            prev = entries.get(path)
+            fp = file_fingerprint(path, prev["fingerprint"] if prev else None)
+
+            if prev is not None and prev["fingerprint"]["hash"] == fp["hash"]:
+                prev["fingerprint"] = fp
+                status[path] = "hit"
+                cache["hits"] += 1
+                continue
+
+            cache["misses"] += 1
+            if manifest is None:
+                manifest = read_snapshot_manifest(folder)
+
+            snap = manifest.get(os.path.basename(path))
+            if snap is not None and snap["hash"] == fp["hash"]:
+                try:
+                    df = read_snapshot(folder, snap["snapshot"]) if snap["snapshot"] else None
+                    entries[path] = {"fingerprint": fp, "provider": snap["provider"], "df": df,
+                                     "messages": [tuple(m) for m in snap["messages"]],
+                                     "bad_lines": snap.get("bad_lines", [])}
+                    status[path] = "snapshot"
+                    continue
+                except Exception:
+                    pass
+
+            # إلحاق فقط (موظف أضاف صفوفًا في آخر ملفه): نحلّل الأسطر الجديدة وحدها وندمجها
+            # في الإطار الموجود في الذاكرة، أو في لقطة نسخة سابقة من الملف بعد إعادة التشغيل.
+            # اللقطة لا تُعاد كتابتها عند الإلحاق (تكلفتها بحجم الملف كاملًا)؛ تبقى صالحة
+            # كنقطة بداية لأن manifest يحفظ حجمها وعدد أسطرها و hash آخر بايتاتها.
+            base_entry = None
+            if prev is not None and prev["df"] is not None and fp["append_of"] == prev["fingerprint"]["hash"]:
+                base_entry = prev
+            elif snap is not None and snap["snapshot"] and is_append_of(path, snap, fp["size"]):
+                try:
+                    base_entry = {"provider": snap["provider"], "df": read_snapshot(folder, snap["snapshot"]),
+                                  "fingerprint": {"size": snap["size"], "lines": snap["lines"]},
+                                  "messages": [tuple(m) for m in snap["messages"]],
+                                  "bad_lines": snap.get("bad_lines", [])}
+                except Exception:
+                    base_entry = None
+            if base_entry is not None:
+                try:
+                    part, new_bad = read_appended_rows(path, base_entry["provider"], base_entry["fingerprint"]["size"],
+                                                       fp["size"], base_entry["fingerprint"]["lines"])
+                    df = append_provider_rows(base_entry["df"], part)
+                    bad_lines = base_entry["bad_lines"] + new_bad
+                    old_msg = bad_lines_message(path, base_entry["bad_lines"])
+                    messages = [m for m in base_entry["messages"] if m != old_msg]
+                    if bad_lines or old_msg in base_entry["messages"]:
+                        messages.append(bad_lines_message(path, bad_lines))
+                    entries[path] = {"fingerprint": fp, "provider": base_entry["provider"], "df": df,
+                                     "messages": messages, "bad_lines": bad_lines}
+                    if "memory" in base_entry and part is not None:
+                        part_memory = frame_memory_report(part)
+                        entries[path]["memory"] = {k: base_entry["memory"][k] + part_memory[k] for k in part_memory}
+                    status[path] = "append"
+                    continue
+                except Exception:
+                    pass        # نرجع للتحميل الكامل
+            to_parse.append((path, fp))
+
+        # 2) مسار CSV: تسلسلي أو عبر ProcessPoolExecutor حسب CALLCENTER_INGEST_WORKERS.
+        #    الملفات الكبيرة (should_stream) تُقرأ على أجزاء هنا مع شريط تقدّم.
+        if to_parse:
+            streamed = [p for p, _ in to_parse if should_stream(p)]
+            paths = [p for p, _ in to_parse if p not in streamed]
             try:
-                df = pd.read_csv(
-                    path,
-                    encoding="utf-8-sig",
-                    engine="python",
-                    on_bad_lines="skip",
-                    sep=",",
-                    quotechar='"',
-                    skipinitialspace=True
-                )
-                
-                # التحقق إذا كان الملف يحتوي على header صحيح
-                # إذا كانت أسماء الأعمدة كلها أرقام أو فارغة، فالملف لا يحتوي على header
-                first_row_values = df.iloc[0].values if not df.empty else []
-                col_names = df.columns.tolist()
-                
-                # إذا كانت أسماء الأعمدة كلها أرقام (0, 1, 2, ...) أو كانت القيمة الأولى تبدو كبيانات وليست header
-                is_header_missing = (
-                    all(str(c).isdigit() for c in col_names) or
-                    (len(col_names) > 0 and len(df) > 0 and 
-                     any(str(first_row_values[i]).strip() not in col_names[i] for i in range(min(len(col_names), len(first_row_values))))
-                     and col_names[0] not in ["اسم العميل", "اسم العميل ", "name", "Name"])
-                )
-                
-                # إذا لم يكن هناك header صحيح، نقرأ الملف بدون header ونحدد الأعمدة يدوياً
-                if is_header_missing and len(df.columns) >= 10:
-                    # نقرأ الملف بدون header
-                    df = pd.read_csv(
-                        path,
-                        encoding="utf-8-sig",
-                        engine="python",
-                        on_bad_lines="skip",
-                        sep=",",
-                        quotechar='"',
-                        skipinitialspace=True,
-                        header=None
-                    )
-                    # نحدد أسماء الأعمدة بناءً على البنية المعروفة
-                    expected_cols = ["اسم العميل", "رقم الجوال", "المنطقة", "المدينة", "الشركة", 
-                                   "مقدم الخدمة", "نوع الخدمة", "الخدمه المطلوبه", "المسؤول", 
-                                   "الملاحظات", "الشهر", "التاريخ"]
-                    # نستخدم أسماء الأعمدة المتوقعة حسب عدد الأعمدة الفعلية
-                    if len(df.columns) >= len(expected_cols):
-                        df.columns = expected_cols[:len(df.columns)]
-                    elif len(df.columns) == 12:
-                        df.columns = expected_cols
-                    else:
-                        # إذا كان عدد الأعمدة مختلف، نستخدم الأسماء الأساسية
-                        df.columns = expected_cols[:len(df.columns)] + [f"عمود_{i}" for i in range(len(expected_cols), len(df.columns))]
-                
-                break
-            except Exception as e:
-                err_msg = str(e)
-
-        if df is None:
-            st.error(f"تعذّر قراءة {os.path.basename(path)} — {err_msg}")
-            continue
-
-        if df.empty:
-            st.warning(f"الملف {os.path.basename(path)} فارغ بعد التنظيف.")
-            continue
-
-        # نظافة أساسية
-        df.dropna(how="all", inplace=True)
-        df = normalize_columns(df)
-
-        # تنظيف وتوحيد عمود اسم العميل: حذف المسافات الزائدة والحفاظ على الأسماء الفعلية
-        if "اسم العميل" in df.columns:
-            df["اسم العميل"] = df["اسم العميل"].astype(str).str.strip()
-
-        # تاريخ موحّد
-        df["التاريخ/Date"] = pd.to_datetime(df.apply(build_date_from_month_day, axis=1), errors="coerce")
-
-        # --- الشهر: توحيد قوي قبل الحصر ---
-        if "الشهر" not in df.columns:
-            # إذا لم يوجد عمود الشهر، نحاول استخراجه من التاريخ
-            df["الشهر"] = df["التاريخ/Date"].dt.month.map(INV_MONTH_MAP).where(
-                df["التاريخ/Date"].dt.month.map(INV_MONTH_MAP).isin(MONTH_ORDER), np.nan
+                results = ingest_files(paths, pool=get_ingest_pool(ingest_worker_count()))
+            except BrokenExecutor:
+                get_ingest_pool.clear()     # مجمّع معطّل: نعيد إنشاءه في المرة القادمة
+                results = ingest_files(paths, pool=None)
+            results = dict(zip(paths, results))
+            for path in streamed:
+                base = os.path.basename(path)
+                bar = st.progress(0.0, text=f"تحميل {base} على أجزاء…")
+                def on_progress(done, total, bar=bar, base=base):
+                    bar.progress(min(1.0, done / max(1, total)),
+                                 text=f"تحميل {base} على أجزاء: {done / 1e6:.0f} / {total / 1e6:.0f} MB")
+                results[path] = ingest_file(path, as_arrow=False, progress=on_progress)
+                bar.empty()
+            for path, fp in to_parse:
+                provider, payload, messages, bad_lines = results[path]
+                remember(path, fp, provider, payload, messages, bad_lines)
+                entries[path] = {"fingerprint": fp, "provider": provider,
+                                 "df": payload_to_frame(payload), "messages": messages,
+                                 "bad_lines": bad_lines}
+                status[path] = "miss"
+
+        # فئات الأعمدة Categorical موحّدة عبر كل الملفات حتى يبقى __ALL__ Categorical بعد الدمج
+        live = [p for p in files if entries[p]["df"] is not None]
+        for path, df in zip(live, unify_categories(entries[p]["df"] for p in live)):
+            entries[path]["df"] = df
+
+        # 3) الرسائل والنتائج بترتيب الملفات نفسه دائمًا
+        for path in files:
+            entry = entries[path]
+            # نعيد عرض الرسائل في كل rerun كما كان يحدث قبل الكاش
+            for level, text in entry["messages"]:
+                getattr(st, level)(text)
+
+            if entry["df"] is not None:
+                datasets[entry["provider"]] = entry["df"]
+            report.append({
+                "الملف": os.path.basename(path),
+                "الحالة": status[path],
+                "الحجم (بايت)": entry["fingerprint"]["size"],
+                "الصفوف": 0 if entry["df"] is None else len(entry["df"]),
+                "أسطر تالفة": len(entry["bad_lines"]),
+            })
+
+        # ملفات حُذفت من المجلد لا داعي للاحتفاظ بها
+        for path in [p for p in entries if os.path.dirname(p) == folder and p not in files]:
+            del entries[path]
+        if manifest is not None:
+            current = {os.path.basename(p) for p in files}
+            for base in [b for b in manifest if b not in current]:
+                manifest_dirty = True
+                name = manifest.pop(base)["snapshot"]
+                if name:
+                    try:
+                        os.remove(os.path.join(snapshot_dir(folder), name))
+                    except OSError:
+                        pass
+            if manifest_dirty:
+                write_snapshot_manifest(folder, manifest)
+
+        # نسخة واحدة فقط من البيانات: "__ALL__" هو الإطار الأساسي، وكل مقدّم خدمة
+        # مدى صفوف متصل منه (iloc[start:stop] = view بدون نسخ). الإطارات المنفصلة
+        # تُستبدل بالـ views بعد الدمج فتُحرَّر ذاكرتها.
+        if datasets:
+            all_key = tuple(
+                (path, entries[path]["fingerprint"]["hash"])
+                for path in files if entries[path]["df"] is not None
             )
-        else:
-            # تطبيق التوحيد مع التاريخ (معالجة صحيحة للقيم NaN)
-            month_series = df["الشهر"].copy()
-            date_series = df["التاريخ/Date"]
-            df["الشهر"] = [
-                normalize_month_value(
-                    month_series.iloc[i] if pd.notna(month_series.iloc[i]) else None,
-                    date_series.iloc[i] if pd.notna(date_series.iloc[i]) else pd.NaT
-                )
-                for i in range(len(df))
-            ]
-            # التأكد من أن القيم في MONTH_ORDER فقط
-            df["الشهر"] = df["الشهر"].where(df["الشهر"].isin(MONTH_ORDER), np.nan)
-
-        # توحيد النصوص (باستثناء الشهر الذي تم توحيده بالفعل)
-        text_cols = ["اسم العميل","رقم الجوال","المنطقة","المدينة","الشركة","نوع الخدمة","الخدمه المطلوبه"]
-        for col in text_cols:
-            if col in df.columns:
-                df[col] = df[col].astype(str).str.strip()
-        # الشهر: التأكد من أنه نص (لكن نحافظ على NaN كقيمة NaN وليس نص "nan")
-        # لا نحتاج لتحويله لأن normalize_month_value يعطينا القيمة الصحيحة بالفعل
-
-        # بناء أسابيع العمل
-        df = add_week_columns(df)
-
-        # مصدر الملف
-        df["مقدم الخدمة (ملف)"] = provider
-        datasets[provider] = df
-
-        if err_msg is not None:
-            st.warning(f"تم تخطّي أسطر تالفة في {os.path.basename(path)} للحفاظ على عمل التطبيق.")
-
-    if datasets:
-        all_df = pd.concat(list(datasets.values()), ignore_index=True, sort=False)
-        datasets["__ALL__"] = all_df
-
-    return datasets
-
-datasets = load_all()
+            if cache["all"] is None or cache["all"]["key"] != all_key:
+                all_df = pd.concat(list(datasets.values()), ignore_index=True, sort=False)
+                bounds = np.cumsum([0] + [len(df) for df in datasets.values()])
+                ranges = {p: (int(a), int(b)) for p, a, b in zip(datasets, bounds[:-1], bounds[1:])}
+                index = build_row_index(all_df)
+                month_col = all_df["الشهر"] if "الشهر" in all_df.columns else None
+                cache["all"] = {
+                    "key": all_key, "df": all_df, "ranges": ranges,
+                    "views": {p: all_df.iloc[a:b] for p, (a, b) in ranges.items()},
+                    "index": freeze_arrays(index),
+                    # تواريخ كل نطاق مرتبة مع مواضع صفوفها (نطاقات الأيام ببحث ثنائي)
+                    "dates": freeze_arrays(build_date_index(all_df, ranges)),
+                    # وسم الأسبوع يحمل اسم الشهر، فكل وسم ينتمي لشهر واحد (شهر أول صف له)
+                    "week_month": {
+                        label: (month_col.iat[rows[0]] if month_col is not None else None)
+                        for label, rows in index.get("وسم الأسبوع", {}).items()
+                    },
+                    # المرور الوحيد على الصفوف لأجل الأعداد: كل KPI ورسم يقرأ من المكعب
+                    "cube": build_count_cube(all_df),
+                    # فهرس بحث الجدول التفصيلي (كلمات مُطبّعة + أسماء العرض العربية)
+                    "search": freeze_arrays(build_search_index(all_df, aliases=SEARCH_ALIASES)),
+                    "sort_orders": {},   # (عمود، تصاعدي) -> ترتيب كل الصفوف (sort_rows، عند الطلب)
+                    "forecasts": OrderedDict(),   # نطاق الاختيار -> ملاءمة التنبؤ (scope_forecast، LRU عند الطلب)
+                    "lock": threading.Lock(),   # لإعادة بناء ما أخلته ميزانية الذاكرة
+                }
+                # تقرير الذاكرة محفوظ لكل ملف (ويُجمع مع الإلحاق) بدل حسابه على __ALL__ في كل إعادة بناء
+                for path in live:
+                    if "memory" not in entries[path]:
+                        entries[path]["memory"] = frame_memory_report(entries[path]["df"])
+                cache["memory"] = {k: sum(entries[p]["memory"][k] for p in live) for k in ("before", "after")}
+                # أحجام البنى الثابتة تُحسب مرة لكل نسخة (ترتيبات الأعمدة والنتائج تُجمع عند القراءة)
+                state = cache["all"]
+                state["bytes"] = {
+                    "df": cache["memory"]["after"],
+                    "index": structure_bytes(state["index"]) + structure_bytes(state["dates"])
+                             + structure_bytes(state["week_month"]),
+                    "cube": structure_bytes(state["cube"]),
+                    "search": structure_bytes(state["search"]),
+                }
+            views = cache["all"]["views"]
+            for path in files:
+                entry = entries[path]
+                if entry["df"] is not None and datasets.get(entry["provider"]) is entry["df"]:
+                    entry["df"] = views[entry["provider"]]
+            datasets.update(views)
+            datasets["__ALL__"] = cache["all"]["df"]
+
+        cache["report"] = report
+        all_state = cache["all"] if datasets else None
+
+    return datasets, all_state
+
+datasets, all_state = load_all()
 if not datasets:
     st.error("لا يوجد أي CSV داخل data/. أضيفي الملفات ثم أعيدي التحميل.")
     st.stop()
+enforce_memory_budget(all_state)
+
+query_engine = get_query_engine(
+    os.environ.get(QUERY_ENGINE_ENV, "").strip().lower() or "pandas",
+    os.environ.get(QUERY_DB_ENV, "").strip() or None,
+)
+if query_engine is not None and "error" not in query_engine:
+    try:
+        # لا يعيد التسجيل إلا عند تغيّر نسخة البيانات (أو إن لم تكن محفوظة في ملف القاعدة)
+        register_calls(query_engine, all_state["df"], repr(all_state["key"]), aliases=SEARCH_ALIASES)
+    except Exception as e:
+        query_engine = {"error": f"{type(e).__name__}: {e}"}
+if query_engine is not None and "error" in query_engine:
+    st.warning(f"تعذّر استخدام محرك SQL ({query_engine['error']})، يُستخدم مسار pandas بدلًا منه.")
+    query_engine = None
 
 # =============== زر الثيم مكان زر التحديث ===============
 col1, col2, col3 = st.columns([2, 1, 2])
@@ -851,122 +971,320 @@ with col2:
     if st.button(f"{theme_icon} {theme_text}", key="theme_toggle", use_container_width=True, help="تبديل بين الوضع النهاري والليلي"):
         toggle_theme()
 
+# =============== اختيار الصفوف عبر فهرس الصفوف ===============
+# مقدّم الخدمة مدى [start, stop) من "__ALL__"؛ بقية المرشّحات قوائم مواضع مرتبة لكل قيمة
+# (build_row_index). الاختيار المتعدد اتحاد قوائم القيم المختارة داخل العمود الواحد ثم
+# تقاطع الأعمدة، بكلفة بحجم القوائم المختارة لا بحجم البيانات (بلا أقنعة على الأعمدة).
+PROVIDER_COL = "مقدم الخدمة (ملف)"
+ATTRIBUTE_COLS = ["المنطقة", "المدينة", "الشركة", "نوع الخدمة"]
+PERIOD_COLS = ["الشهر", "وسم الأسبوع"]     # نطاق cube_scope بدونهما (التنبؤ وأعلى شهر شهريان)
+
+def scope_ranges(providers):
+    """مديات صفوف مقدّمي الخدمة المختارين بترتيب مواضعها (بدون اختيار = كل الصفوف)."""
+    if not providers:
+        return [(0, len(all_state["df"]))]
+    return sorted(all_state["ranges"].get(p, (0, 0)) for p in providers)
+
+def value_rows(col, values, providers=()):
+    """اتحاد مواضع صفوف القيم المختارة في العمود، داخل مديات مقدّمي الخدمة المختارين."""
+    index = all_state["index"].get(col, {})
+    ranges = scope_ranges(providers)
+    return union_rows(rows_in_ranges(index[v], ranges) for v in values if v in index)
+
+def date_rows(providers, date_range):
+    """مواضع صفوف نطاق الأيام (فهرس التاريخ لكل مقدّم خدمة مختار، أو لـ "__ALL__")."""
+    return union_rows(rows_in_date_range(all_state["dates"], p, *date_range) for p in providers or ["__ALL__"])
+
+def rows_frame(rows):
+    """الصفوف المختارة من "__ALL__" (نفس الفهرس والأعمدة كما في التصفية بالقناع)."""
+    return all_state["df"].take(rows)
+
+def sort_rows(rows, col, ascending=True):
+    """
+    ترتيب مواضع الصفوف حسب عمود (مستقر، والفارغ في الآخر). ترتيب العمود كاملًا يُحسب مرة
+    لكل نسخة بيانات، ثم يكفي قناع على rows لاستخراج ترتيب أي مجموعة صفوف.
+    """
+    # نقرأ الترتيب مرة واحدة: ميزانية الذاكرة قد تفرّغ القاموس من جلسة أخرى في أي لحظة
+    order = all_state["sort_orders"].get((col, ascending))
+    if order is None:
+        s = all_state["df"][col]
+        if isinstance(s.dtype, pd.CategoricalDtype) and not s.cat.ordered:
+            # الفئات غير المرتبة تُرتب أبجديًا لا بترتيب ظهورها
+            s = s.cat.reorder_categories(sorted(s.cat.categories, key=str))
+        order = s.sort_values(ascending=ascending, kind="stable", na_position="last").index.to_numpy()
+        all_state["sort_orders"][(col, ascending)] = freeze_arrays(order)
+    mask = np.zeros(len(order), dtype=bool)
+    mask[rows] = True
+    return order[mask[order]]
+
+def scope_date_span(providers):
+    """(أول يوم، آخر يوم) في بيانات مقدّمي الخدمة المختارين من فهرس التاريخ، أو None بلا تواريخ."""
+    spans = [all_state["dates"][p][0] for p in providers or ["__ALL__"] if p in all_state["dates"]]
+    spans = [dates for dates in spans if len(dates)]
+    if not spans:
+        return None
+    return pd.Timestamp(min(d[0] for d in spans)).date(), pd.Timestamp(max(d[-1] for d in spans)).date()
+
+# أسئلة المرشّحات: من محرك SQL إن كان مفعّلًا، وإلا من فهرس الصفوف ومكعب العدّ في الذاكرة.
+# selection: عمود -> القيم المختارة (tuple)؛ العمود الغائب أو الفارغ = الكل.
+def scope_months(providers, date_range=None):
+    if query_engine is not None:
+        found = query_months(query_engine, {PROVIDER_COL: providers}, dates=date_range)
+        return [m for m in MONTH_ORDER if m in found]
+    if date_range is not None:
+        found = set(selection_cube({PROVIDER_COL: providers}, date_range)["الشهر"].dropna())
+        return [m for m in MONTH_ORDER if m in found]
+    return [m for m in MONTH_ORDER if len(value_rows("الشهر", [m], providers))]
+
+def scope_week_firsts(providers, months=(), date_range=None):
+    """[(أول صف، الوسم، WeekStart)] لكل وسم أسبوع في النطاق (وفي الأشهر والفترة المختارة إن وُجدت)."""
+    if query_engine is not None:
+        return query_week_firsts(query_engine, {PROVIDER_COL: providers, "الشهر": months}, dates=date_range)
+    ranges = scope_ranges(providers)
+    week_starts = all_state["df"]["WeekStart"]
+    in_range = date_rows(providers, date_range) if date_range is not None else None
+    firsts = []
+    for label, rows in all_state["index"].get("وسم الأسبوع", {}).items():
+        if not label or (months and all_state["week_month"][label] not in months):
+            continue
+        rows = rows_in_ranges(rows, ranges)
+        if in_range is not None:
+            rows = intersect_rows(rows, in_range)
+        if len(rows):
+            firsts.append((int(rows[0]), label, week_starts.iat[int(rows[0])]))
+    return firsts
+
+def selection_rows(selection, date_range=None):
+    """
+    مواضع صفوف الاختيار: اتحاد القيم داخل كل عمود، وتقاطع الأعمدة ونطاق الأيام. None إن لم
+    يكن هناك إلا مقدّم خدمة واحد أو الكل (df_scope نفسه بلا نسخ).
+    """
+    providers = selection.get(PROVIDER_COL, ())
+    columns = [c for c, values in selection.items() if values and c != PROVIDER_COL]
+    if not columns and date_range is None and len(providers) <= 1:
+        return None
+    if query_engine is not None:
+        return query_rows(query_engine, selection, dates=date_range)
+    selected = [value_rows(c, selection[c], providers) for c in columns if c in all_state["index"]]
+    if date_range is not None:
+        selected.append(date_rows(providers, date_range))
+    if not selected:
+        # عدة مقدّمي خدمة فقط: مدياتهم المتصلة
+        return np.concatenate([np.arange(a, b) for a, b in scope_ranges(providers)])
+    return intersect_rows(*selected)
+
+def selection_cube(selection, date_range=None):
+    """خلايا مكعب العدّ للاختيار ونطاق الأيام (المكعب صغير، فالقناع عليه رخيص)."""
+    if query_engine is not None:
+        return query_cube(query_engine, selection, dates=date_range)
+    cube = all_state["cube"]
+    for col, values in selection.items():
+        if values and col in cube.columns:
+            cube = cube[cube[col].isin(values)]
+    if date_range is not None and "التاريخ/Date" in cube.columns:
+        # التاريخ بُعد في المكعب، فنطاق الأيام قناع على خلاياه
+        lo, hi = date_range_bounds(*date_range)
+        cube = cube[(cube["التاريخ/Date"] >= lo) & (cube["التاريخ/Date"] < hi)]
+    return cube
+
 # =============== المرشّحات ===============
+DATE_PRESETS = {"كل الفترة": None, "آخر 7 أيام": 7, "آخر 10 أيام": 10, "آخر 30 يومًا": 30, "نطاق مخصص": "custom"}
 providers = [k for k in datasets.keys() if k != "__ALL__"]
-providers_ar = ["الكل"] + [provider_to_ar(p) for p in providers]
+providers_ar = [provider_to_ar(p) for p in providers]
+
+def chosen(options, picked):
+    """القيم المختارة بترتيب القائمة نفسها (مفتاح ثابت للكاش مهما كان ترتيب النقر)."""
+    picked = set(picked)
+    return tuple(o for o in options if o in picked)
 
 with st.form("main_filters"):
     c1, c2, c3 = st.columns([1.2, 1.2, 1.2])
 
     with c1:
         st.markdown('<div class="glass"><b>مقدّم الخدمة</b>', unsafe_allow_html=True)
-        provider_choice_ar = st.selectbox("اختر", providers_ar, index=0)
+        providers_choice_ar = st.multiselect("اختر", providers_ar, placeholder="الكل")
         st.markdown('</div>', unsafe_allow_html=True)
 
-    # نطاق البيانات حسب مقدم الخدمة
-    if provider_choice_ar == "الكل":
-        provider_key = "__ALL__"
-        df_scope = datasets["__ALL__"].copy()
+    # نطاق البيانات حسب مقدّمي الخدمة (بدون اختيار = الكل، ومقدّم واحد = إطاره مباشرة)
+    selected_providers = tuple(ar_to_provider(p) for p in chosen(providers_ar, providers_choice_ar))
+    if len(selected_providers) == 1:
+        df_scope = datasets.get(selected_providers[0], pd.DataFrame())
     else:
-        provider_key = ar_to_provider(provider_choice_ar)
-        df_scope = datasets.get(provider_key, pd.DataFrame()).copy()
+        df_scope = datasets["__ALL__"]
+
+    # نطاق أيام (يتقاطع مع الشهر/الأسبوع، ويعبر حدود الأشهر): "آخر N يوم" تُحسب من آخر
+    # يوم في بيانات النطاق، أو من–إلى مخصص. صفّه يظهر تحت الشهر/الأسبوع لكنه يُقرأ قبلهما
+    # حتى تقتصر قائمتا الشهر والأسبوع على ما يقع داخل الفترة.
+    date_range = None
+    date_span = scope_date_span(selected_providers)
+    if date_span is not None:
+        d1, d2 = st.columns([1.2, 2.4])
+        with d1:
+            st.markdown('<div class="glass"><b>تصفية حسب التاريخ</b>', unsafe_allow_html=True)
+            range_preset = st.selectbox("الفترة", list(DATE_PRESETS), index=0)
+            st.markdown('</div>', unsafe_allow_html=True)
+        with d2:
+            custom_range = st.date_input("من – إلى (للنطاق المخصص)", value=date_span,
+                                         min_value=date_span[0], max_value=date_span[1], format="YYYY/MM/DD")
+            preset_days = DATE_PRESETS[range_preset]
+            if preset_days == "custom":
+                if len(custom_range) == 2:
+                    date_range = tuple(custom_range)
+            elif preset_days is not None:
+                date_range = ((pd.Timestamp(date_span[1]) - pd.Timedelta(days=preset_days - 1)).date(), date_span[1])
+            if date_range is not None:
+                n_days = (date_range[1] - date_range[0]).days + 1
+                st.caption(f"📆 الفترة المطبّقة: {date_range[0]:%Y/%m/%d} → {date_range[1]:%Y/%m/%d} ({n_days} يوم)")
+            else:
+                st.caption(f"📆 كل الفترة: {date_span[0]:%Y/%m/%d} → {date_span[1]:%Y/%m/%d}")
 
     with c2:
         st.markdown('<div class="glass"><b>تصفية حسب الشهر</b>', unsafe_allow_html=True)
         months_av = []
         if "الشهر" in df_scope.columns:
-            months_av = [m for m in MONTH_ORDER if m in df_scope["الشهر"].dropna().unique().tolist()]
-        # عرض الأسماء بالعربية في القائمة
-        month_options = ["الكل"] + [f"{month_to_ar(m)} ({m})" for m in months_av]
-        month_choice_display = st.selectbox("اختر الشهر", month_options, index=0)
-        # استخراج رمز الشهر من الاختيار
-        if month_choice_display == "الكل":
-            month_choice = "الكل"
-        else:
-            # استخراج رمز الشهر من النص (مثل "أغسطس (Aug)" -> "Aug")
-            month_choice = month_choice_display.split("(")[-1].replace(")", "").strip() if "(" in month_choice_display else month_choice_display
+            months_av = scope_months(selected_providers, date_range)
+        # عرض الأسماء بالعربية في القائمة (مثل "أغسطس (Aug)") ثم الرجوع لرمز الشهر
+        month_options = {f"{month_to_ar(m)} ({m})": m for m in months_av}
+        month_choices = tuple(month_options[o] for o in chosen(
+            month_options, st.multiselect("اختر الشهر", list(month_options), placeholder="الكل")))
         st.caption("💡 كل شهر له أسابيع منفصلة. يُفضل اختيار شهر أولاً ثم النقر على زر تطبيق المرشّحات ثم اختيار الأسبوع من قائمة اختر الأسبوع لتصفية الأسابيع.")
         st.markdown('</div>', unsafe_allow_html=True)
 
     with c3:
         st.markdown('<div class="glass"><b>تصفية حسب الأسبوع</b>', unsafe_allow_html=True)
         # الأسبوع يظهر دائمًا: نجمع أسابيع نطاق df_scope ثم نقيّد إذا تم اختيار شهر
-        week_options = ["الكل"]
-        tmp = df_scope.copy()
+        week_options = []
         
-        # إذا تم اختيار شهر، نعرض أسابيع هذا الشهر فقط
-        if month_choice != "الكل":
-            tmp = tmp[tmp["الشهر"] == month_choice]
-            month_name_ar = month_to_ar(month_choice)
+        # إذا تم اختيار شهر، نعرض أسابيع الأشهر المختارة فقط
+        if month_choices:
+            month_name_ar = "، ".join(month_to_ar(m) for m in month_choices)
             help_text = f"📅 يتم عرض أسابيع شهر {month_name_ar} فقط. الأرقام (1، 2، 3...) تبدأ من جديد في كل شهر."
         else:
             help_text = "📅 ملاحظة: كل شهر له أسابيع منفصلة ومُرقمة بشكل مستقل. يُفضل اختيار شهر أولاً لتسهيل البحث."
         
-        if "وسم الأسبوع" in tmp.columns and not tmp.empty:
-            # ترتيب الأسابيع حسب التاريخ (تصاعدي) - التأكد من الترتيب الصحيح
-            uniq = (
-                tmp.dropna(subset=["WeekStart","WeekEnd", "وسم الأسبوع"])
-                   .drop_duplicates(subset=["WeekStart"])
-                   .sort_values("WeekStart", ascending=True)  # ترتيب تصاعدي حسب التاريخ
-            )
+        if "وسم الأسبوع" in df_scope.columns and "WeekStart" in df_scope.columns:
+            # أول صف لكل وسم داخل النطاق (من الفهرس)، ثم وسم واحد لكل WeekStart
+            # (وسم أول صف يحمله) مرتبة تصاعديًا حسب التاريخ
+            weeks = {}
+            for first, label, ws in sorted(scope_week_firsts(selected_providers, month_choices, date_range), key=lambda f: f[:2]):
+                if pd.notna(ws) and ws not in weeks:
+                    weeks[ws] = label
             # إضافة الأسابيع مرتبة حسب التاريخ
-            week_options += uniq["وسم الأسبوع"].tolist()
+            week_options += [weeks[ws] for ws in sorted(weeks)]
         
-        week_choice = st.selectbox("اختر الأسبوع", week_options, index=0)
+        week_choices = chosen(week_options, st.multiselect("اختر الأسبوع", week_options, placeholder="الكل"))
         st.caption(help_text)
         st.markdown('</div>', unsafe_allow_html=True)
 
+    # مرشّحات إضافية (اختيار متعدد، والفارغ = الكل): القيم من فهرس الصفوف لكل البيانات،
+    # فلا تتغير القوائم (ولا يضيع الاختيار) عند تغيير مقدّم الخدمة أو الفترة
+    attribute_choices = {}
+    attribute_cols = [c for c in ATTRIBUTE_COLS if c in all_state["index"]]
+    if attribute_cols:
+        for col, box in zip(attribute_cols, st.columns(len(attribute_cols))):
+            with box:
+                options = sorted((v for v in all_state["index"][col] if str(v).strip().lower() not in ("", "nan")), key=str)
+                attribute_choices[col] = chosen(options, st.multiselect(col, options, placeholder="الكل"))
+
     st.form_submit_button("تطبيق المرشّحات ✅")
 
 # =============== تطبيق التصفية ===============
-filtered = df_scope.copy()
-if month_choice != "الكل":
-    # نتأكد من تنظيف القيم للمقارنة الصحيحة
-    filtered = filtered[filtered["الشهر"].astype(str).str.strip() == month_choice]
-if week_choice != "الكل" and "وسم الأسبوع" in filtered.columns:
-    filtered = filtered[filtered["وسم الأسبوع"].astype(str).str.strip() == week_choice.strip()]
+# الأعمدة المختارة فقط (الفارغ = الكل)، بترتيب ثابت يصلح مفتاحًا لكاش النتائج
+selection = {
+    col: values for col, values in [
+        (PROVIDER_COL, selected_providers), ("الشهر", month_choices), ("وسم الأسبوع", week_choices),
+        *attribute_choices.items(),
+    ] if values
+}
+# اتحاد/تقاطع قوائم المواضع ثم اختيار واحد؛ بدون تصفية يبقى filtered هو df_scope نفسه (بدون نسخ)
+filtered = df_scope
+selected_rows = selection_rows(selection, date_range)
+if selected_rows is not None:
+    filtered = rows_frame(selected_rows)
+
+# نفس التصفية على مكعب العدّ: KPIs والرسوم تُحسب من الخلايا لا من الصفوف. cube_scope هو
+# الاختيار بدون الشهر/الأسبوع (أعلى شهر والتنبؤ ورسوم أشهر مقدّمي الخدمة)
+cube_scope = selection_cube({c: v for c, v in selection.items() if c not in PERIOD_COLS}, date_range)
+cube_f = cube_scope
+if selected_rows is not None:
+    cube_f = selection_cube(selection, date_range)
+
+# نتائج هذه التركيبة من كاش النتائج، أو قاموس فارغ يُملأ أثناء هذا التشغيل ثم يُخزَّن
+result_key = (all_state["key"], tuple(selection.items()), date_range, st.session_state["theme_mode"])
+page_results = result_cache_get(result_key)
+results_from_cache = page_results is not None
+if page_results is None:
+    page_results = {}
+
+def cached_result(name, build):
+    """نتيجة name لهذه التركيبة (KPI، نص، شكل Plotly أو None)، تُبنى مرة واحدة فقط."""
+    if name not in page_results:
+        page_results[name] = build()
+    return page_results[name]
 
 # =============== KPI + المتوسطات الديناميكية ===============
 total_calls = int(len(filtered))
 
-def top_month_in_scope(df):
-    if df.empty or "الشهر" not in df.columns: return None, 0
-    s = df["الشهر"].value_counts().sort_values(ascending=False)
+def cube_counts(cube: pd.DataFrame, key) -> pd.Series:
+    """
+    value_counts من مكعب العدّ (بنفس الترتيب والناتج) بدون الفئات غير الموجودة في النطاق.
+    key اسم عمود أو Series بمحاذاة المكعب (مثل نص مُنظّف).
+    """
+    key = cube[key] if isinstance(key, str) else key
+    categorical = isinstance(key.dtype, pd.CategoricalDtype)
+    # Categorical: ترتيب الفئات؛ نص: ترتيب أول ظهور (خلايا المكعب بترتيب أول ظهور للصفوف)
+    vc = cube["n"].groupby(key, observed=False, sort=categorical).sum()
+    vc = vc.sort_values(ascending=False).rename("count")
+    return vc[vc > 0]
+
+def top_month_in_scope(cube):
+    if cube.empty or "الشهر" not in cube.columns: return None, 0
+    s = cube_counts(cube, "الشهر").sort_values(ascending=False)
     return (s.index[0], int(s.iloc[0])) if len(s) else (None, 0)
 
-def average_for_selection(df: pd.DataFrame, month_choice: str, week_choice: str):
+def average_for_selection(cube: pd.DataFrame, months=(), weeks=(), date_range=None):
     """
-    - إذا تم اختيار أسبوع: متوسط المكالمات اليومي (أحد–سبت).
-    - إذا تم اختيار شهر فقط: متوسط المكالمات الأسبوعي داخل هذا الشهر.
-    - إذا لم يُحدَّد شهر/أسبوع: متوسط المكالمات الشهري على النطاق الحالي.
+    - إذا تم اختيار أسبوع أو أكثر: متوسط المكالمات اليومي على أيامها (أحد–سبت، أو داخل نطاق التاريخ).
+    - إذا تم اختيار شهر أو أكثر فقط: متوسط المكالمات الأسبوعي داخل هذه الأشهر.
+    - إذا تم اختيار نطاق تاريخ فقط: متوسط المكالمات اليومي على أيام النطاق.
+    - بدون شهر/أسبوع/نطاق: متوسط المكالمات الشهري على النطاق الحالي.
+    cube هنا خلايا مكعب العدّ بعد تصفية الاختيار كاملًا، فلا نعيد المقارنة.
     """
-    if df.empty: return 0.0, "—"
+    if cube.empty: return 0.0, "—"
 
-    if week_choice != "الكل":
-        if "WeekStart" not in df.columns or "WeekEnd" not in df.columns:
+    if weeks:
+        if "WeekStart" not in cube.columns or "WeekEnd" not in cube.columns:
             return 0.0, "—"
-        wdf = df[df["وسم الأسبوع"] == week_choice].copy()
-        if wdf.empty:
+        spans = cube[["WeekStart", "WeekEnd"]].dropna().drop_duplicates()
+        if spans.empty:
             return 0.0, "—"
-        ws = pd.to_datetime(wdf["WeekStart"].iloc[0])
-        we = pd.to_datetime(wdf["WeekEnd"].iloc[0])
-        day_count = max(1, int((we - ws).days) + 1)  # أحد..سبت (أسبوع كامل)
-        avg_per_day = len(wdf) / day_count
+        day_count = 0
+        for ws, we in spans.itertuples(index=False):
+            ws, we = pd.Timestamp(ws), pd.Timestamp(we)
+            if date_range is not None:
+                ws = max(ws, pd.Timestamp(date_range[0]))
+                we = min(we, pd.Timestamp(date_range[1]))
+            day_count += max(1, int((we - ws).days) + 1)  # أحد..سبت (أسبوع كامل)
+        avg_per_day = int(cube["n"].sum()) / day_count
+        if len(spans) > 1:
+            return float(avg_per_day), f"متوسط المكالمات اليومي — {len(spans)} أسابيع"
         return float(avg_per_day), f"متوسط المكالمات اليومي — {ws.strftime('%b %d')}–{we.strftime('%b %d')}"
 
-    if month_choice != "الكل":
-        if "WeekStart" not in df.columns:
+    if months:
+        if "WeekStart" not in cube.columns:
             return 0.0, "—"
-        mdf = df[df["الشهر"] == month_choice]
-        if mdf.empty:
-            return 0.0, "—"
-        week_sizes = mdf.groupby("WeekStart").size()
+        week_sizes = cube.groupby("WeekStart")["n"].sum()
         if len(week_sizes) == 0:
             return 0.0, "—"
-        return float(week_sizes.mean()), f"متوسط المكالمات الأسبوعي — شهر {month_choice}"
+        return float(week_sizes.mean()), f"متوسط المكالمات الأسبوعي — شهر {' + '.join(months)}"
+
+    if date_range is not None:
+        day_count = (date_range[1] - date_range[0]).days + 1
+        label = f"متوسط المكالمات اليومي — {date_range[0]:%b %d}–{date_range[1]:%b %d}"
+        return float(cube["n"].sum()) / day_count, label
 
-    if "الشهر" in df.columns:
-        month_sizes = df.groupby("الشهر").size()
+    if "الشهر" in cube.columns:
+        month_sizes = cube.groupby("الشهر", observed=True)["n"].sum()
         if len(month_sizes)==0: return 0.0, "—"
         return float(month_sizes.mean()), "متوسط المكالمات الشهري — النطاق الحالي"
 
@@ -974,13 +1292,18 @@ def average_for_selection(df: pd.DataFrame, month_choice: str, week_choice: str)
 
 k1,k2,k3 = st.columns(3)
 with k1:
-    scope_title = "جميع الملفات" if provider_key=="__ALL__" else f"الملف: {provider_to_ar(provider_key)}"
+    if not selected_providers:
+        scope_title = "جميع الملفات"
+    elif len(selected_providers) == 1:
+        scope_title = f"الملف: {provider_to_ar(selected_providers[0])}"
+    else:
+        scope_title = "الملفات: " + " + ".join(provider_to_ar(p) for p in selected_providers)
     st.markdown(f"""<div class="kpi">
         <div class="title">إجمالي الاتصالات — {scope_title}</div>
         <div class="value">{total_calls}</div>
     </div>""", unsafe_allow_html=True)
 
-m_name, m_val = top_month_in_scope(filtered if provider_key=="__ALL__" else datasets[provider_key])
+m_name, m_val = cached_result("top_month", lambda: top_month_in_scope(cube_f if not selected_providers else cube_scope))
 with k2:
     st.markdown(f"""<div class="kpi">
         <div class="title">أعلى شهر ضمن النطاق</div>
@@ -988,7 +1311,7 @@ with k2:
         <div class="badge">عدد: {m_val}</div>
     </div>""", unsafe_allow_html=True)
 
-avg_val, avg_label = average_for_selection(filtered, month_choice, week_choice)
+avg_val, avg_label = cached_result("average", lambda: average_for_selection(cube_f, month_choices, week_choices, date_range))
 with k3:
     st.markdown(f"""<div class="kpi">
         <div class="title">المتوسط (حسب التصفية)</div>
@@ -997,43 +1320,38 @@ with k3:
     </div>""", unsafe_allow_html=True)
 
 # =============== (إضافة جديدة) KPI لتوقّع الشهر القادم ===============
-def calc_forecast(df_month_scope: pd.DataFrame):
+# ملاءمة واحدة لكل (نوع، نسخة بيانات، نطاق) في all_state: البطاقة والمنحنى يقرآن ملاءمة
+# "month" نفسها، وجدول كل السلاسل يقرأ "batch". النطاق = الاختيار بدون الشهر/الأسبوع + نطاق
+# التاريخ، أي ما يحدد cube_scope.
+FORECAST_CACHE_ENTRIES = 256
+
+def scope_forecast(kind, scope_key, build):
     """
-    يبني إجمالي شهري من df_month_scope (قبل ترشيح الأسبوع)،
-    ثم يطبّق LinearRegression إن توفرت، أو تقدير بسيط إن لم تتوفر.
+    الملاءمة المحفوظة للنطاق أو تبنيها. القاموس مشترك بين الجلسات: القراءة والإضافة تحت القفل
+    (LRU: الإصابة تنقل المفتاح للآخر)، والبناء خارجه؛ الملاءمة المبنية تُرجع نفسها لا من القاموس
+    (قد تُخليها جلسة أخرى قبل القراءة).
     """
-    if df_month_scope is None or df_month_scope.empty or "الشهر" not in df_month_scope.columns:
-        return None, None, None
-
-    month_totals = df_month_scope["الشهر"].value_counts().reindex(MONTH_ORDER).dropna()
-    if len(month_totals) < 1:
-        return None, None, None
-
-    x = np.array([MONTH_INDEX[m] for m in month_totals.index]).reshape(-1,1)
-    y = month_totals.values.astype(float)
-
-    # نموذج خطي مع نطاق تقريبي
-    if _SK_OK and len(y) >= 2:
-        model = LinearRegression().fit(x, y)
-        next_x_val = x[-1][0] + 1
-        pred = float(model.predict(np.array([[next_x_val]]) )[0])
-        resid = y - model.predict(x)
-        sigma = float(np.std(resid)) if len(resid) > 1 else 0.0
-        ci_low = max(0.0, pred - 1.96*sigma)
-        ci_high = pred + 1.96*sigma
-        return int(round(pred)), int(round(ci_low)), int(round(ci_high))
-
-    # تقدير مبسّط
-    if len(y) >= 2:
-        growth = y[-1] - y[-2]
-        pred = int(round(y[-1] + growth))
-        return pred, None, None
-
-    return None, None, None
-
-# نحسب التنبؤ على نطاق مقدّم الخدمة المختار (بدون تقييد الأسبوع؛ مع بقاء تقييد الشهر = الكل لكي يكون شهري شامل)
-df_for_forecast = df_scope.copy()
-pred_next, pred_ci_low, pred_ci_high = calc_forecast(df_for_forecast)
+    forecasts = all_state["forecasts"]
+    key = (kind, scope_key)
+    with all_state["lock"]:
+        if key in forecasts:
+            forecasts.move_to_end(key)
+            return forecasts[key]
+    fit = build()
+    with all_state["lock"]:
+        forecasts[key] = fit
+        while len(forecasts) > FORECAST_CACHE_ENTRIES:
+            forecasts.popitem(last=False)
+    return fit
+
+# نحسب التنبؤ على نطاق مقدّم الخدمة المختار (بدون تقييد الشهر/الأسبوع لكي يكون شهري شامل)
+# cube_scope مقيّد بنطاق التاريخ والمرشّحات الإضافية إن وُجدت، فالتنبؤ يُبنى من أشهرها وحدها
+forecast_scope = (tuple((c, v) for c, v in selection.items() if c not in PERIOD_COLS), date_range)
+forecast = scope_forecast("month", forecast_scope, lambda: fit_month_forecast(cube_scope))
+pred_next = pred_ci_low = pred_ci_high = None
+if forecast is not None and forecast["pred"] is not None:
+    pred_next = int(round(forecast["pred"]))
+    pred_ci_low, pred_ci_high = int(round(forecast["ci_low"])), int(round(forecast["ci_high"]))
 
 # بطاقة KPI للتنبؤ (سطر مستقل مباشرة بعد الـKPI الحالية)
 c_pred = st.columns(1)[0]
@@ -1041,7 +1359,7 @@ with c_pred:
     if pred_next is not None:
         ci_html = f'<div class="badge" style="margin-top:.35rem;">نطاق تقريبي: {pred_ci_low} – {pred_ci_high}</div>' if (pred_ci_low is not None and pred_ci_high is not None) else ""
         st.markdown(f"""<div class="kpi" style="margin-top:.5rem;">
-            <div class="title">توقّع الشهر القادم (حسب نطاق مقدّم الخدمة المختار)</div>
+            <div class="title">توقّع الشهر القادم (حسب نطاق مقدّم الخدمة{" والفترة" if date_range is not None else ""} المختار)</div>
             <div class="value">{pred_next}</div>
             {ci_html}
         </div>""", unsafe_allow_html=True)
@@ -1054,6 +1372,65 @@ with c_pred:
 
 st.markdown("<hr>", unsafe_allow_html=True)
 
+# =============== تنبيهات الارتفاع غير المعتاد (يومي) ===============
+# كاشف EWMA لكل سلسلة مقدّم خدمة × منطقة × شركة × نوع خدمة (anomalies.py). يُحدَّث مرة لكل نسخة
+# بيانات، والنسخة الناتجة عن إلحاق أسطر تطوي أيامها الجديدة فقط في الحالة المحفوظة.
+ANOMALY_RECENT_DAYS = 14
+
+def anomaly_alerts(all_state):
+    """
+    (جدول كل التنبيهات، حالة الكاشف) لنسخة البيانات الحالية. الكاشف المحفوظ لا يُعدَّل أبدًا
+    (update_detector يحدّث نسخة)، فالجلسات تقرؤه بلا قفل؛ الجديد يُبنى خارج القفل ويُبدَّل تحته.
+    """
+    cache = get_ingest_cache(INGEST_PIPELINE_VERSION)
+    with cache["lock"]:
+        detector = cache["anomalies"]
+    if detector is not None and detector["key"] == all_state["key"]:
+        return detector["table"], detector["state"]
+    state = update_detector(detector["state"] if detector else None, all_state["cube"])
+    updated = {"key": all_state["key"], "state": state, "table": anomaly_table(state)}
+    with cache["lock"]:
+        # جلسة أخرى بدّلته في الأثناء: نُبقي ما وضعته (الناتج نفسه لنفس النسخة)
+        if cache["anomalies"] is detector:
+            cache["anomalies"] = updated
+    return updated["table"], updated["state"]
+
+st.markdown('<div class="glass">', unsafe_allow_html=True)
+st.markdown("### 🚨 تنبيهات الارتفاع غير المعتاد في الاتصالات اليومية")
+alerts, detector_state = anomaly_alerts(all_state)
+# نفس مرشّحات الاختيار على مفاتيح السلاسل، ونطاق التاريخ أو آخر ANOMALY_RECENT_DAYS يومًا لكل مقدّم خدمة
+alert_mask = pd.Series(True, index=alerts.index)
+for col, values in selection.items():
+    if col in SERIES_KEYS:
+        alert_mask &= alerts[col].isin(values)
+if date_range is not None:
+    lo, hi = pd.Timestamp(date_range[0]), pd.Timestamp(date_range[1])
+    alert_mask &= alerts["التاريخ"].between(lo, hi)
+else:
+    provider_last = pd.to_datetime(alerts[PROVIDER_COL].map(detector_state["folded"])) + pd.Timedelta(days=1)
+    alert_mask &= alerts["التاريخ"] > provider_last - pd.Timedelta(days=ANOMALY_RECENT_DAYS)
+recent_alerts = alerts[alert_mask]
+if recent_alerts.empty:
+    st.success("لا توجد ارتفاعات غير معتادة ضمن النطاق " + ("والفترة المختارين." if date_range is not None else f"في آخر {ANOMALY_RECENT_DAYS} يومًا."))
+else:
+    alerts_show = recent_alerts.assign(**{
+        PROVIDER_COL: recent_alerts[PROVIDER_COL].map(provider_to_ar),
+        "التاريخ": recent_alerts["التاريخ"].dt.strftime("%a %Y-%m-%d"),
+        "العدد": recent_alerts["العدد"].astype(int),
+        "المتوقع": recent_alerts["المتوقع"].round(1),
+        "z": recent_alerts["z"].round(1),
+        "اليوم مفتوح": recent_alerts["اليوم مفتوح"].map({True: "نعم (آخر يوم)", False: ""}),
+    })
+    st.dataframe(alerts_show, use_container_width=True, hide_index=True, height=min(420, 38 + 35 * len(alerts_show)))
+update = detector_state["last_update"]
+st.caption(
+    f"{len(detector_state['mu']):,} سلسلة مراقبة • تنبيه عند z ≥ {Z_THRESHOLD:g} مقابل المتوسط والتباين الأسيّين للأيام "
+    f"السابقة (وعدد {MIN_COUNT} على الأقل، بعد {WARMUP_DAYS} يومًا من بداية السلسلة) • آخر تحديث: "
+    + ("إعادة بناء كاملة" if update["rebuilt"] else "تحديث تزايدي")
+    + f" بطيّ {update['days']} يوم جديد"
+)
+st.markdown('</div>', unsafe_allow_html=True)
+
 # =============== الرسوم البيانية مع دعم الثيم ===============
 plotly_template = "plotly_dark" if st.session_state["theme_mode"] == "dark" else "plotly_white"
 
@@ -1093,47 +1470,55 @@ st.markdown('<div class="glass">', unsafe_allow_html=True)
 st.markdown("### 📊 الرسوم البيانية")
 c1, c2 = st.columns(2)
 with c1:
-    if "المنطقة" in filtered.columns and not filtered.empty:
-        reg_counts = filtered["المنطقة"].value_counts().reset_index()
-        reg_counts.columns = ["المنطقة","العدد"]
-        fig_reg = px.bar(reg_counts, x="المنطقة", y="العدد", title="توزيع الاتصالات حسب المنطقة", text="العدد", color_discrete_sequence=theme_colors)
-        fig_reg.update_traces(textposition="outside")
-        fig_reg.update_layout(template=plotly_template, margin=dict(t=60,b=40,l=20,r=20), paper_bgcolor="rgba(0,0,0,0)", plot_bgcolor="rgba(0,0,0,0)")
-        st.plotly_chart(fig_reg, use_container_width=True)
+    if "المنطقة" in cube_f.columns and not cube_f.empty:
+        def region_figure():
+            reg_counts = cube_counts(cube_f, "المنطقة").reset_index()
+            reg_counts.columns = ["المنطقة","العدد"]
+            fig_reg = px.bar(reg_counts, x="المنطقة", y="العدد", title="توزيع الاتصالات حسب المنطقة", text="العدد", color_discrete_sequence=theme_colors)
+            fig_reg.update_traces(textposition="outside")
+            fig_reg.update_layout(template=plotly_template, margin=dict(t=60,b=40,l=20,r=20), paper_bgcolor="rgba(0,0,0,0)", plot_bgcolor="rgba(0,0,0,0)")
+            return fig_reg
+        st.plotly_chart(cached_result("fig_region", region_figure), use_container_width=True)
     else:
         st.info("لا تتوفر بيانات مناطق ضمن النطاق المحدد.")
 with c2:
-    if "نوع الخدمة" in filtered.columns and not filtered.empty:
-        tcounts = filtered["نوع الخدمة"].value_counts()
-        fig_type = px.pie(names=tcounts.index, values=tcounts.values, title="نسبة أنواع الاتصالات", hole=0.4, color_discrete_sequence=theme_colors)
-        fig_type.update_traces(textposition="inside", textinfo="percent+label")
-        fig_type.update_layout(template=plotly_template, margin=dict(t=60,b=40,l=20,r=20), paper_bgcolor="rgba(0,0,0,0)", plot_bgcolor="rgba(0,0,0,0)")
-        st.plotly_chart(fig_type, use_container_width=True)
+    if "نوع الخدمة" in cube_f.columns and not cube_f.empty:
+        def service_type_figure():
+            tcounts = cube_counts(cube_f, "نوع الخدمة")
+            fig_type = px.pie(names=tcounts.index, values=tcounts.values, title="نسبة أنواع الاتصالات", hole=0.4, color_discrete_sequence=theme_colors)
+            fig_type.update_traces(textposition="inside", textinfo="percent+label")
+            fig_type.update_layout(template=plotly_template, margin=dict(t=60,b=40,l=20,r=20), paper_bgcolor="rgba(0,0,0,0)", plot_bgcolor="rgba(0,0,0,0)")
+            return fig_type
+        st.plotly_chart(cached_result("fig_service_type", service_type_figure), use_container_width=True)
     else:
         st.info("لا تتوفر بيانات لأنواع الاتصالات ضمن النطاق المحدد.")
-if "الشركة" in filtered.columns and not filtered.empty:
-    comp_counts = filtered["الشركة"].value_counts().reset_index()
-    comp_counts.columns = ["الشركة","العدد"]
-    fig_comp = px.bar(comp_counts, x="الشركة", y="العدد", title="عدد الاتصالات حسب الشركة", text="العدد", color_discrete_sequence=theme_colors)
-    fig_comp.update_traces(textposition="outside")
-    fig_comp.update_layout(template=plotly_template, margin=dict(t=60,b=40,l=20,r=20), paper_bgcolor="rgba(0,0,0,0)", plot_bgcolor="rgba(0,0,0,0)")
-    st.plotly_chart(fig_comp, use_container_width=True)
+if "الشركة" in cube_f.columns and not cube_f.empty:
+    def company_figure():
+        comp_counts = cube_counts(cube_f, "الشركة").reset_index()
+        comp_counts.columns = ["الشركة","العدد"]
+        fig_comp = px.bar(comp_counts, x="الشركة", y="العدد", title="عدد الاتصالات حسب الشركة", text="العدد", color_discrete_sequence=theme_colors)
+        fig_comp.update_traces(textposition="outside")
+        fig_comp.update_layout(template=plotly_template, margin=dict(t=60,b=40,l=20,r=20), paper_bgcolor="rgba(0,0,0,0)", plot_bgcolor="rgba(0,0,0,0)")
+        return fig_comp
+    st.plotly_chart(cached_result("fig_company", company_figure), use_container_width=True)
 st.markdown('</div>', unsafe_allow_html=True)
 
 # =============== توزيع الاتصالات حسب مقدّم الخدمة (4 رسوم دائرية) ===============
 st.markdown('<div class="glass" style="margin-top:1rem;">', unsafe_allow_html=True)
 st.markdown("### 👥 نسبة الاتصالات حسب مقدّم الخدمة")
 
-agent_col = "مقدم الخدمة (ملف)" if "مقدم الخدمة (ملف)" in df_scope.columns else ("مقدم الخدمة" if "مقدم الخدمة" in df_scope.columns else None)
+agent_col = "مقدم الخدمة (ملف)" if "مقدم الخدمة (ملف)" in cube_scope.columns else ("مقدم الخدمة" if "مقدم الخدمة" in cube_scope.columns else None)
 
 if agent_col:
     col_total, col_oct, col_nov, col_week = st.columns(4)
 
     # --- 1) الإجمالي (حسب التصفية الحالية) ---
     with col_total:
-        if not filtered.empty:
-            ac_total = filtered[agent_col].value_counts()
-            if not ac_total.empty:
+        if not cube_f.empty:
+            def agents_total_figure():
+                ac_total = cube_counts(cube_f, agent_col)
+                if ac_total.empty:
+                    return None
                 names_total = ac_total.index.map(provider_to_ar) if agent_col == "مقدم الخدمة (ملف)" else ac_total.index
                 fig_agents_total = px.pie(
                     names=names_total, values=ac_total.values,
@@ -1142,6 +1527,9 @@ if agent_col:
                 )
                 fig_agents_total.update_traces(textposition="inside", textinfo="percent+label")
                 fig_agents_total.update_layout(template=plotly_template, margin=dict(t=60,b=40,l=20,r=20), paper_bgcolor="rgba(0,0,0,0)", plot_bgcolor="rgba(0,0,0,0)")
+                return fig_agents_total
+            fig_agents_total = cached_result("fig_agents_total", agents_total_figure)
+            if fig_agents_total is not None:
                 st.plotly_chart(fig_agents_total, use_container_width=True)
             else:
                 st.info("لا تتوفر بيانات لمقدّمي الخدمة ضمن التصفية الحالية.")
@@ -1150,10 +1538,12 @@ if agent_col:
 
     # --- 2) شهر Oct ---
     with col_oct:
-        df_oct_scope = df_scope[df_scope["الشهر"].astype(str).str.strip() == "Oct"].copy() if "الشهر" in df_scope.columns else pd.DataFrame()
+        df_oct_scope = cube_scope[cube_scope["الشهر"] == "Oct"] if "الشهر" in cube_scope.columns else pd.DataFrame()
         if not df_oct_scope.empty:
-            ac_oct = df_oct_scope[agent_col].value_counts()
-            if not ac_oct.empty:
+            def agents_oct_figure():
+                ac_oct = cube_counts(df_oct_scope, agent_col)
+                if ac_oct.empty:
+                    return None
                 names_oct = ac_oct.index.map(provider_to_ar) if agent_col == "مقدم الخدمة (ملف)" else ac_oct.index
                 fig_agents_oct = px.pie(
                     names=names_oct, values=ac_oct.values,
@@ -1162,6 +1552,9 @@ if agent_col:
                 )
                 fig_agents_oct.update_traces(textposition="inside", textinfo="percent+label")
                 fig_agents_oct.update_layout(template=plotly_template, margin=dict(t=60,b=40,l=20,r=20), paper_bgcolor="rgba(0,0,0,0)", plot_bgcolor="rgba(0,0,0,0)")
+                return fig_agents_oct
+            fig_agents_oct = cached_result("fig_agents_oct", agents_oct_figure)
+            if fig_agents_oct is not None:
                 st.plotly_chart(fig_agents_oct, use_container_width=True)
             else:
                 st.info("لا توجد بيانات لشهر Oct لنفس نطاق مقدّم الخدمة.")
@@ -1170,10 +1563,12 @@ if agent_col:
 
     # --- 3) شهر Nov ---
     with col_nov:
-        df_nov_scope = df_scope[df_scope["الشهر"].astype(str).str.strip() == "Nov"].copy() if "الشهر" in df_scope.columns else pd.DataFrame()
+        df_nov_scope = cube_scope[cube_scope["الشهر"] == "Nov"] if "الشهر" in cube_scope.columns else pd.DataFrame()
         if not df_nov_scope.empty:
-            ac_nov = df_nov_scope[agent_col].value_counts()
-            if not ac_nov.empty:
+            def agents_nov_figure():
+                ac_nov = cube_counts(df_nov_scope, agent_col)
+                if ac_nov.empty:
+                    return None
                 names_nov = ac_nov.index.map(provider_to_ar) if agent_col == "مقدم الخدمة (ملف)" else ac_nov.index
                 fig_agents_nov = px.pie(
                     names=names_nov, values=ac_nov.values,
@@ -1182,6 +1577,9 @@ if agent_col:
                 )
                 fig_agents_nov.update_traces(textposition="inside", textinfo="percent+label")
                 fig_agents_nov.update_layout(template=plotly_template, margin=dict(t=60,b=40,l=20,r=20), paper_bgcolor="rgba(0,0,0,0)", plot_bgcolor="rgba(0,0,0,0)")
+                return fig_agents_nov
+            fig_agents_nov = cached_result("fig_agents_nov", agents_nov_figure)
+            if fig_agents_nov is not None:
                 st.plotly_chart(fig_agents_nov, use_container_width=True)
             else:
                 st.info("لا توجد بيانات لشهر Nov لنفس نطاق مقدّم الخدمة.")
@@ -1190,22 +1588,24 @@ if agent_col:
 
     # --- 4) آخر أسبوع ---
     with col_week:
-        if "WeekStart" in df_scope.columns and not df_scope.dropna(subset=["WeekStart"]).empty:
-            latest_ws = pd.to_datetime(df_scope["WeekStart"]).max()
-            df_last_week = df_scope[pd.to_datetime(df_scope["WeekStart"]) == latest_ws].copy()
+        if "WeekStart" in cube_scope.columns and cube_scope["WeekStart"].notna().any():
+            latest_ws = cube_scope["WeekStart"].max()
+            df_last_week = cube_scope[cube_scope["WeekStart"] == latest_ws]
             if not df_last_week.empty:
-                ac_week = df_last_week[agent_col].value_counts()
-                names_week = ac_week.index.map(provider_to_ar) if agent_col == "مقدم الخدمة (ملف)" else ac_week.index
-                we = pd.to_datetime(df_last_week["WeekEnd"].iloc[0]) if "WeekEnd" in df_last_week.columns else latest_ws + pd.Timedelta(days=6)
-                week_title = f"نسبة الاتصالات — آخر أسبوع ({latest_ws.strftime('%b %d')}–{we.strftime('%b %d')})"
-                fig_agents_week = px.pie(
-                    names=names_week, values=ac_week.values,
-                    title=week_title, hole=0.4,
-                    color_discrete_sequence=theme_colors
-                )
-                fig_agents_week.update_traces(textposition="inside", textinfo="percent+label")
-                fig_agents_week.update_layout(template=plotly_template, margin=dict(t=60,b=40,l=20,r=20), paper_bgcolor="rgba(0,0,0,0)", plot_bgcolor="rgba(0,0,0,0)")
-                st.plotly_chart(fig_agents_week, use_container_width=True)
+                def agents_week_figure():
+                    ac_week = cube_counts(df_last_week, agent_col)
+                    names_week = ac_week.index.map(provider_to_ar) if agent_col == "مقدم الخدمة (ملف)" else ac_week.index
+                    we = pd.to_datetime(df_last_week["WeekEnd"].iloc[0]) if "WeekEnd" in df_last_week.columns else latest_ws + pd.Timedelta(days=6)
+                    week_title = f"نسبة الاتصالات — آخر أسبوع ({latest_ws.strftime('%b %d')}–{we.strftime('%b %d')})"
+                    fig_agents_week = px.pie(
+                        names=names_week, values=ac_week.values,
+                        title=week_title, hole=0.4,
+                        color_discrete_sequence=theme_colors
+                    )
+                    fig_agents_week.update_traces(textposition="inside", textinfo="percent+label")
+                    fig_agents_week.update_layout(template=plotly_template, margin=dict(t=60,b=40,l=20,r=20), paper_bgcolor="rgba(0,0,0,0)", plot_bgcolor="rgba(0,0,0,0)")
+                    return fig_agents_week
+                st.plotly_chart(cached_result("fig_agents_week", agents_week_figure), use_container_width=True)
             else:
                 st.info("لا توجد بيانات في آخر أسبوع داخل هذا النطاق.")
         else:
@@ -1217,30 +1617,16 @@ st.markdown('</div>', unsafe_allow_html=True)
 # =============== (إضافة جديدة) Visual: التنبؤ بالاتصالات للشهر القادم ===============
 st.markdown('<div class="glass" style="margin-top:1rem;">', unsafe_allow_html=True)
 st.markdown("### التنبؤ بالاتصالات للشهر القادم")
-MONTHS_12 = ["Jan","Feb","Mar","Apr","May","Jun","Jul","Aug","Sep","Oct","Nov","Dec"]
-
-def next_month_label(curr: str) -> str:
-    if curr not in MONTHS_12:
-        return curr
-    i = MONTHS_12.index(curr)
-    return MONTHS_12[(i + 1) % 12]
-
-def forecast_figure(df_month_scope: pd.DataFrame):
-    if df_month_scope is None or df_month_scope.empty or "الشهر" not in df_month_scope.columns:
-        return None
-
-    # نحافظ على ترتيب الأشهر كما في MONTH_ORDER الموجودة (Aug, Sep, Oct, Nov)
-    month_totals = df_month_scope["الشهر"].value_counts().reindex(MONTH_ORDER).dropna()
-    if len(month_totals) < 1:
+def forecast_figure(fit):
+    """منحنى الإجمالي الشهري من ملاءمة scope_forecast نفسها التي تعرضها بطاقة التوقع."""
+    if fit is None:
         return None
 
-    # x الفعلية = أسماء الأشهر الموجودة فعليًا بالترتيب
-    x_labels_actual = month_totals.index.tolist()            # مثال: ['Aug','Sep','Oct','Nov']
-    x_idx = np.arange(len(x_labels_actual)).reshape(-1, 1)   # 0,1,2 …
-    y_val = month_totals.values.astype(float)
-
+    # x الفعلية = أسماء الأشهر الموجودة فعليًا بترتيب MONTH_ORDER (مثال: ['Aug','Sep','Oct','Nov'])
+    x_labels_actual = fit["months"]
+    y_val = fit["y"]
     # اسم الشهر القادم الحقيقي (بدون modulo)
-    next_label = next_month_label(x_labels_actual[-1])
+    next_label = fit["next_month"]
 
     fig = go.Figure()
 
@@ -1250,22 +1636,13 @@ def forecast_figure(df_month_scope: pd.DataFrame):
         line=dict(width=3, color=theme_colors[0]), marker=dict(size=8, color=theme_colors[0])
     ))
 
-    # نموذج خطي + نقطة التنبؤ + النطاق التقريبي
-    if _SK_OK and len(y_val) >= 2:
-        from sklearn.linear_model import LinearRegression
-        model = LinearRegression().fit(x_idx, y_val)
-        next_x_numeric = np.array([[len(x_labels_actual)]])  # التالي بعد آخر نقطة فعلية
-        pred = float(model.predict(next_x_numeric)[0])
-
-        resid = y_val - model.predict(x_idx)
-        sigma = float(np.std(resid)) if len(resid) > 1 else 0.0
-        ci_low = max(0.0, pred - 1.96 * sigma)
-        ci_high = pred + 1.96 * sigma
+    # خط الاتجاه + نقطة التنبؤ + النطاق التقريبي
+    if fit["pred"] is not None:
+        pred = fit["pred"]
 
         # خط الاتجاه: من أول شهر فعلي إلى الشهر المتوقع
-        line_x_full_num = np.arange(0, len(x_labels_actual) + 1)
         line_x_full_lbl = x_labels_actual + [next_label]
-        line_y_full = model.predict(line_x_full_num.reshape(-1, 1))
+        line_y_full = trend_at(fit, np.append(fit["x"], fit["next_x"]))
 
         fig.add_trace(go.Scatter(
             x=line_x_full_lbl, y=line_y_full, mode="lines", name="اتجاه",
@@ -1280,26 +1657,13 @@ def forecast_figure(df_month_scope: pd.DataFrame):
         # عمود النطاق التقريبي على نفس التصنيف (Nov)
         ci_color = f"rgba({int(theme_colors[3][1:3], 16)},{int(theme_colors[3][3:5], 16)},{int(theme_colors[3][5:7], 16)},0.3)"
         fig.add_trace(go.Scatter(
-            x=[next_label, next_label], y=[ci_low, ci_high], mode="lines", name="نطاق تقريبي",
+            x=[next_label, next_label], y=[fit["ci_low"], fit["ci_high"]], mode="lines", name="نطاق تقريبي",
             line=dict(color=ci_color, width=8)
         ))
         # نثبت ترتيب المحور السيني لعرض Nov بعد Oct
         fig.update_layout(
             xaxis=dict(categoryorder="array", categoryarray=line_x_full_lbl)
         )
-    else:
-        # بدون Sklearn: نعرض الفعلي فقط + نقطة تقدير مبسّطة إن توفرت شهران
-        if len(y_val) >= 2:
-            growth = y_val[-1] - y_val[-2]
-            pred = int(round(y_val[-1] + growth))
-            fig.add_trace(go.Scatter(
-                x=[next_label], y=[pred], mode="markers+text", name="توقع مبسّط",
-                marker=dict(size=12, symbol="diamond", color=theme_colors[2]),
-                text=[str(pred)], textposition="top center"
-            ))
-            fig.update_layout(
-                xaxis=dict(categoryorder="array", categoryarray=x_labels_actual + [next_label])
-            )
 
     fig.update_layout(
         title="منحنى الإجمالي الشهري + التوقع القادم",
@@ -1315,7 +1679,7 @@ def forecast_figure(df_month_scope: pd.DataFrame):
     return fig
 
 
-fig_pred = forecast_figure(df_for_forecast)
+fig_pred = cached_result("fig_forecast", lambda: forecast_figure(forecast))
 if fig_pred is not None:
     st.plotly_chart(fig_pred, use_container_width=True)
 else:
@@ -1323,6 +1687,133 @@ else:
 
 st.markdown('</div>', unsafe_allow_html=True)
 
+# =============== جدول التنبؤ لكل سلسلة (مقدّم خدمة × منطقة × نوع خدمة) ===============
+# كل السلاسل ضمن النطاق الحالي تُلاءم دفعة واحدة (forecasting.batch_month_forecast)،
+# والجدول كاملًا قابل للتنزيل لتخطيط السعة.
+st.markdown('<div class="glass" style="margin-top:1rem;">', unsafe_allow_html=True)
+st.markdown("### 📋 توقّع الشهر القادم لكل مقدّم خدمة × منطقة × نوع خدمة")
+batch_table = scope_forecast("batch", forecast_scope, lambda: batch_month_forecast(cube_scope))
+if batch_table.empty:
+    st.info("لا توجد سلاسل ضمن النطاق الحالي.")
+else:
+    batch_show = batch_table.copy()
+    if "مقدم الخدمة (ملف)" in batch_show.columns:
+        batch_show["مقدم الخدمة (ملف)"] = batch_show["مقدم الخدمة (ملف)"].astype(object).map(provider_to_ar)
+    batch_show[["التوقع", "الحد الأدنى", "الحد الأعلى", "الميل الشهري"]] = (
+        batch_show[["التوقع", "الحد الأدنى", "الحد الأعلى", "الميل الشهري"]].round(1)
+    )
+    st.dataframe(batch_show, use_container_width=True, hide_index=True, height=360)
+    n_fitted = int(batch_table["التوقع"].notna().sum())
+    st.caption(
+        f"{len(batch_table):,} سلسلة، منها {n_fitted:,} بشهرين أو أكثر (لها توقع ونطاق تقريبي 95%)؛ "
+        "السلاسل بشهر واحد تظهر بدون توقع."
+    )
+    batch_csv = cached_result("forecast_batch_csv", lambda: batch_show.to_csv(index=False).encode("utf-8-sig"))
+    st.download_button(
+        "⬇️ تنزيل جدول التوقعات (CSV)", batch_csv,
+        file_name="forecast_next_month.csv", mime="text/csv",
+    )
+st.markdown('</div>', unsafe_allow_html=True)
+
+# =============== توقّع يومي/أسبوعي مع اختبار رجعي ===============
+# السلسلة اليومية (أو الأسابيع الكاملة) للنطاق الحالي، وكل نموذج يُختبر على كل نقاط القطع؛
+# الأفضل (أقل MAE) يعطي توقعات الأيام/الأسابيع القادمة، ويُحفظ مع ملاءمات النطاق.
+st.markdown('<div class="glass" style="margin-top:1rem;">', unsafe_allow_html=True)
+st.markdown("### 📅 توقّع الأيام/الأسابيع القادمة (مع اختبار رجعي)")
+GRANULARITY_LABELS = {"daily": "يومي", "weekly": "أسبوعي"}
+granularity = st.radio(
+    "الدقة", list(GRANULARITIES), format_func=GRANULARITY_LABELS.get, horizontal=True, key="period_granularity",
+)
+period_fit = scope_forecast(granularity, forecast_scope, lambda: fit_period_forecast(cube_scope, granularity))
+
+def period_forecast_figure(fit):
+    """آخر 8 أسابيع من السلسلة (أو كل الأسابيع) + توقعات النموذج الأفضل ونطاقها التقريبي."""
+    series = fit["series"]
+    if fit["granularity"] == "daily":
+        series = series.iloc[-56:]
+    fig = go.Figure()
+    fig.add_trace(go.Scatter(
+        x=fit["dates"].append(fit["dates"][::-1]), y=np.concatenate([fit["ci_high"], fit["ci_low"][::-1]]),
+        fill="toself", fillcolor="rgba(128,128,128,0.18)", line=dict(width=0),
+        name="نطاق تقريبي", hoverinfo="skip",
+    ))
+    fig.add_trace(go.Scatter(
+        x=series.index, y=series.to_numpy(), mode="lines+markers", name="فعلي",
+        line=dict(width=2, color=theme_colors[0]), marker=dict(size=5, color=theme_colors[0])
+    ))
+    fig.add_trace(go.Scatter(
+        x=fit["dates"], y=fit["pred"], mode="lines+markers", name=f"توقع ({MODEL_LABELS[fit['model']]})",
+        line=dict(dash="dot", width=2, color=theme_colors[2]), marker=dict(size=7, symbol="diamond", color=theme_colors[2])
+    ))
+    fig.update_layout(
+        title=f"{GRANULARITY_LABELS[fit['granularity']]}: الفعلي + توقع الأفق القادم",
+        template=plotly_template,
+        paper_bgcolor="rgba(0,0,0,0)",
+        plot_bgcolor="rgba(0,0,0,0)",
+        margin=dict(t=60, b=40, l=20, r=20),
+        yaxis_title="عدد الاتصالات",
+        showlegend=True,
+        hovermode="x unified"
+    )
+    return fig
+
+if period_fit is None:
+    _, horizon, min_train = GRANULARITIES[granularity]
+    unit = "يومًا" if granularity == "daily" else "أسبوعًا كاملًا"
+    st.info(f"السلسلة قصيرة للاختبار الرجعي: تحتاج {min_train + horizon} {unit} على الأقل ضمن النطاق.")
+else:
+    fig_period = cached_result(f"fig_forecast_{granularity}", lambda: period_forecast_figure(period_fit))
+    st.plotly_chart(fig_period, use_container_width=True)
+    backtest_show = period_fit["backtest"].assign(
+        model=period_fit["backtest"]["model"].map(MODEL_LABELS),
+        params=period_fit["backtest"]["params"].map(
+            lambda p: "" if p is None else f"α={p[0]:g}، β={p[1]:g}" + (f"، γ={p[2]:g}" if granularity == "daily" else "")
+        ),
+        mae=period_fit["backtest"]["mae"].round(2),
+        mape=period_fit["backtest"]["mape"].round(1),
+    ).rename(columns={
+        "model": "النموذج", "params": "المعاملات", "mae": "MAE", "mape": "MAPE %", "origins": "نقاط القطع",
+    })
+    st.dataframe(backtest_show, use_container_width=True, hide_index=True)
+    st.caption(
+        f"النموذج المختار: {MODEL_LABELS[period_fit['model']]} (أقل MAE على {int(period_fit['backtest']['origins'].iat[0])} "
+        f"نقطة قطع، كل منها يتوقع {GRANULARITIES[granularity][1]} "
+        + ("أيام" if granularity == "daily" else "أسابيع")
+        + " من البيانات السابقة لها فقط). MAPE على الفترات التي فيها اتصالات فقط."
+    )
+st.markdown('</div>', unsafe_allow_html=True)
+
+# =============== احتياج الموظفين (Erlang C) ===============
+# توقع الأيام القادمة (النموذج اليومي الأفضل أعلاه) -> عدد الموظفين لكل يوم عمل يحقق هدف
+# مستوى الخدمة، مع مستوى الخدمة والإشغال ومتوسط الانتظار المتوقعة (staffing.py).
+st.markdown('<div class="glass" style="margin-top:1rem;">', unsafe_allow_html=True)
+st.markdown("### 👥 احتياج الموظفين للأيام القادمة (Erlang C)")
+s1, s2, s3, s4 = st.columns(4)
+with s1:
+    aht_seconds = st.number_input("متوسط مدة المكالمة (ثانية)", min_value=10, max_value=3600, value=DEFAULT_AHT_SECONDS, step=10)
+with s2:
+    sl_target = st.number_input("هدف مستوى الخدمة %", min_value=50, max_value=99, value=int(DEFAULT_SERVICE_LEVEL * 100), step=5)
+with s3:
+    answer_seconds = st.number_input("الرد خلال (ثانية)", min_value=5, max_value=600, value=DEFAULT_ANSWER_SECONDS, step=5)
+with s4:
+    open_hours = st.number_input("ساعات العمل اليومية", min_value=1, max_value=24, value=DEFAULT_OPEN_HOURS, step=1)
+
+daily_fit = scope_forecast("daily", forecast_scope, lambda: fit_period_forecast(cube_scope, "daily"))
+if daily_fit is None:
+    st.info("لا يتوفر توقع يومي لهذا النطاق (السلسلة قصيرة)، فلا يمكن حساب الاحتياج.")
+else:
+    staff = staffing_table(
+        daily_fit["dates"].strftime("%a %Y-%m-%d"), daily_fit["pred"], aht_seconds=aht_seconds,
+        target=sl_target / 100, answer_seconds=answer_seconds, open_hours=open_hours, calls_high=daily_fit["ci_high"],
+    )
+    st.dataframe(staff.round({col: (2 if col == "الحمل (Erlang)" else 1) for col in staff.columns}),
+                 use_container_width=True, hide_index=True)
+    st.caption(
+        f"المكالمات موزّعة بالتساوي على {open_hours} ساعات عمل؛ الهدف {sl_target}% من المكالمات خلال "
+        f"{answer_seconds} ثانية. عمود الحد الأعلى يستخدم الحد الأعلى لنطاق التوقع التقريبي."
+    )
+st.markdown('</div>', unsafe_allow_html=True)
+
 # ───────────────────────── Map (static lat/lon) ─────────────────────────
 st.markdown('<div class="glass" style="margin-top:1rem;">', unsafe_allow_html=True)
 st.markdown("### خريطة الاتصالات حسب المدينة/المنطقة")
@@ -1358,6 +1849,7 @@ REGION_LATLON = {
 }
 
 def build_map_df(df: pd.DataFrame) -> pd.DataFrame:
+    """df هنا خلايا مكعب العدّ (عمود n)."""
     if df.empty:
         return pd.DataFrame(columns=["label","lat","lon","count"])
 
@@ -1366,7 +1858,7 @@ def build_map_df(df: pd.DataFrame) -> pd.DataFrame:
     # استخدمي "المدينة" (بعد التوحيد)، وإن ما وجدت ارجعي للاسم القديم احتياطًا
     city_col = "المدينة" if "المدينة" in df.columns else ("المدينه " if "المدينه " in df.columns else None)
     if city_col:
-        vc = df[city_col].astype(str).str.strip().value_counts()
+        vc = cube_counts(df, df[city_col].astype(str).str.strip())
         for name, n in vc.items():
             if name in CITY_LATLON:
                 lat, lon = CITY_LATLON[name]
@@ -1374,7 +1866,7 @@ def build_map_df(df: pd.DataFrame) -> pd.DataFrame:
 
     # لو ما فيه مدن مطابقة، جربي على مستوى "المنطقة"
     if not rows and "المنطقة" in df.columns:
-        vc = df["المنطقة"].astype(str).str.strip().value_counts()
+        vc = cube_counts(df, df["المنطقة"].astype(str).str.strip())
         for name, n in vc.items():
             if name in REGION_LATLON:
                 lat, lon = REGION_LATLON[name]
@@ -1383,46 +1875,48 @@ def build_map_df(df: pd.DataFrame) -> pd.DataFrame:
     return pd.DataFrame(rows)
 
 # ابنِ الداتا ثم ارسم ثم خزّن
-map_df = build_map_df(filtered)
+map_df = build_map_df(cube_f)
 if not map_df.empty:
     try:
-        # استخدام scatter_geo الذي يعمل بدون الحاجة لـ Mapbox token
-        fig_map = px.scatter_geo(
-            map_df,
-            lat="lat",
-            lon="lon",
-            size="count",
-            color="count",
-            hover_name="label",
-            hover_data={"lat": False, "lon": False, "count": True},
-            size_max=30,
-            title="خريطة توزيع الاتصالات",
-            projection="natural earth",
-        )
-        map_bgcolor = "rgba(20,20,20,0.8)" if st.session_state["theme_mode"] == "dark" else "rgba(240,240,240,0.8)"
-        land_color = "rgba(30,30,30,0.5)" if st.session_state["theme_mode"] == "dark" else "rgba(220,220,220,0.5)"
+        def map_figure():
+            # استخدام scatter_geo الذي يعمل بدون الحاجة لـ Mapbox token
+            fig_map = px.scatter_geo(
+                map_df,
+                lat="lat",
+                lon="lon",
+                size="count",
+                color="count",
+                hover_name="label",
+                hover_data={"lat": False, "lon": False, "count": True},
+                size_max=30,
+                title="خريطة توزيع الاتصالات",
+                projection="natural earth",
+            )
+            map_bgcolor = "rgba(20,20,20,0.8)" if st.session_state["theme_mode"] == "dark" else "rgba(240,240,240,0.8)"
+            land_color = "rgba(30,30,30,0.5)" if st.session_state["theme_mode"] == "dark" else "rgba(220,220,220,0.5)"
         
-        fig_map.update_geos(
-            visible=True,
-            resolution=50,
-            showcountries=True,
-            countrycolor="rgba(255,255,255,0.3)",
-            showcoastlines=True,
-            coastlinecolor="rgba(255,255,255,0.2)",
-            showland=True,
-            landcolor=land_color,
-            showocean=True,
-            oceancolor=map_bgcolor,
-            bgcolor="rgba(0,0,0,0)",
-        )
-        fig_map.update_layout(
-            paper_bgcolor="rgba(0,0,0,0)",
-            plot_bgcolor="rgba(0,0,0,0)",
-            margin=dict(t=60, b=40, l=10, r=10),
-            height=520,
-            geo=dict(center=dict(lat=24, lon=45), projection_scale=5),
-        )
-        st.plotly_chart(fig_map, use_container_width=True)
+            fig_map.update_geos(
+                visible=True,
+                resolution=50,
+                showcountries=True,
+                countrycolor="rgba(255,255,255,0.3)",
+                showcoastlines=True,
+                coastlinecolor="rgba(255,255,255,0.2)",
+                showland=True,
+                landcolor=land_color,
+                showocean=True,
+                oceancolor=map_bgcolor,
+                bgcolor="rgba(0,0,0,0)",
+            )
+            fig_map.update_layout(
+                paper_bgcolor="rgba(0,0,0,0)",
+                plot_bgcolor="rgba(0,0,0,0)",
+                margin=dict(t=60, b=40, l=10, r=10),
+                height=520,
+                geo=dict(center=dict(lat=24, lon=45), projection_scale=5),
+            )
+            return fig_map
+        st.plotly_chart(cached_result("fig_map", map_figure), use_container_width=True)
     except Exception as e:
         # محاولة بديلة بدون Mapbox token
         try:
@@ -1472,12 +1966,15 @@ try:
     import re
 
     if "الخدمه المطلوبه" in filtered.columns and not filtered.empty:
-        # اجمع نصوص العمود ونظّفها
-        text_series = filtered["الخدمه المطلوبه"].dropna().astype(str)
-        text_list = [t.strip() for t in text_series.tolist() if t.strip() and t.strip().lower() != "nan"]
-        text_raw = " ".join(text_list)
+        def wordcloud_png():
+            # اجمع نصوص العمود ونظّفها
+            text_series = filtered["الخدمه المطلوبه"].dropna().astype(str)
+            text_list = [t.strip() for t in text_series.tolist() if t.strip() and t.strip().lower() != "nan"]
+            text_raw = " ".join(text_list)
+
+            if len(text_raw) <= 3:
+                return None
 
-        if len(text_raw) > 3:
             # تهيئة العربية (تشكيـل وربط الحروف + اتجاه العرض)
             reshaped = arabic_reshaper.reshape(text_raw)
             bidi_text = get_display(reshaped)
@@ -1542,7 +2039,10 @@ try:
             buf.seek(0)
             img_b64 = base64.b64encode(buf.read()).decode("utf-8")
             plt.close(fig); buf.close()
+            return img_b64
 
+        img_b64 = cached_result("wordcloud", wordcloud_png)
+        if img_b64 is not None:
             st.markdown(
                 f'<div style="text-align:center;"><img src="data:image/png;base64,{img_b64}" '
                 f'style="max-width:100%;height:auto;border-radius:12px;box-shadow:{current_theme["shadow"]}" /></div>',
@@ -1597,43 +2097,152 @@ cols_base = cols_priority + cols_secondary
 show_cols = [c for c in cols_base if c in filtered.columns]
 
 q = st.text_input("ابحث داخل الجدول (الاسم/الشركة/المدينة/النوع/الخدمة...)", "")
-table_df = filtered.copy()
-if q.strip() and show_cols:
-    ql = q.strip().lower()
-    mask = np.zeros(len(table_df), dtype=bool)
-    for c in show_cols:
-        s = table_df[c].astype(str).str.lower()
-        mask |= s.str.contains(ql, na=False)
-    table_df = table_df[mask]
+# الجدول يُدار كمواضع صفوف من "__ALL__" (أو في قاعدة محرك SQL): البحث والترتيب والتقسيم
+# لصفحات على الخادم، ولا يُرسل للمتصفح إلا صفوف الصفحة الحالية (حجمها لا يتغير مع عدد الاتصالات).
 if show_cols:
-    # ترجمة اسم الملف للعرض
-    if "مقدم الخدمة (ملف)" in table_df.columns:
-        table_df["مقدم الخدمة (ملف)"] = table_df["مقدم الخدمة (ملف)"].map(provider_to_ar)
-    
+    NO_SORT = "بدون ترتيب"
+    t1, t2, t3, t4 = st.columns([1.6, 1, 1, 1])
+    with t1:
+        sort_col = st.selectbox("ترتيب حسب", [NO_SORT] + show_cols, index=0)
+    with t2:
+        sort_dir = st.selectbox("الاتجاه", ["تصاعدي", "تنازلي"], index=0)
+    with t3:
+        page_size = st.selectbox("صفوف في الصفحة", [50, 100, 250, 500], index=1)
+    # البحث: أ/إ/آ، ة/ه، ى/ي والتشكيل لا تفرّق، كل كلمة تطابق بداية كلمة، والأرقام تطابق أي
+    # جزء من الجوال (فهرس search_rows في الذاكرة، أو نفس القواعد في محرك SQL)
+    if query_engine is not None:
+        total_rows = query_count(query_engine, selection, query=q, dates=date_range)
+    else:
+        table_rows = filtered.index.to_numpy()
+        if q.strip():
+            hits = search_rows(search_index(all_state), q)
+            if hits is not None:
+                table_rows = intersect_rows(hits, table_rows)
+        total_rows = len(table_rows)
+    n_pages = max(1, -(-total_rows // page_size))
+    # أي تغيير في الفلاتر/البحث/الترتيب يعيد الجدول للصفحة الأولى
+    table_sig = (result_key, q.strip(), sort_col, sort_dir, page_size)
+    if st.session_state.get("detail_table_sig") != table_sig:
+        st.session_state["detail_table_sig"] = table_sig
+        st.session_state["detail_page"] = 1
+    st.session_state["detail_page"] = min(st.session_state.get("detail_page", 1), n_pages)
+    with t4:
+        page = int(st.number_input("الصفحة", min_value=1, max_value=n_pages, step=1, key="detail_page"))
+    start = (page - 1) * page_size
+    order_by = None if sort_col == NO_SORT else sort_col
+
     # التأكد من أن جميع البيانات محفوظة بدون تعديل أو حذف
     # عرض اسم العميل كما هو مسجل (سواء كان اسم حقيقي أو "عميل")
-    display_df = table_df[show_cols].reset_index(drop=True).copy()
+    if query_engine is not None:
+        # الترتيب والقطع (ORDER BY ... LIMIT/OFFSET) في القاعدة نفسها
+        display_df = query_page(query_engine, show_cols, selection, query=q, dates=date_range, order_by=order_by,
+                                ascending=(sort_dir == "تصاعدي"), limit=page_size, offset=start)
+    else:
+        if order_by and total_rows:
+            table_rows = sort_rows(table_rows, order_by, ascending=(sort_dir == "تصاعدي"))
+        # rows_frame يعيد نسخة بصفوف الصفحة فقط، فالتعديل عليها لا يمس الإطار المشترك
+        page_df = rows_frame(table_rows[start:start + page_size])
+        if PHONE_COL in show_cols:
+            # الجوال كما كُتب (بأصفاره في أوله) كما يعيده محرك SQL
+            page_df[PHONE_COL] = phone_digits(page_df[PHONE_COL], page_df.get(PHONE_WIDTH_COL))
+        # نسخة صريحة: تعديل عمود مقدم الخدمة تحت لا يطلق SettingWithCopyWarning
+        display_df = page_df[show_cols].copy()
+    display_df.index = pd.RangeIndex(start, start + len(display_df))
+
+    # ترجمة اسم الملف للعرض
+    if "مقدم الخدمة (ملف)" in display_df.columns:
+        display_df["مقدم الخدمة (ملف)"] = display_df["مقدم الخدمة (ملف)"].map(provider_to_ar)
     
     # تنسيق الأعمدة لضمان الوضوح
     st.dataframe(display_df, use_container_width=True, height=460)
+    st.caption(
+        f"إجمالي السجلات: {total_rows:,} — عرض {min(start + 1, total_rows):,}–{start + len(display_df):,} "
+        f"(صفحة {page:,} من {n_pages:,})"
+    )
 st.markdown('</div>', unsafe_allow_html=True)
 
 # =============== ملخص ذكي مختصر ===============
 st.markdown('<div class="glass" style="margin-top:1rem;">', unsafe_allow_html=True)
 st.markdown("### 🤖 ملخّص ذكي")
-def quick_summary(df: pd.DataFrame) -> str:
-    if df.empty: return "لا تتوفر بيانات ضمن النطاق المحدد."
-    parts = [f"إجمالي الاتصالات: **{len(df)}**."]
-    if "المنطقة" in df.columns and not df["المنطقة"].value_counts().empty:
-        parts.append(f"الأكثر نشاطًا: **{df['المنطقة'].value_counts().idxmax()}**.")
-    if "نوع الخدمة" in df.columns and not df["نوع الخدمة"].value_counts().empty:
-        parts.append(f"نوع الخدمة الأكثر شيوعا: **{df['نوع الخدمة'].value_counts().idxmax()}**.")
-    if "الشركة" in df.columns and not df["الشركة"].value_counts().empty:
-        parts.append(f"الشركة الأبرز: **{df['الشركة'].value_counts().idxmax()}**.")
+def quick_summary(cube: pd.DataFrame) -> str:
+    if cube.empty: return "لا تتوفر بيانات ضمن النطاق المحدد."
+    parts = [f"إجمالي الاتصالات: **{int(cube['n'].sum())}**."]
+    if "المنطقة" in cube.columns and not cube_counts(cube, "المنطقة").empty:
+        parts.append(f"الأكثر نشاطًا: **{cube_counts(cube, 'المنطقة').idxmax()}**.")
+    if "نوع الخدمة" in cube.columns and not cube_counts(cube, "نوع الخدمة").empty:
+        parts.append(f"نوع الخدمة الأكثر شيوعا: **{cube_counts(cube, 'نوع الخدمة').idxmax()}**.")
+    if "الشركة" in cube.columns and not cube_counts(cube, "الشركة").empty:
+        parts.append(f"الشركة الأبرز: **{cube_counts(cube, 'الشركة').idxmax()}**.")
     return " ".join(parts)
-st.write(quick_summary(filtered))
+st.write(cached_result("summary", lambda: quick_summary(cube_f)))
 st.markdown('</div>', unsafe_allow_html=True)
 
+# نتائج هذا التشغيل اكتملت: تُخزَّن لنفس التركيبة (الإصابة لا تُعاد كتابتها)
+if not results_from_cache:
+    result_cache_put(result_key, page_results)
+enforce_memory_budget(all_state)
+
+# =============== حالة كاش تحميل الملفات ===============
+ingest_cache = get_ingest_cache(INGEST_PIPELINE_VERSION)
+result_cache = get_result_cache()
+with st.expander("🗂️ حالة كاش تحميل الملفات"):
+    run_status = pd.Series([r["الحالة"] for r in ingest_cache["report"]], dtype=object).value_counts()
+    st.caption(
+        f"هذا التحميل: {run_status.get('hit', 0)} إصابة / {run_status.get('miss', 0) + run_status.get('snapshot', 0) + run_status.get('append', 0)} إخفاق "
+        f"(منها {run_status.get('snapshot', 0)} من اللقطات العمودية و {run_status.get('append', 0)} إلحاق بأسطر جديدة فقط) • "
+        f"منذ تشغيل الخادم: {ingest_cache['hits']} إصابة / {ingest_cache['misses']} إخفاق"
+    )
+    st.caption(
+        f"محرك الاستعلام: {query_engine['kind']} ({query_engine['label']})"
+        if query_engine is not None else "محرك الاستعلام: pandas (الفهارس والمكعب في الذاكرة)"
+    )
+    max_entries, max_bytes = result_cache_limits()
+    st.caption(
+        f"كاش النتائج (مشترك بين الجلسات): {result_cache['hits']} إصابة / {result_cache['misses']} إخفاق • "
+        f"{len(result_cache['entries'])}/{max_entries} تركيبة، {result_cache['bytes'] / 1e6:.2f}/{max_bytes / 1e6:.0f} MB • "
+        f"{result_cache['evictions']} إخلاء"
+    )
+    st.caption(f"ملاءمات التنبؤ المحفوظة لهذه النسخة: {len(all_state['forecasts'])} (الشهر القادم، جدول كل السلاسل، واليومي/الأسبوعي؛ مرة لكل نطاق)")
+    if ingest_cache["memory"]:
+        mem = ingest_cache["memory"]
+        st.caption(
+            f"الذاكرة (نسخة واحدة مشتركة لكل الملفات): {mem['after'] / 1e6:.2f} MB بالتمثيل المضغوط "
+            f"مقابل {mem['before'] / 1e6:.2f} MB كنصوص"
+        )
+    if ingest_cache["report"]:
+        st.dataframe(pd.DataFrame(ingest_cache["report"]), use_container_width=True, hide_index=True)
+    # الذاكرة المقيمة: نسخة واحدة للعملية مهما كان عدد الجلسات المفتوحة
+    sizes = shared_memory_report(all_state)
+    budget = memory_budget_bytes()
+    process_rss = psutil.Process().memory_info().rss if _PSUTIL_OK else None
+    st.markdown("**الذاكرة المقيمة (مشتركة بين كل الجلسات):**")
+    part_names = {
+        "df": "الإطار الأساسي __ALL__", "index": "فهرس الصفوف", "cube": "مكعب العدّ",
+        "search": "فهرس البحث", "sort_orders": "ترتيبات الأعمدة", "results": "كاش النتائج",
+    }
+    st.dataframe(pd.DataFrame([
+        {"البنية": part_names[part], "الحجم (MB)": round(size / 1e6, 2),
+         "قابلة للإخلاء": "نعم" if part in EVICTABLE_PARTS else "لا"}
+        for part, size in sizes.items()
+    ]), use_container_width=True, hide_index=True)
+    fixed = sum(size for part, size in sizes.items() if part not in EVICTABLE_PARTS)
+    st.caption(
+        f"المجموع: {sum(sizes.values()) / 1e6:.2f} MB • الميزانية ({MEMORY_BUDGET_ENV}): "
+        + (f"{budget / (1 << 20):g} MB" if budget else "بلا حد")
+        + f" • إخلاءات: ترتيبات الأعمدة {ingest_cache['evictions']['sort_orders']}، "
+          f"فهرس البحث {ingest_cache['evictions']['search']}"
+        + (f" • ذاكرة العملية (RSS): {process_rss / 1e6:.0f} MB" if process_rss is not None else "")
+    )
+    if budget and fixed > budget:
+        st.caption("⚠️ البيانات الأساسية وحدها تتجاوز الميزانية؛ لا يُخلى شيء حتى تُرفع الميزانية.")
+    bad_lines_report = [
+        {"الملف": os.path.basename(path), **bad}
+        for path, entry in ingest_cache["files"].items() for bad in entry["bad_lines"]
+    ]
+    if bad_lines_report:
+        st.markdown("**الأسطر التالفة التي لم تدخل البيانات:**")
+        st.dataframe(pd.DataFrame(bad_lines_report), use_container_width=True, hide_index=True)
+
 # =============== تذييل مع معلومات إضافية ===============
 st.markdown('<div class="glass" style="margin-top:1.5rem; text-align:center;">', unsafe_allow_html=True)
 st.markdown(f"""
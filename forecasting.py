@@ -0,0 +1,308 @@
+# -*- coding: utf-8 -*-
+# التنبؤ بعدد الاتصالات للشهر القادم: اتجاه خطي على الإجماليات الشهرية لنطاق الاختيار
+# بالمربعات الصغرى في صيغة مغلقة (بدون sklearn). الملاءمة تُحسب مرة واحدة لكل (نسخة بيانات،
+# نطاق) وتُحفظ معلماتها وانحراف البواقي والنطاق التقريبي، ومنها تُقرأ بطاقة KPI ومنحنى التنبؤ
+# معًا فلا يختلفان. المحور السيني هو موضع الشهر في MONTH_ORDER (الأشهر الغائبة فجوات حقيقية).
+# مثل ingestion.py، هذا الملف لا يستورد streamlit.
+import numpy as np
+import pandas as pd
+
+from ingestion import MONTH_ORDER, MONTH_INDEX
+
+MONTHS_12 = ["Jan","Feb","Mar","Apr","May","Jun","Jul","Aug","Sep","Oct","Nov","Dec"]
+CI_Z = 1.96   # نطاق تقريبي 95% حول التوقع
+
+def next_month_label(curr: str) -> str:
+    if curr not in MONTHS_12:
+        return curr
+    i = MONTHS_12.index(curr)
+    return MONTHS_12[(i + 1) % 12]
+
+def month_totals(cube: pd.DataFrame) -> pd.Series:
+    """إجمالي كل شهر من خلايا مكعب العدّ بترتيب MONTH_ORDER (الأشهر الخالية محذوفة)."""
+    if cube is None or cube.empty or "الشهر" not in cube.columns:
+        return pd.Series(dtype=float)
+    totals = cube["n"].groupby(cube["الشهر"], observed=True).sum().reindex(MONTH_ORDER)
+    return totals[totals > 0].astype(float)
+
+def fit_linear(x: np.ndarray, y: np.ndarray):
+    """ميل وتقاطع المربعات الصغرى: slope = cov(x, y) / var(x). يتطلب نقطتين بقيمتي x مختلفتين."""
+    x_mean, y_mean = x.mean(), y.mean()
+    dx = x - x_mean
+    slope = float(dx @ (y - y_mean) / (dx @ dx))
+    return slope, float(y_mean - slope * x_mean)
+
+def fit_month_forecast(cube: pd.DataFrame):
+    """
+    يلائم الاتجاه على إجماليات cube الشهرية ويعيد قاموسًا للقراءة فقط:
+    months/x/y (الفعلي)، slope/intercept، sigma (انحراف البواقي)، next_month/next_x،
+    pred و ci_low/ci_high. مع شهر واحد فقط pred = None (الفعلي يُرسم بدون توقع)،
+    وبدون بيانات النتيجة None.
+    """
+    totals = month_totals(cube)
+    if totals.empty:
+        return None
+    months = totals.index.tolist()
+    x = np.array([MONTH_INDEX[m] for m in months], dtype=float)
+    y = totals.to_numpy()
+    fit = {
+        "months": months, "x": x, "y": y,
+        "slope": None, "intercept": None, "sigma": None,
+        "next_month": next_month_label(months[-1]), "next_x": x[-1] + 1,
+        "pred": None, "ci_low": None, "ci_high": None,
+    }
+    if len(y) >= 2:
+        slope, intercept = fit_linear(x, y)
+        sigma = float(np.std(y - (slope * x + intercept)))
+        pred = slope * fit["next_x"] + intercept
+        fit.update(
+            slope=slope, intercept=intercept, sigma=sigma, pred=pred,
+            ci_low=max(0.0, pred - CI_Z * sigma), ci_high=pred + CI_Z * sigma,
+        )
+    x.flags.writeable = False
+    y.flags.writeable = False
+    return fit
+
+def trend_at(fit, x):
+    """قيم خط الاتجاه الملائم عند مواضع x."""
+    return fit["slope"] * np.asarray(x, dtype=float) + fit["intercept"]
+
+# =============== تنبؤ دفعة واحدة لكل سلسلة (مقدّم خدمة × منطقة × نوع خدمة) ===============
+# كل السلاسل مصفوفة واحدة (سلسلة × شهر في MONTH_ORDER)، والأشهر الخالية في سلسلة ما غائبة
+# عنها كما في fit_month_forecast (وزن 0). المعادلات الطبيعية لكل السلاسل (2×2 لكل سلسلة)
+# تُحل باستدعاء np.linalg.solve واحد على المكدّس، فآلاف السلاسل في أجزاء من الثانية.
+BATCH_KEYS = ["مقدم الخدمة (ملف)", "المنطقة", "نوع الخدمة"]
+BATCH_COLUMNS = ["الأشهر", "آخر شهر", "الشهر القادم", "التوقع", "الحد الأدنى", "الحد الأعلى", "الميل الشهري"]
+
+def month_matrix(cube: pd.DataFrame, keys=BATCH_KEYS):
+    """(مفاتيح السلاسل، مصفوفة الإجماليات سلسلة × MONTH_ORDER) من خلايا مكعب العدّ."""
+    keys = [k for k in keys if k in cube.columns]
+    if not keys or "الشهر" not in cube.columns or cube.empty:
+        return pd.DataFrame(columns=keys), np.zeros((0, len(MONTH_ORDER)))
+    totals = (
+        cube.groupby(keys + ["الشهر"], observed=True, dropna=False)["n"].sum()
+        .unstack("الشهر").reindex(columns=MONTH_ORDER).fillna(0)
+    )
+    totals = totals[totals.to_numpy().sum(axis=1) > 0]
+    return totals.index.to_frame(index=False), totals.to_numpy(dtype=float)
+
+def fit_month_batch(Y: np.ndarray):
+    """
+    يلائم اتجاهًا خطيًا لكل صف من Y (سلسلة × شهر) على أشهره غير الخالية. يعيد قاموس مصفوفات:
+    months (عدد الأشهر)، last (موضع آخر شهر)، slope/intercept، sigma، pred و ci_low/ci_high
+    للشهر الذي يلي آخر شهر. السلاسل ذات الشهر الواحد قيمها NaN.
+    """
+    W = (Y > 0).astype(float)
+    x = np.arange(Y.shape[1], dtype=float)
+    X = np.column_stack([np.ones_like(x), x])             # تقاطع + ميل
+    months = W.sum(axis=1).astype(int)
+    ok = months >= 2
+    A = np.einsum("sm,mp,mq->spq", W, X, X)
+    b = np.einsum("sm,mp->sp", Y, X)                       # Y صفر حيث W صفر
+    A[~ok] = np.eye(2)                                     # يبقي المكدّس قابلًا للحل؛ النتائج تُستبعد بعده
+    beta = np.linalg.solve(A, b[..., None])[..., 0]
+    intercept, slope = beta[:, 0], beta[:, 1]
+    resid = W * (Y - (intercept[:, None] + slope[:, None] * x))
+    sigma = np.sqrt((resid ** 2).sum(axis=1) / np.maximum(months, 1))
+    last = Y.shape[1] - 1 - np.argmax(W[:, ::-1], axis=1)
+    pred = intercept + slope * (last + 1)
+    for arr in (slope, intercept, sigma, pred):
+        arr[~ok] = np.nan
+    return {
+        "months": months, "last": last, "slope": slope, "intercept": intercept, "sigma": sigma,
+        "pred": pred, "ci_low": np.maximum(0.0, pred - CI_Z * sigma), "ci_high": pred + CI_Z * sigma,
+    }
+
+def batch_month_forecast(cube: pd.DataFrame, keys=BATCH_KEYS) -> pd.DataFrame:
+    """جدول توقع الشهر القادم لكل سلسلة في cube (صف لكل تركيبة مفاتيح) بأعمدة BATCH_COLUMNS."""
+    labels, Y = month_matrix(cube, keys)
+    if not len(Y):
+        return pd.DataFrame(columns=list(labels.columns) + BATCH_COLUMNS)
+    fit = fit_month_batch(Y)
+    last_month = np.array(MONTH_ORDER, dtype=object)[fit["last"]]
+    table = labels.assign(**{
+        "الأشهر": fit["months"],
+        "آخر شهر": last_month,
+        "الشهر القادم": [next_month_label(m) for m in last_month],
+        "التوقع": fit["pred"],
+        "الحد الأدنى": fit["ci_low"],
+        "الحد الأعلى": fit["ci_high"],
+        "الميل الشهري": fit["slope"],
+    })
+    return table.sort_values("التوقع", ascending=False, na_position="last", kind="stable", ignore_index=True)
+
+# =============== تنبؤ يومي/أسبوعي مع اختبار رجعي (rolling origin) ===============
+# السلسلة اليومية من عمود التاريخ في مكعب العدّ (الأيام بلا اتصالات = 0، فالجمعة مثلًا قيمة
+# حقيقية منخفضة)، والأسبوعية مجموع الأسابيع الكاملة أحد–سبت منها. كل نموذج يعطي توقعات كل
+# نقاط القطع دفعة واحدة: مصفوفة (نقطة قطع × أفق) من y[:t] فقط لكل t، فالاختبار الرجعي على كل
+# نقاط القطع مرور واحد بعمليات مصفوفات (هولت-وينترز: مرور واحد على الزمن لكل شبكة المعاملات
+# معًا). النموذج الأفضل هو الأقل MAE؛ MAPE على الأيام غير الصفرية فقط.
+DATE_COL = "التاريخ/Date"
+GRANULARITIES = {
+    # الدقة: (موسمية، الأفق، أقل طول تدريب)
+    "daily": (7, 7, 28),
+    "weekly": (None, 4, 8),
+}
+MODEL_LABELS = {
+    "naive": "آخر قيمة",
+    "seasonal_naive": "نفس اليوم من الأسبوع الماضي",
+    "moving_average": "متوسط متحرك",
+    "drift": "انجراف خطي",
+    "holt_winters": "هولت-وينترز",
+}
+HW_ALPHAS = (0.1, 0.3, 0.5, 0.8)
+HW_BETAS = (0.0, 0.05, 0.2)
+HW_GAMMAS = (0.1, 0.3)
+
+def daily_series(cube: pd.DataFrame) -> pd.Series:
+    """إجمالي كل يوم من أول يوم إلى آخر يوم في cube (الأيام الخالية 0)."""
+    if cube is None or cube.empty or DATE_COL not in cube.columns:
+        return pd.Series(dtype=float)
+    daily = cube["n"].groupby(cube[DATE_COL].dt.normalize()).sum()
+    if daily.empty:
+        return pd.Series(dtype=float)
+    days = pd.date_range(daily.index.min(), daily.index.max(), freq="D")
+    return daily.reindex(days, fill_value=0).astype(float)
+
+def weekly_series(daily: pd.Series) -> pd.Series:
+    """مجموع كل أسبوع أحد–سبت مغطى بالكامل بالسلسلة اليومية (الأسابيع الطرفية الناقصة تُحذف)."""
+    if daily.empty:
+        return daily
+    weeks = daily.resample("W-SAT", label="left", closed="left").agg(["sum", "size"])
+    weeks = weeks[weeks["size"] == 7]["sum"]
+    weeks.index = weeks.index + pd.Timedelta(days=1)   # بداية الأسبوع (الأحد)
+    return weeks.astype(float)
+
+def _target_index(origins, horizon, period):
+    """موضع آخر قيمة بنفس الطور (period) قبل كل نقطة قطع، لكل خطوة في الأفق."""
+    h = np.arange(horizon)
+    return origins[:, None] - period + (h % period)[None, :]
+
+def forecast_naive(y, origins, horizon, period=None):
+    return np.repeat(y[origins - 1][:, None], horizon, axis=1)
+
+def forecast_seasonal_naive(y, origins, horizon, period=7):
+    return y[_target_index(origins, horizon, period)]
+
+def forecast_moving_average(y, origins, horizon, period=None):
+    window = period or 4
+    csum = np.concatenate([[0.0], np.cumsum(y)])
+    mean = (csum[origins] - csum[origins - window]) / window
+    return np.repeat(mean[:, None], horizon, axis=1)
+
+def forecast_drift(y, origins, horizon, period=None):
+    slope = (y[origins - 1] - y[0]) / (origins - 1)
+    return y[origins - 1][:, None] + slope[:, None] * np.arange(1, horizon + 1)[None, :]
+
+def holt_winters_grid(y, origins, horizon, period=None):
+    """
+    هولت-وينترز جمعي (أو هولت بدون موسمية إن period=None) لكل تركيبة في شبكة المعاملات:
+    مرور واحد على الزمن بمصفوفات بطول الشبكة، وتوقعات كل نقاط القطع من الحالات المحفوظة.
+    يعيد (توقعات: شبكة × نقطة قطع × أفق، المعاملات: شبكة × 3).
+    """
+    m = period or 1
+    gammas = HW_GAMMAS if period else (0.0,)
+    params = np.array([(a, b, g) for a in HW_ALPHAS for b in HW_BETAS for g in gammas])
+    alpha, beta, gamma = params[:, 0], params[:, 1], params[:, 2]
+    n, grid = len(y), len(params)
+    level = np.full(grid, y[:m].mean())
+    trend = np.zeros(grid)
+    season = np.zeros((grid, n))                 # season[:, i] تقدير طور i المحسوب عند i
+    if period:
+        season[:, :m] = y[:m] - y[:m].mean()
+    levels, trends = np.zeros((grid, n + 1)), np.zeros((grid, n + 1))
+    levels[:, m], trends[:, m] = level, trend    # الحالة بعد رؤية y[:m]
+    for i in range(m, n):
+        s_prev = season[:, i - m] if period else 0.0
+        new_level = alpha * (y[i] - s_prev) + (1 - alpha) * (level + trend)
+        trend = beta * (new_level - level) + (1 - beta) * trend
+        level = new_level
+        if period:
+            season[:, i] = gamma * (y[i] - level) + (1 - gamma) * s_prev
+        levels[:, i + 1], trends[:, i + 1] = level, trend
+    steps = np.arange(1, horizon + 1)
+    fc = levels[:, origins, None] + trends[:, origins, None] * steps[None, None, :]
+    if period:
+        fc = fc + season[:, _target_index(origins, horizon, period)]
+    return fc, params
+
+def forecast_errors(actual, fc):
+    """MAE و MAPE (٪، على القيم الفعلية غير الصفرية) على آخر محورين (نقطة قطع × أفق)."""
+    err = np.abs(actual - fc)
+    mae = err.mean(axis=(-2, -1))
+    nonzero = actual > 0
+    ape = np.where(nonzero, err / np.where(nonzero, actual, 1.0), 0.0)
+    mape = 100 * ape.sum(axis=(-2, -1)) / max(int(nonzero.sum()), 1)
+    return mae, mape
+
+MODELS = {
+    "naive": forecast_naive,
+    "seasonal_naive": forecast_seasonal_naive,
+    "moving_average": forecast_moving_average,
+    "drift": forecast_drift,
+}
+
+def backtest(y: np.ndarray, granularity="daily"):
+    """
+    اختبار رجعي بنقاط قطع متدحرجة: كل t من أقل طول تدريب حتى n - الأفق، والتوقعات من y[:t]
+    تُقارن بـ y[t:t+الأفق]. يعيد (جدول النماذج مرتبًا بالأفضل، قاموس النموذج الأفضل) أو None
+    إن كانت السلسلة أقصر من أقل تدريب + أفق.
+    """
+    period, horizon, min_train = GRANULARITIES[granularity]
+    n = len(y)
+    if n < min_train + horizon:
+        return None
+    origins = np.arange(min_train, n - horizon + 1)
+    actual = np.lib.stride_tricks.sliding_window_view(y, horizon)[origins]
+    rows, forecasts = [], {}
+    for name, model in MODELS.items():
+        if name == "seasonal_naive" and not period:
+            continue
+        fc = model(y, origins, horizon, period)
+        mae, mape = forecast_errors(actual, fc)
+        rows.append({"model": name, "params": None, "mae": mae, "mape": mape})
+        forecasts[name] = fc
+    hw, params = holt_winters_grid(y, origins, horizon, period)
+    mae, mape = forecast_errors(actual[None], hw)
+    best = int(np.argmin(mae))
+    rows.append({"model": "holt_winters", "params": tuple(params[best]), "mae": mae[best], "mape": mape[best]})
+    forecasts["holt_winters"] = hw[best]
+    table = pd.DataFrame(rows).sort_values("mae", kind="stable", ignore_index=True)
+    table["origins"] = len(origins)
+    winner = table.iloc[0]
+    # نطاق تقريبي لكل خطوة في الأفق من أخطاء الاختبار الرجعي للنموذج الأفضل
+    rmse = np.sqrt(((actual - forecasts[winner["model"]]) ** 2).mean(axis=0))
+    return table, {"model": winner["model"], "params": winner["params"], "rmse": rmse}
+
+def forecast_ahead(y: np.ndarray, best, granularity="daily"):
+    """توقعات الأفق التالي بعد آخر قيمة في y بالنموذج الأفضل (ومعاملاته إن وُجدت)."""
+    period, horizon, _ = GRANULARITIES[granularity]
+    origin = np.array([len(y)])
+    if best["model"] != "holt_winters":
+        return MODELS[best["model"]](y, origin, horizon, period)[0]
+    fc, params = holt_winters_grid(y, origin, horizon, period)
+    return fc[np.flatnonzero((params == best["params"]).all(axis=1))[0], 0]
+
+def fit_period_forecast(cube: pd.DataFrame, granularity="daily"):
+    """
+    السلسلة (يومية أو أسبوعية)، جدول الاختبار الرجعي والنموذج الأفضل، وتوقعات الأفق التالي
+    مع نطاق تقريبي 95% (± CI_Z × RMSE الاختبار لكل خطوة). None إن كانت السلسلة قصيرة.
+    """
+    series = daily_series(cube)
+    if granularity == "weekly":
+        series = weekly_series(series)
+    y = series.to_numpy(dtype=float)
+    tested = backtest(y, granularity)
+    if tested is None:
+        return None
+    table, best = tested
+    pred = np.maximum(forecast_ahead(y, best, granularity), 0.0)
+    step = pd.Timedelta(days=7 if granularity == "weekly" else 1)
+    return {
+        "granularity": granularity, "series": series, "backtest": table, "model": best["model"],
+        "params": best["params"],
+        "dates": pd.date_range(series.index[-1] + step, periods=len(pred), freq=step),
+        "pred": pred,
+        "ci_low": np.maximum(0.0, pred - CI_Z * best["rmse"]),
+        "ci_high": pred + CI_Z * best["rmse"],
+    }
@@ -0,0 +1,1302 @@
+# -*- coding: utf-8 -*-
+# خط معالجة ملفات CSV لمقدّمي الخدمة: القراءة، التوحيد، الأسابيع، واللقطات العمودية.
+# هذا الملف لا يستورد streamlit عمدًا: دواله تُستدعى من app.py ومن عمّال
+# ProcessPoolExecutor (التي تستورد هذا الملف من جديد في كل عملية).
+import os, io, re, sys, csv, json, hashlib, itertools, functools, warnings, logging
+from concurrent.futures import ProcessPoolExecutor, BrokenExecutor
+import multiprocessing
+import numpy as np
+import pandas as pd
+
+log = logging.getLogger(__name__)
+
+# ========== pyarrow اختياري للقطات العمودية ونقل الإطارات بين العمليات ==========
+_PA_OK = True
+try:
+    import pyarrow as pa
+except Exception:
+    _PA_OK = False
+# ============================================================
+
+# =============== إعداد الشهور ===============
+MONTH_ORDER = ["Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]  # المعتمدة
+MONTH_INDEX = {m:i for i,m in enumerate(MONTH_ORDER)}
+MONTH_MAP = {"Jan":1,"Feb":2,"Mar":3,"Apr":4,"May":5,"Jun":6,"Jul":7,"Aug":8,"Sep":9,"Oct":10,"Nov":11,"Dec":12}
+INV_MONTH_MAP = {v:k for k,v in MONTH_MAP.items()}
+
+# أسماء الأشهر بالعربية (تُستخدم في وسم الأسبوع)
+MONTH_AR = {
+    "Jul": "يوليو", "Aug": "أغسطس", "Sep": "سبتمبر", 
+    "Oct": "أكتوبر", "Nov": "نوفمبر", "Dec": "ديسمبر"
+}
+
+# --- توحيد قيم الشهر (Oct/October/أكتوبر… -> Oct) ---
+MONTH_SYNONYMS = {
+    "jul": "Jul", "jul.": "Jul", "july": "Jul", "يوليو": "Jul",
+    "aug": "Aug", "aug.": "Aug", "august": "Aug", "أغسطس": "Aug", "اغسطس": "Aug",
+    "sep": "Sep", "sep.": "Sep", "september": "Sep", "سبتمبر": "Sep",
+    "oct": "Oct", "oct.": "Oct", "october": "Oct", "أكتوبر": "Oct", "اكتوبر": "Oct",
+    "nov": "Nov", "nov.": "Nov", "november": "Nov", "نوفمبر": "Nov",
+    "dec": "Dec", "dec.": "Dec", "december": "Dec", "ديسمبر": "Dec",
+}
+def normalize_month_column(month: pd.Series, dates: pd.Series) -> pd.Series:
+    """
+    توحيد عمود الشهر دفعة واحدة (Oct/October/أكتوبر… -> Oct).
+    المنطق يُطبَّق على القيم الفريدة فقط (جدول بحث) ثم يُعاد لكل صف عبر الـ codes:
+    - قيمة فارغة/nan/none أو غير معروفة -> الشهر من التاريخ.
+    - قيمة ضمن MONTH_ORDER أو المرادفات -> الشهر الموحّد.
+    - أول 3 أحرف اسم شهر معروف -> الشهر إن كان ضمن MONTH_ORDER وإلا NaN.
+    النتيجة محصورة في MONTH_ORDER (غير ذلك NaN).
+    """
+    from_date = dates.dt.month.map(INV_MONTH_MAP)
+    from_date = from_date.where(from_date.isin(MONTH_ORDER), np.nan)
+
+    codes, uniq = pd.factorize(month)      # NaN -> code = -1
+    s = pd.Series(uniq.astype(str)).str.strip()
+    s_lower = s.str.lower()
+
+    use_date = (s == "") | s_lower.isin(["nan", "none"])
+    canon = s.where(s.isin(MONTH_ORDER)).fillna(s_lower.map(MONTH_SYNONYMS))
+    prefix = s.str[:3].str.title().where(s.str.len() >= 3)
+    by_prefix = canon.isna() & prefix.isin(list(MONTH_MAP)) & ~use_date
+    canon = canon.where(~by_prefix, prefix.where(prefix.isin(MONTH_ORDER)))
+    use_date = use_date | (canon.isna() & ~by_prefix)
+    canon = canon.where(~use_date)
+
+    # الموضع الأخير مخصص لـ code = -1 (القيم الفارغة) فيرجع للتاريخ
+    fixed = np.append(canon.to_numpy(dtype=object), np.nan)[codes]
+    from_dt = np.append(use_date.to_numpy(dtype=bool), True)[codes]
+    out = pd.Series(np.where(from_dt, from_date.to_numpy(dtype=object), fixed), index=month.index, dtype=object)
+    return out.where(out.isin(MONTH_ORDER), np.nan)
+
+# =============== توحيد الأعمدة ===============
+def normalize_columns(df: pd.DataFrame) -> pd.DataFrame:
+    if df is None or df.empty:
+        return df
+    df = df.rename(columns=lambda c: str(c).strip())
+    mapping = {
+        "التاريخ ": "التاريخ",
+        "Date": "التاريخ", "date": "التاريخ",
+        "المنطقه": "المنطقة",
+        "المدينه ": "المدينة", "المدينه": "المدينة",
+        "الخدمة المطلوبة": "الخدمه المطلوبه",
+        "نوع الخدمه": "نوع الخدمة",
+        "اسم العميل ": "اسم العميل",
+        "رقم الجوال ": "رقم الجوال",
+    }
+    df = df.rename(columns={c: mapping.get(c, c) for c in df.columns})
+    return df
+
+# =============== بناء التاريخ من (الشهر + اليوم) ===============
+def build_date_from_month_day(row: pd.Series):
+    # محاولة قراءة التاريخ مباشرة إذا كان موجوداً بتنسيق تاريخ
+    raw_date = row.get("التاريخ","")
+    if pd.notna(raw_date) and raw_date != "":
+        raw_str = str(raw_date).strip()
+        if "/" in raw_str or "-" in raw_str:
+            dt = pd.to_datetime(raw_str, dayfirst=True, errors="coerce")
+            if pd.notna(dt):
+                return dt
+    
+    # محاولة بناء التاريخ من الشهر واليوم
+    month_val = row.get("الشهر","")
+    day_val = row.get("التاريخ","")
+    
+    # معالجة الشهر
+    month_str = ""
+    if pd.notna(month_val) and month_val != "":
+        month_str = str(month_val).strip()
+    
+    # إذا كان الشهر في MONTH_MAP مباشرة (مثل "Nov", "Oct")
+    if month_str in MONTH_MAP:
+        try:
+            # محاولة استخراج اليوم من عمود التاريخ
+            day_str = str(day_val).strip() if pd.notna(day_val) and day_val != "" else "1"
+            # إزالة أي تنسيقات تاريخية
+            if "/" in day_str:
+                day_str = day_str.split("/")[0].strip()
+            elif "-" in day_str:
+                day_str = day_str.split("-")[0].strip()
+            day = int(float(day_str)) if day_str and day_str.replace(".","").isdigit() else 1
+            # التأكد من أن اليوم صحيح (1-31)
+            day = max(1, min(31, day))
+            return pd.Timestamp(year=2025, month=MONTH_MAP[month_str], day=day)
+        except (ValueError, TypeError) as e:
+            # إذا فشل، نرجع NaT
+            return pd.NaT
+    
+    # محاولة استخدام normalize_month_value للشهر
+    if month_str:
+        month_lower = month_str.lower()
+        if month_lower in MONTH_SYNONYMS:
+            canon_month = MONTH_SYNONYMS[month_lower]
+            if canon_month in MONTH_MAP:
+                try:
+                    day_str = str(day_val).strip() if pd.notna(day_val) and day_val != "" else "1"
+                    if "/" in day_str:
+                        day_str = day_str.split("/")[0].strip()
+                    elif "-" in day_str:
+                        day_str = day_str.split("-")[0].strip()
+                    day = int(float(day_str)) if day_str and day_str.replace(".","").isdigit() else 1
+                    day = max(1, min(31, day))
+                    return pd.Timestamp(year=2025, month=MONTH_MAP[canon_month], day=day)
+                except (ValueError, TypeError):
+                    return pd.NaT
+    
+    return pd.NaT
+
+# =============== بناء عمود التاريخ دفعة واحدة (vectorized) ===============
+def build_date_column(df: pd.DataFrame) -> pd.Series:
+    """
+    نسخة عمودية من build_date_from_month_day بنفس النتائج:
+    - رقم الشهر من جدول بحث (MONTH_MAP ثم المرادفات) على القيم الفريدة.
+    - اليوم من عمليات نصية على القيم الفريدة لعمود التاريخ ثم يُعاد بالـ codes.
+    - التواريخ تُجمَّع مرة واحدة من (سنة، شهر، يوم).
+    القيم النادرة (تاريخ كامل d/m/Y أو أرقام غير لاتينية) تمر على
+    build_date_from_month_day مرة واحدة لكل زوج (شهر، تاريخ) فريد.
+    """
+    out = pd.Series(pd.NaT, index=df.index, dtype="datetime64[ns]")
+    if df.empty:
+        return out
+    empty_col = pd.Series("", index=df.index, dtype=object)
+    month = df["الشهر"] if "الشهر" in df.columns else empty_col
+    raw = df["التاريخ"] if "التاريخ" in df.columns else empty_col
+
+    # رقم الشهر لكل قيمة فريدة
+    m_codes, m_uniq = pd.factorize(month)
+    m_str = pd.Series(m_uniq.astype(str)).str.strip()
+    syn_num = {k: MONTH_MAP[v] for k, v in MONTH_SYNONYMS.items()}
+    m_num_u = m_str.map(MONTH_MAP).fillna(m_str.str.lower().map(syn_num))
+    m_num = np.append(m_num_u.to_numpy(dtype=float), np.nan)[m_codes]
+
+    # اليوم لكل قيمة فريدة: الجزء قبل "/" أو "-"، والافتراضي 1
+    d_codes, d_uniq = pd.factorize(raw)
+    d_str = pd.Series(d_uniq.astype(str)).str.strip()
+    has_sep = d_str.str.contains("/", regex=False) | d_str.str.contains("-", regex=False)
+    day_str = d_str.str.split("/", n=1).str[0].str.split("-", n=1).str[0].str.strip()
+    is_digit = day_str.str.replace(".", "", regex=False).str.isdigit()
+    day_num = pd.to_numeric(day_str.where(is_digit), errors="coerce")
+    odd = (is_digit & day_num.isna()) | has_sep     # تحتاج المسار الصفّي
+    day_u = np.clip(np.trunc(day_num.fillna(1).to_numpy(dtype=float)), 1, 31)
+    day = np.append(day_u, 1.0)[d_codes]
+    slow = np.append(odd.to_numpy(dtype=bool), False)[d_codes]
+
+    # تجميع التواريخ مرة واحدة (يوم خارج الشهر مثل 31 سبتمبر -> NaT)
+    fast = ~np.isnan(m_num) & ~slow
+    if fast.any():
+        parts = pd.DataFrame({"year": 2025, "month": m_num[fast].astype(int), "day": day[fast].astype(int)})
+        out.iloc[np.flatnonzero(fast)] = pd.to_datetime(parts, errors="coerce").to_numpy()
+
+    # المسار الصفّي: مرة واحدة لكل زوج (شهر، تاريخ) فريد
+    slow_pos = np.flatnonzero(slow)
+    if len(slow_pos):
+        key = m_codes[slow_pos].astype(np.int64) * (len(d_uniq) + 1) + d_codes[slow_pos]
+        _, first, inverse = np.unique(key, return_index=True, return_inverse=True)
+        values = [
+            build_date_from_month_day({"الشهر": month.iloc[p], "التاريخ": raw.iloc[p]})
+            for p in slow_pos[first]
+        ]
+        parsed = pd.to_datetime(pd.Series(values, dtype=object), errors="coerce").to_numpy(dtype="datetime64[ns]")
+        out.iloc[slow_pos] = parsed[inverse]
+    return out
+
+
+# =============== أسابيع الأحد→السبت وترقيمها داخل الشهر ===============
+DAY_NS = 86_400 * 10**9
+
+def add_week_columns(df: pd.DataFrame) -> pd.DataFrame:
+    if df.empty or "التاريخ/Date" not in df.columns:
+        df["ISO_Year"]=np.nan; df["ISO_Week"]=np.nan
+        df["WeekStart"]=pd.NaT; df["WeekEnd"]=pd.NaT
+        df["رقم الأسبوع"]=np.nan; df["وسم الأسبوع"]=""
+        return df
+
+    # أسبوع العمل يبدأ الأحد. بالحساب الصحيح على النانوثانية: 1970-01-01 كان خميسًا،
+    # لذلك (رقم اليوم + 4) % 7 = عدد الأيام منذ الأحد السابق
+    dates = df["التاريخ/Date"]
+    nat = dates.isna().to_numpy()
+    ns = dates.to_numpy(dtype="datetime64[ns]").view("i8")
+    ws_ns = np.where(nat, np.iinfo(np.int64).min, ns - ((ns // DAY_NS + 4) % 7) * DAY_NS)
+    df["WeekStart"] = pd.Series(ws_ns.view("datetime64[ns]"), index=df.index)
+    df["WeekEnd"]   = df["WeekStart"] + pd.to_timedelta(6, unit="D")  # السبت (أسبوع كامل)
+
+    # ISO والوسم يُحسبان مرة لكل أسبوع فريد ثم يُوزَّعان على الصفوف عبر الـ codes
+    ws_codes, ws_uniq = pd.factorize(df["WeekStart"])
+    iso = pd.DatetimeIndex(ws_uniq).isocalendar()
+    df["ISO_Year"]  = pd.Series(iso["year"].array.take(ws_codes, allow_fill=True), index=df.index)
+    df["ISO_Week"]  = pd.Series(iso["week"].array.take(ws_codes, allow_fill=True), index=df.index)
+
+    if "الشهر" in df.columns:
+        # نستخدم التاريخ الفعلي (WeekStart) كـ identifier موحّد بدلاً من ترقيم منفصل لكل مقدم خدمة
+        # هذا يضمن أن نفس الأسبوع له نفس الوسم في جميع الملفات.
+        # الوسم يُبنى مرة واحدة لكل زوج (شهر, بداية أسبوع) ويخرج Categorical مباشرة.
+        m_codes, m_uniq = pd.factorize(df["الشهر"])
+        n_ws = len(ws_uniq) + 1
+        pair_codes, pair_uniq = pd.factorize((m_codes + 1) * n_ws + (ws_codes + 1))
+        labels = []
+        for pair in pair_uniq:
+            m, w = pair // n_ws - 1, pair % n_ws - 1
+            if w < 0:
+                labels.append("")
+                continue
+            month = m_uniq[m] if m >= 0 else np.nan
+            month_name_ar = MONTH_AR.get(month, month)
+            ws = ws_uniq[w]
+            we = ws + pd.Timedelta(days=6)
+            labels.append(f"{month_name_ar} - الأسبوع ({ws.strftime('%d/%m')}–{we.strftime('%d/%m')})")
+        cats, label_codes = np.unique(np.array(labels, dtype=object), return_inverse=True)
+        df["وسم الأسبوع"] = pd.Categorical.from_codes(label_codes[pair_codes], categories=cats)
+
+        # رقم الأسبوع يعتمد على كل أسابيع الشهر في الملف، لذلك يُحسب في
+        # rank_weeks_in_months بعد تجميع الملف كاملًا (وليس لكل chunk)
+        df["رقم الأسبوع"] = np.nan
+    else:
+        df["رقم الأسبوع"] = np.nan
+        df["وسم الأسبوع"] = ""
+
+    return df
+
+def rank_weeks_in_months(d: pd.DataFrame) -> pd.DataFrame:
+    """
+    رقم الأسبوع = ترتيب WeekStart بين أسابيع الشهر نفسه (1، 2، 3...).
+    يحافظ على ناتج groupby("الشهر").apply القديم: الصفوف بترتيبها الأصلي،
+    والصفوف بدون شهر تُستبعد.
+    """
+    if d.empty or "الشهر" not in d.columns or "WeekStart" not in d.columns:
+        return d
+    keep = np.flatnonzero(d["الشهر"].notna().to_numpy())
+    keys = d["الشهر"].iloc[keep].astype(str).to_numpy()
+    rank = np.full(len(d), np.nan)
+    rank[keep] = d["WeekStart"].iloc[keep].groupby(keys).rank(method="dense").to_numpy()
+    d["رقم الأسبوع"] = rank
+    return d.take(keep)
+
+# =============== كشف الـ header والفاصل من أول بضعة كيلوبايت ===============
+SNIFF_BYTES = 64 * 1024
+DELIMITER_CANDIDATES = [",", ";", "\t", "|"]
+# أسماء الأعمدة المعروفة للملفات التي تصل بدون header
+EXPECTED_COLS = ["اسم العميل", "رقم الجوال", "المنطقة", "المدينة", "الشركة",
+                 "مقدم الخدمة", "نوع الخدمة", "الخدمه المطلوبه", "المسؤول",
+                 "الملاحظات", "الشهر", "التاريخ"]
+HEADER_FIRST_NAMES = ["اسم العميل", "اسم العميل ", "name", "Name"]
+
+def sniff_csv_layout(path, sample_bytes=SNIFF_BYTES):
+    """
+    يقرأ أول sample_bytes فقط ويقرّر مسبقًا: الفاصل، وهل السطر الأول header،
+    وأسماء الأعمدة عند غيابه. يرجع {"sep", "header", "names", "dtype"} لتمريرها إلى read_csv؛
+    dtype يقرأ عمود الجوال نصًا دائمًا (لا يستنتج pandas أرقامًا تُسقط الأصفار في أوله، ولا
+    يختلف الاستنتاج بين أجزاء القراءة المتدفّقة والقراءة الكاملة).
+    قاعدة غياب الـ header نفسها المستخدمة سابقًا بعد القراءة الكاملة:
+    أسماء الأعمدة كلها أرقام، أو الصف الأول لا يطابق الأسماء والعمود الأول ليس "اسم العميل".
+    """
+    with open(path, "rb") as f:
+        raw = f.read(sample_bytes)
+    text = raw.decode("utf-8-sig", errors="replace")
+    if len(raw) == sample_bytes and "\n" in text:
+        text = text[:text.rindex("\n")]      # لا نقطع آخر سطر في المنتصف
+
+    first_line = next((ln for ln in text.splitlines() if ln.strip()), "")
+    sep = ","
+    if "," not in first_line:
+        counts = {d: first_line.count(d) for d in DELIMITER_CANDIDATES[1:]}
+        best = max(counts, key=counts.get)
+        if counts[best] > 0:
+            sep = best
+
+    layout = {"sep": sep, "header": 0, "names": None, "dtype": None}
+    reader = csv.reader(io.StringIO(text), delimiter=sep, quotechar='"', skipinitialspace=True)
+    rows = list(itertools.islice((r for r in reader if r), 2))
+    if not rows:
+        return layout
+
+    # أسماء الأعمدة كما يبنيها pandas (الاسم الفارغ -> Unnamed: i)
+    col_names = [c if c != "" else f"Unnamed: {i}" for i, c in enumerate(rows[0])]
+    first_row = rows[1] if len(rows) > 1 else []
+    first_row = (first_row + [""] * len(col_names))[:len(col_names)]
+    is_header_missing = (
+        all(c.isdigit() for c in col_names) or
+        (len(rows) > 1 and
+         any((v.strip() or "nan") not in c for v, c in zip(first_row, col_names))
+         and col_names[0] not in HEADER_FIRST_NAMES)
+    )
+    if is_header_missing and len(col_names) >= 10:
+        n = len(col_names)
+        layout["header"] = None
+        layout["names"] = EXPECTED_COLS[:n] + [f"عمود_{i}" for i in range(len(EXPECTED_COLS), n)]
+    names = layout["names"] or col_names
+    layout["dtype"] = {c: str for c in names if c.strip() == PHONE_COL} or None
+    return layout
+
+# =============== قراءة ملف CSV واحد بمحرك C (قراءة واحدة) ===============
+_BAD_LINE_RE = re.compile(r"Skipping line (\d+): expected (\d+) fields, saw (\d+)")
+
+def read_bad_lines_text(path, line_numbers):
+    """نص الأسطر التالفة فقط (للتقرير الجانبي)، بدون تحميل الملف كله في الذاكرة."""
+    wanted = set(line_numbers)
+    found = {}
+    if not wanted:
+        return found
+    with open(path, encoding="utf-8-sig", errors="replace") as f:
+        for i, line in enumerate(f, start=1):
+            if i in wanted:
+                found[i] = line.rstrip("\r\n")
+                if len(found) == len(wanted):
+                    break
+    return found
+
+def bad_line_numbers(caught, line_offset=0):
+    """تحذيرات ParserWarning من محرك C -> [(السطر, المتوقع, الموجود)]؛ line_offset لقراءة جزء من الملف."""
+    bad = []
+    for w in caught:
+        if issubclass(w.category, pd.errors.ParserWarning):
+            bad += [(int(ln) + line_offset, int(exp), int(saw)) for ln, exp, saw in _BAD_LINE_RE.findall(str(w.message))]
+    return bad
+
+def bad_lines_report(path, bad):
+    texts = read_bad_lines_text(path, [ln for ln, _, _ in bad])
+    return [{"السطر": ln, "المتوقع": exp, "الموجود": saw, "النص": texts.get(ln, "")}
+            for ln, exp, saw in bad]
+
+def read_provider_csv_fast(path, layout):
+    """
+    قراءة واحدة بمحرك C حسب layout. الأسطر التالفة لا تُتخطّى بصمت:
+    تُلتقط من تحذيرات المحرك وتُرجع كتقرير [{"السطر", "المتوقع", "الموجود", "النص"}].
+    """
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter("always", pd.errors.ParserWarning)
+        df = pd.read_csv(
+            path,
+            encoding="utf-8-sig",
+            engine="c",
+            on_bad_lines="warn",
+            sep=layout["sep"],
+            quotechar='"',
+            skipinitialspace=True,
+            header=layout["header"],
+            names=layout["names"],
+            dtype=layout["dtype"],
+        )
+    return df, bad_lines_report(path, bad_line_numbers(caught))
+
+def read_provider_csv_python(path, layout):
+    """المسار الاحتياطي القديم (محرك python) عند فشل محرك C؛ يلتقط الأسطر التالفة أيضًا."""
+    bad_lines = []
+    def on_bad(fields):
+        bad_lines.append({"السطر": None, "المتوقع": None, "الموجود": len(fields),
+                          "النص": layout["sep"].join(fields)})
+        return None
+    df = pd.read_csv(
+        path,
+        encoding="utf-8-sig",
+        engine="python",
+        on_bad_lines=on_bad,
+        sep=layout["sep"],
+        quotechar='"',
+        skipinitialspace=True,
+        header=layout["header"],
+        names=layout["names"],
+        dtype=layout["dtype"],
+    )
+    return df, bad_lines
+
+def read_provider_csv(path):
+    """
+    يرجع (df, err_msg, bad_lines):
+    - df = None إذا فشلت القراءة، و err_msg آخر خطأ ظهر (None إذا نجح محرك C مباشرة).
+    - bad_lines تقرير الأسطر التالفة التي لم تدخل الإطار.
+    """
+    try:
+        layout = sniff_csv_layout(path)
+    except Exception as e:
+        return None, str(e), []
+    try:
+        df, bad_lines = read_provider_csv_fast(path, layout)
+        return df, None, bad_lines
+    except Exception as e:
+        err_msg = str(e)
+    try:
+        df, bad_lines = read_provider_csv_python(path, layout)
+        return df, err_msg, bad_lines
+    except Exception as e:
+        return None, str(e), []
+
+# =============== تنظيف وتوحيد إطار مقدّم خدمة واحد ===============
+# المعالجة على مرحلتين حتى يعمل التحميل المتدفّق (chunks) بنفس الناتج:
+# prepare_provider_chunk خطوات على مستوى الصف فقط (تصلح لأي جزء من الملف)،
+# و finalize_provider_frame ما يحتاج الملف كاملًا (ترقيم الأسابيع داخل كل شهر).
+def prepare_provider_frame(df: pd.DataFrame, provider: str) -> pd.DataFrame:
+    return finalize_provider_frame(prepare_provider_chunk(df, provider))
+
+def finalize_provider_frame(df: pd.DataFrame) -> pd.DataFrame:
+    df = rank_weeks_in_months(df)
+    # فئات صفوف استُبعدت (بدون شهر) لا داعي لبقائها
+    for col in CATEGORY_COLS:
+        if col in df.columns and isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].cat.remove_unused_categories()
+    return df
+
+def prepare_provider_chunk(df: pd.DataFrame, provider: str) -> pd.DataFrame:
+    # نظافة أساسية
+    df.dropna(how="all", inplace=True)
+    df = normalize_columns(df)
+
+    # تنظيف وتوحيد عمود اسم العميل: حذف المسافات الزائدة والحفاظ على الأسماء الفعلية
+    if "اسم العميل" in df.columns:
+        df["اسم العميل"] = df["اسم العميل"].astype(str).str.strip()
+
+    # تاريخ موحّد
+    df["التاريخ/Date"] = build_date_column(df)
+
+    # --- الشهر: توحيد قوي قبل الحصر ---
+    if "الشهر" not in df.columns:
+        # إذا لم يوجد عمود الشهر، نحاول استخراجه من التاريخ
+        df["الشهر"] = df["التاريخ/Date"].dt.month.map(INV_MONTH_MAP).where(
+            df["التاريخ/Date"].dt.month.map(INV_MONTH_MAP).isin(MONTH_ORDER), np.nan
+        )
+    else:
+        # تطبيق التوحيد مع التاريخ (القيم الناتجة محصورة في MONTH_ORDER)
+        df["الشهر"] = normalize_month_column(df["الشهر"], df["التاريخ/Date"])
+
+    # توحيد النصوص (باستثناء الشهر الذي تم توحيده بالفعل، ورقم الجوال الذي يصبح رقمًا)
+    text_cols = ["اسم العميل","المنطقة","المدينة","الشركة","نوع الخدمة","الخدمه المطلوبه"]
+    for col in text_cols:
+        if col in df.columns:
+            df[col] = df[col].astype(str).str.strip()
+    # الشهر: التأكد من أنه نص (لكن نحافظ على NaN كقيمة NaN وليس نص "nan")
+    # لا نحتاج لتحويله لأن normalize_month_column يعطينا القيمة الصحيحة بالفعل
+
+    # بناء أسابيع العمل
+    df = add_week_columns(df)
+
+    # مصدر الملف
+    df["مقدم الخدمة (ملف)"] = provider
+    return compact_frame(df)
+
+# =============== تمثيل مضغوط للأعمدة (Categorical + جوال Int64) ===============
+# الأبعاد قليلة التنوع تُخزَّن Categorical: كل قيمة نصية (ومنها وسم الأسبوع) تُحفظ
+# مرة واحدة في الفئات، والصفوف تحمل codes صغيرة فقط. الفئات نفسها موحّدة عبر كل
+# مقدّمي الخدمة (unify_categories) حتى يبقى "__ALL__" Categorical بعد الدمج.
+CATEGORY_COLS = ["المنطقة", "المدينة", "الشركة", "نوع الخدمة", "وسم الأسبوع", "مقدم الخدمة (ملف)"]
+PHONE_COL = "رقم الجوال"
+PHONE_WIDTH_COL = "رقم الجوال/خانات"   # عدد أرقام الجوال كما كُتب (الأصفار في أوله لا تبقى في Int64)
+
+def phone_to_int(s: pd.Series):
+    """
+    رقم الجوال كـ Int64 (nullable) بدل نص: نحذف المسافات و + و - والأقواس،
+    ونقبل الصيغة العلمية القادمة من Excel (9.66113E+11). القيم غير الرقمية
+    (فارغ، nan، "شات الجري") تصبح <NA> بدل النص "nan".
+    يرجع (الأرقام، الخانات): الخانات uint8 عدد أرقام القيمة كما كُتبت (0 للصيغ العشرية
+    والعلمية و <NA>)، فيعود النص الأصلي "05…" بـ phone_digits.
+    """
+    codes, uniq = pd.factorize(s)
+    u = pd.Series(uniq.astype(str)).str.replace(r"[\s+\-()]", "", regex=True)
+    numeric = u.str.fullmatch(r"\d+(\.\d+)?([eE]\d+)?")
+    vals = pd.to_numeric(u.where(numeric), errors="coerce").to_numpy(dtype=float)
+    widths = np.where(u.str.fullmatch(r"\d+"), u.str.len().clip(upper=255), 0).astype(np.uint8)
+    out = np.append(vals, np.nan)[codes]
+    return (pd.Series(out, index=s.index).round().astype("Int64"),
+            pd.Series(np.append(widths, np.uint8(0))[codes], index=s.index))
+
+def phone_digits(phones: pd.Series, widths=None) -> np.ndarray:
+    """نص الجوال كما كُتب (مع الأصفار في أوله) من Int64 والخانات؛ <NA> -> NaN. للصفحات والقيم المميزة."""
+    widths = np.zeros(len(phones), dtype=np.uint8) if widths is None else np.asarray(widths)
+    values = phones.to_numpy(dtype=object, na_value=None)
+    return np.array([np.nan if v is None else str(v).zfill(int(w)) for v, w in zip(values, widths)], dtype=object)
+
+def compact_frame(df: pd.DataFrame) -> pd.DataFrame:
+    if PHONE_COL in df.columns:
+        df[PHONE_COL], df[PHONE_WIDTH_COL] = phone_to_int(df[PHONE_COL])
+    if "الشهر" in df.columns:
+        df["الشهر"] = pd.Categorical(df["الشهر"], categories=MONTH_ORDER, ordered=True)
+    for col in CATEGORY_COLS:
+        if col in df.columns:
+            df[col] = df[col].astype("category")
+    return df
+
+def unify_categories(frames):
+    """
+    يرجع الإطارات نفسها بعد توحيد فئات أعمدة CATEGORY_COLS (اتحاد مرتّب لكل الفئات).
+    الإطار الذي فئاته مطابقة يُرجع كما هو بدون نسخ؛ غير ذلك نسخة سطحية بأعمدة مُعاد ترميزها.
+    """
+    frames = list(frames)
+    for col in CATEGORY_COLS:
+        cats = [f[col].cat.categories for f in frames
+                if col in f.columns and isinstance(f[col].dtype, pd.CategoricalDtype)]
+        if not cats:
+            continue
+        union = cats[0].append(cats[1:]).unique().sort_values() if len(cats) > 1 else cats[0].sort_values()
+        for i, f in enumerate(frames):
+            if col in f.columns and isinstance(f[col].dtype, pd.CategoricalDtype) and not f[col].cat.categories.equals(union):
+                f = f.copy(deep=False)
+                f[col] = f[col].cat.set_categories(union)
+                frames[i] = f
+    return frames
+
+def frame_memory_report(df: pd.DataFrame) -> dict:
+    """الذاكرة الفعلية (بايت) مقابل التمثيل السابق: نصوص object للأعمدة المضغوطة والجوال."""
+    after = int(df.memory_usage(deep=True).sum())
+    before = after
+    for col in CATEGORY_COLS + ["الشهر", PHONE_COL]:
+        if col not in df.columns:
+            continue
+        s = df[col]
+        # حجم النسخة النصية يُحسب حسابيًا (مؤشر 8 بايت لكل صف + حجم كائن النص) بدل بنائها
+        if isinstance(s.dtype, pd.CategoricalDtype):
+            codes = s.cat.codes.to_numpy()
+            sizes = np.array([sys.getsizeof(c) for c in s.cat.categories], dtype=np.int64)
+            counts = np.bincount(codes[codes >= 0], minlength=len(sizes))
+            as_text = 8 * len(s) + int(counts @ sizes) + int((codes < 0).sum()) * sys.getsizeof(np.nan)
+        elif col == PHONE_COL and isinstance(s.dtype, pd.Int64Dtype):
+            v = s.to_numpy(dtype="float64", na_value=np.nan)
+            digits = np.where(np.isnan(v), len("<NA>"), np.floor(np.log10(np.maximum(np.nan_to_num(v), 1))) + 1)
+            width_bytes = 0   # عمود الخانات لا مقابل له في التمثيل النصي
+            if PHONE_WIDTH_COL in df.columns:
+                digits = np.maximum(digits, df[PHONE_WIDTH_COL].to_numpy())
+                width_bytes = int(df[PHONE_WIDTH_COL].memory_usage(deep=True, index=False))
+            as_text = 8 * len(s) + int(digits.sum()) + len(s) * sys.getsizeof("") - width_bytes
+        else:
+            continue
+        before += as_text - int(s.memory_usage(deep=True, index=False))
+    return {"before": before, "after": after}
+
+def structure_bytes(obj) -> int:
+    """حجم تقريبي (بايت) لبنية مشتركة: مصفوفات numpy وإطارات وقواميس/قوائم متداخلة."""
+    if isinstance(obj, np.ndarray):
+        if obj.dtype == object:
+            return obj.nbytes + sum(sys.getsizeof(v) for v in obj.ravel())
+        return obj.nbytes
+    if isinstance(obj, (pd.DataFrame, pd.Series)):
+        usage = obj.memory_usage(deep=True)
+        return int(usage.sum() if isinstance(obj, pd.DataFrame) else usage)
+    if isinstance(obj, dict):
+        return sys.getsizeof(obj) + sum(structure_bytes(k) + structure_bytes(v) for k, v in obj.items())
+    if isinstance(obj, (list, tuple)):
+        return sys.getsizeof(obj) + sum(structure_bytes(v) for v in obj)
+    return sys.getsizeof(obj)
+
+def freeze_arrays(obj):
+    """يجعل مصفوفات numpy داخل البنية للقراءة فقط (مشتركة بين الجلسات فلا تُعدَّل في مكانها)."""
+    if isinstance(obj, np.ndarray):
+        obj.flags.writeable = False
+    elif isinstance(obj, dict):
+        for v in obj.values():
+            freeze_arrays(v)
+    elif isinstance(obj, (list, tuple)):
+        for v in obj:
+            freeze_arrays(v)
+    return obj
+
+# =============== فهرس الصفوف (posting lists) للمرشّحات ===============
+# يُبنى مرة واحدة لكل نسخة بيانات على "__ALL__": لكل قيمة (شهر، وسم أسبوع، منطقة، ...)
+# مواضع صفوفها مرتبة تصاعديًا. مقدّم الخدمة مدى متصل [start, stop) فلا يحتاج فهرسًا.
+# الاختيار يصبح بحثًا ثنائيًا واتحادًا (قيم العمود الواحد) وتقاطعًا (بين الأعمدة) لقوائم
+# صغيرة بدل مقارنة أعمدة كاملة.
+ROW_INDEX_COLS = ["الشهر", "وسم الأسبوع", "المنطقة", "المدينة", "الشركة", "نوع الخدمة"]
+
+def build_row_index(df: pd.DataFrame, columns=ROW_INDEX_COLS) -> dict:
+    """عمود -> {قيمة: مواضع الصفوف (np.ndarray مرتّب)}؛ القيم الفارغة لا تُفهرس."""
+    dtype = np.int32 if len(df) < np.iinfo(np.int32).max else np.int64
+    index = {}
+    for col in columns:
+        if col not in df.columns:
+            continue
+        s = df[col] if isinstance(df[col].dtype, pd.CategoricalDtype) else df[col].astype("category")
+        codes = s.cat.codes.to_numpy()
+        # ترتيب ثابت (stable) حسب الـ code: مواضع كل قيمة متجاورة ومرتّبة تصاعديًا
+        order = np.argsort(codes, kind="stable").astype(dtype, copy=False)
+        counts = np.bincount(codes[codes >= 0], minlength=len(s.cat.categories))
+        bounds = int((codes < 0).sum()) + np.concatenate([[0], np.cumsum(counts)])
+        index[col] = {
+            cat: order[a:b]
+            for cat, a, b in zip(s.cat.categories, bounds[:-1], bounds[1:]) if b > a
+        }
+    return index
+
+def rows_in_range(rows: np.ndarray, start: int, stop: int) -> np.ndarray:
+    """مواضع rows الواقعة في [start, stop) (بحث ثنائي، view بدون نسخ)."""
+    return rows[np.searchsorted(rows, start):np.searchsorted(rows, stop)]
+
+def rows_in_ranges(rows: np.ndarray, ranges) -> np.ndarray:
+    """مواضع rows الواقعة في أي من المديات [(start, stop)] المرتبة وغير المتداخلة (مرتبة أيضًا)."""
+    parts = [rows_in_range(rows, start, stop) for start, stop in ranges]
+    if len(parts) == 1:
+        return parts[0]
+    return np.concatenate(parts) if parts else rows[:0]
+
+def union_rows(lists) -> np.ndarray:
+    """
+    اتحاد قوائم مواضع مرتبة ومنفصلة (قيم مختلفة لعمود واحد لا تشترك في صف): دمج ثم ترتيب
+    بكلفة بحجم النتيجة.
+    """
+    lists = [rows for rows in lists if len(rows)]
+    if len(lists) <= 1:
+        return lists[0] if lists else np.empty(0, dtype=np.int64)
+    return np.sort(np.concatenate(lists), kind="stable")
+
+def intersect_rows(*lists) -> np.ndarray:
+    """تقاطع قوائم مواضع مرتبة: نبدأ بالأصغر ونبحث عنه في الأكبر (الكلفة بحجم الأصغر)."""
+    lists = sorted(lists, key=len)
+    out = lists[0]
+    for other in lists[1:]:
+        if len(out) == 0 or len(other) == 0:
+            return out[:0]
+        pos = np.searchsorted(other, out)
+        out = out[other.take(pos, mode="clip") == out]
+    return out
+
+# =============== فهرس التاريخ لنطاقات الأيام ===============
+# لكل نطاق (كل الصفوف، وكل مقدّم خدمة) تواريخ صفوفه مرتبة تصاعديًا مع مواضعها في "__ALL__"،
+# فنطاق أيام [من، إلى] بحثان ثنائيان وقطعة متصلة: الكلفة O(log n + k) بدل مقارنة العمود كاملًا.
+DATE_COL = "التاريخ/Date"
+
+def build_date_index(df: pd.DataFrame, ranges: dict) -> dict:
+    """نطاق ("__ALL__" أو مقدّم الخدمة) -> (التواريخ مرتبة، مواضع صفوفها)؛ الصفوف بلا تاريخ لا تُفهرس."""
+    if DATE_COL not in df.columns:
+        return {}
+    values = df[DATE_COL].to_numpy(dtype="datetime64[ns]")
+    dtype = np.int32 if len(df) < np.iinfo(np.int32).max else np.int64
+
+    def sorted_dates(start, stop):
+        part = values[start:stop]
+        valid = np.flatnonzero(~np.isnat(part))
+        order = valid[np.argsort(part[valid], kind="stable")]
+        return part[order], (order + start).astype(dtype, copy=False)
+
+    index = {"__ALL__": sorted_dates(0, len(df))}
+    for provider, (start, stop) in ranges.items():
+        index[provider] = sorted_dates(start, stop)
+    return index
+
+def date_range_bounds(start, end):
+    """حدّا نطاق الأيام [start، end] كاملين: (بداية start، بداية اليوم التالي لـ end) بدقة ns."""
+    lo = pd.Timestamp(start).normalize()
+    hi = pd.Timestamp(end).normalize() + pd.Timedelta(days=1)
+    return np.datetime64(lo, "ns"), np.datetime64(hi, "ns")
+
+def rows_in_date_range(date_index: dict, scope: str, start, end) -> np.ndarray:
+    """مواضع صفوف النطاق التي تاريخها بين start و end (شاملين)، مرتبة تصاعديًا كبقية القوائم."""
+    if scope not in date_index:
+        return np.empty(0, dtype=np.int64)
+    dates, rows = date_index[scope]
+    lo, hi = date_range_bounds(start, end)
+    return np.sort(rows[np.searchsorted(dates, lo):np.searchsorted(dates, hi)])
+
+# =============== فهرس البحث (عربي مُطبّع) للجدول التفصيلي ===============
+# يُبنى مرة لكل نسخة بيانات: كل قيمة مميزة في أعمدة البحث لها مواضع صفوفها (مرتبة)،
+# وكل كلمة مُطبّعة تشير إلى القيم التي تحتويها. الاستعلام: لكل كلمة نأخذ كل الكلمات
+# التي تبدأ بها (بحث ثنائي في قاموس مرتب) ثم نتقاطع بين الكلمات. الجوال يُبحث بأي
+# جزء من أرقامه عبر فهرس ثلاثيات الأرقام.
+# ⚠️ اختلاف عن البحث السابق (نص جزئي في أي موضع): "ياض" لم تعد تطابق "الرياض"، وعمودا
+# "التاريخ" (رقم اليوم) و"رقم الأسبوع" الخامان خارج الفهرس؛ يُبحث عن اليوم بالتاريخ الكامل
+# (التاريخ/Date مثل 2025-10-19) وعن الأسبوع بوسمه، أو بمرشّحي التاريخ والأسبوع.
+SEARCH_COLS = ["اسم العميل", "الشهر", "التاريخ/Date", "وسم الأسبوع", "المنطقة", "المدينة",
+               "الشركة", "نوع الخدمة", "الخدمه المطلوبه", "مقدم الخدمة (ملف)"]
+_AR_DIACRITICS_RE = re.compile("[\u0610-\u061A\u064B-\u065F\u0670\u06D6-\u06ED\u0640]")  # تشكيل + تطويل
+_AR_FOLD = str.maketrans({
+    "أ": "ا", "إ": "ا", "آ": "ا", "ٱ": "ا", "ى": "ي", "ی": "ي", "ة": "ه", "ک": "ك",
+    **{chr(0x0660 + i): str(i) for i in range(10)},   # ٠-٩
+    **{chr(0x06F0 + i): str(i) for i in range(10)},   # ۰-۹
+})
+_SEARCH_TOKEN_RE = re.compile(r"\w+")
+# السوابق الملتصقة (أداة التعريف وحروف العطف والجر): "لتبوك" و"والرياض" تُفهرس أيضًا كـ "تبوك"/"رياض"
+_AR_PROCLITICS = ("وال", "بال", "فال", "كال", "ولل", "ال", "لل", "و", "ف", "ب", "ل", "ك")
+
+def normalize_search_text(text) -> str:
+    """أحرف صغيرة، بدون تشكيل/تطويل، أ/إ/آ→ا، ى→ي، ة→ه، والأرقام العربية→0-9."""
+    return _AR_DIACRITICS_RE.sub("", str(text).lower()).translate(_AR_FOLD)
+
+@functools.lru_cache(maxsize=1 << 16)
+def _token_stems(token: str) -> tuple:
+    return tuple(token[len(p):] for p in _AR_PROCLITICS if token.startswith(p) and len(token) - len(p) >= 3)
+
+def search_tokens(text) -> list:
+    tokens = _SEARCH_TOKEN_RE.findall(normalize_search_text(text))
+    return tokens + [s for t in tokens if t[0] in "وبفلكا" for s in _token_stems(t)]
+
+def query_tokens(query) -> list:
+    """كلمات الاستعلام المُطبّعة بدون تكرار (بدون السوابق: البادئة تطابقها أصلًا)."""
+    return list(dict.fromkeys(_SEARCH_TOKEN_RE.findall(normalize_search_text(query))))
+
+def _value_postings(s: pd.Series):
+    """(القيم المميزة، مواضع الصفوف مرتبة حسب القيمة، حدود كل قيمة) لعمود واحد."""
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        codes, uniques = s.cat.codes.to_numpy(), s.cat.categories
+    else:
+        codes, uniques = pd.factorize(s)
+    return (uniques,) + _code_postings(codes, len(uniques))
+
+def _code_postings(codes, n_uniques):
+    order = np.argsort(codes, kind="stable")
+    counts = np.bincount(codes[codes >= 0], minlength=n_uniques)
+    bounds = int((codes < 0).sum()) + np.concatenate([[0], np.cumsum(counts)])
+    return order, bounds
+
+def phone_values(df: pd.DataFrame):
+    """(رمز لكل صف، نص كل جوال مميز): الرقم نفسه بخانات مختلفة ("05…" و "5…") قيمتان."""
+    v_codes, v_uniq = pd.factorize(df[PHONE_COL])
+    widths = df[PHONE_WIDTH_COL].to_numpy(dtype=np.int64) if PHONE_WIDTH_COL in df.columns else 0
+    codes, pairs = pd.factorize(np.where(v_codes >= 0, v_codes * 256 + widths, np.nan))   # NaN -> -1
+    pairs = pairs.astype(np.int64)
+    return codes, phone_digits(pd.Series(v_uniq[pairs // 256]), pairs % 256)
+
+def _gather(rows, starts, stops):
+    """دمج شرائح rows[starts[i]:stops[i]] دفعة واحدة (بدون حلقة بايثون)."""
+    lengths = stops - starts
+    total = int(lengths.sum())
+    if total == 0:
+        return rows[:0]
+    shift = np.repeat(starts - np.concatenate([[0], np.cumsum(lengths)[:-1]]), lengths)
+    return rows[shift + np.arange(total)]
+
+def build_search_index(df: pd.DataFrame, columns=SEARCH_COLS, aliases=None) -> dict:
+    """
+    aliases: عمود -> دالة تعطي نصًا إضافيًا يُفهرس مع القيمة (مثل الاسم العربي لمقدّم الخدمة).
+    """
+    aliases = aliases or {}
+    dtype = np.int32 if len(df) < np.iinfo(np.int32).max else np.int64
+    rows, starts, stops = [], [], []
+    pair_tokens, pair_values = [], []   # (كلمة، رقم القيمة) لكل كلمة مميزة في كل قيمة
+    base = 0   # موضع بداية صفوف العمود الحالي داخل rows المدموجة
+    n_values = 0
+    for col in [c for c in columns if c in df.columns]:
+        uniques, order, bounds = _value_postings(df[col])
+        rows.append(order.astype(dtype, copy=False))
+        starts.append(base + bounds[:-1]); stops.append(base + bounds[1:])
+        alias = aliases.get(col)
+        for j, value in enumerate(uniques):
+            tokens = set(search_tokens(value if alias is None else f"{value} {alias(value)}"))
+            pair_tokens.extend(tokens)
+            pair_values.extend(itertools.repeat(n_values + j, len(tokens)))
+        base += len(order)
+        n_values += len(uniques)
+
+    # القاموس مرتب أبجديًا (للبحث بالبادئة)، وقيم كل كلمة متجاورة ومرتبة
+    token_codes, vocab = pd.factorize(np.array(pair_tokens, dtype=object))
+    vocab_order = np.argsort(vocab, kind="stable")
+    rank = np.empty(len(vocab), dtype=np.int64)
+    rank[vocab_order] = np.arange(len(vocab))
+    token_keys = rank[token_codes]
+    pair_values = np.array(pair_values, dtype=np.int64)
+    pair_order = np.lexsort((pair_values, token_keys))
+    index = {
+        "n_rows": len(df),
+        "rows": np.concatenate(rows) if rows else np.empty(0, dtype=dtype),
+        "starts": np.concatenate(starts) if starts else np.empty(0, dtype=np.int64),
+        "stops": np.concatenate(stops) if stops else np.empty(0, dtype=np.int64),
+        "vocab": np.asarray(vocab, dtype=object)[vocab_order],
+        "token_offsets": np.searchsorted(token_keys[pair_order], np.arange(len(vocab) + 1)),
+        "token_values": pair_values[pair_order],
+        "phone": None,
+    }
+
+    if PHONE_COL in df.columns:
+        codes, digits = phone_values(df)
+        order, bounds = _code_postings(codes, len(digits))
+        digits = np.array(list(digits), dtype="U") if len(digits) else np.empty(0, dtype="U1")
+        # ثلاثيات الأرقام: (رقم الثلاثية، رقم القيمة) بدون تكرار، مرتبة حسب الثلاثية ثم القيمة
+        mat = np.char.encode(digits, "ascii").view(np.uint8).reshape(len(digits), -1) if len(digits) else np.zeros((0, 3), np.uint8)
+        keys = []
+        for k in range(mat.shape[1] - 2):
+            valid = mat[:, k + 2] != 0
+            gram = (mat[valid, k].astype(np.int64) - 48) * 100 + (mat[valid, k + 1] - 48) * 10 + (mat[valid, k + 2] - 48)
+            keys.append(gram * len(digits) + np.flatnonzero(valid))
+        keys = np.unique(np.concatenate(keys)) if keys else np.empty(0, dtype=np.int64)
+        index["phone"] = {
+            "digits": digits,
+            "rows": order.astype(dtype, copy=False), "starts": bounds[:-1], "stops": bounds[1:],
+            "gram_values": keys % max(len(digits), 1),
+            "gram_offsets": np.searchsorted(keys // max(len(digits), 1), np.arange(1001)),
+        }
+    return index
+
+def _phone_rows(phone: dict, q: str) -> np.ndarray:
+    """صفوف الجوالات التي تحتوي الأرقام q في أي موضع."""
+    if len(q) >= 3:
+        grams = {int(q[k:k + 3]) for k in range(len(q) - 2)}
+        off = phone["gram_offsets"]
+        candidates = intersect_rows(*[phone["gram_values"][off[g]:off[g + 1]] for g in grams])
+        candidates = candidates[np.char.find(phone["digits"][candidates], q) >= 0]
+    else:
+        # رقم أو رقمان: كل ثلاثية تحتويهما تطابق مباشرة (بدون تحقق)
+        off, hit = phone["gram_offsets"], np.zeros(len(phone["digits"]), dtype=bool)
+        for g in (g for g in range(1000) if q in f"{g:03d}"):
+            hit[phone["gram_values"][off[g]:off[g + 1]]] = True
+        candidates = np.flatnonzero(hit)
+    return _gather(phone["rows"], phone["starts"][candidates], phone["stops"][candidates])
+
+def search_rows(index: dict, query: str):
+    """
+    مواضع الصفوف (مرتبة) التي تطابق كل كلمات query: كل كلمة تطابق بداية كلمة في أي
+    عمود بحث، والأرقام تطابق أيضًا أي جزء من رقم الجوال. None إن لم يحتوِ الاستعلام كلمات.
+    """
+    tokens = query_tokens(query)
+    if not tokens:
+        return None
+    mask = None
+    vocab, offsets = index["vocab"], index["token_offsets"]
+    for token in tokens:
+        hit = np.zeros(index["n_rows"], dtype=bool)
+        lo = np.searchsorted(vocab, token, side="left")
+        hi = np.searchsorted(vocab, token + "\U0010ffff", side="left")
+        values = index["token_values"][offsets[lo]:offsets[hi]]
+        hit[_gather(index["rows"], index["starts"][values], index["stops"][values])] = True
+        if token.isdigit() and index["phone"] is not None:
+            hit[_phone_rows(index["phone"], token)] = True
+        mask = hit if mask is None else (mask & hit)
+    return np.flatnonzero(mask)
+
+# =============== مكعب العدّ (OLAP) لكل نسخة بيانات ===============
+# كل بطاقات KPI والرسوم تحتاج أعدادًا فقط، لذلك نمرّ على الصفوف مرة واحدة لكل نسخة
+# بيانات ونحفظ عدد الاتصالات لكل تركيبة أبعاد موجودة فعلًا. الأعمدة المشتقة
+# (الشهر، وسم الأسبوع، WeekStart/WeekEnd) تابعة للتاريخ فلا تزيد عدد الخلايا.
+CUBE_DIMS = ["مقدم الخدمة (ملف)", "مقدم الخدمة", "الشهر", "وسم الأسبوع", "WeekStart", "WeekEnd",
+             "التاريخ/Date", "المنطقة", "المدينة", "الشركة", "نوع الخدمة"]
+
+def build_count_cube(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    خلية لكل تركيبة (CUBE_DIMS الموجودة) مع عمودها n. الخلايا بترتيب أول ظهور لها في
+    الصفوف، والقيم الفارغة خلايا مستقلة (dropna=False) فيبقى مجموع n = عدد الصفوف.
+    """
+    dims = [c for c in CUBE_DIMS if c in df.columns]
+    if not dims:
+        return pd.DataFrame({"n": np.array([len(df)] if len(df) else [], dtype=np.int64)})
+    return df.groupby(dims, observed=True, dropna=False, sort=False).size().rename("n").reset_index()
+
+# =============== تحميل متدفّق للملفات الكبيرة (chunks) ===============
+# ملف أكبر من CALLCENTER_STREAM_THRESHOLD_MB (تصدير ربع سنة كامل من نظام الاتصالات مثلًا)
+# لا يُقرأ دفعة واحدة: كل chunk يمر بـ prepare_provider_chunk ويُحفظ بالتمثيل المضغوط
+# (Categorical/Int64) ثم يُرمى النص الخام، فيبقى أقصى استهلاك أثناء التحليل بحجم
+# chunk واحد + الناتج المضغوط. حجم الـ chunk بالبايت يُشتق من CALLCENTER_STREAM_MEMORY_MB.
+STREAM_THRESHOLD_ENV = "CALLCENTER_STREAM_THRESHOLD_MB"
+STREAM_MEMORY_ENV = "CALLCENTER_STREAM_MEMORY_MB"
+STREAM_THRESHOLD_MB = 64
+STREAM_MEMORY_MB = 256
+STREAM_ROW_EXPANSION = 16     # تقدير تضخّم نص CSV داخل pandas (نصوص object + أعمدة مؤقتة)
+STREAM_MIN_BLOCK = 1 << 20
+STREAM_MAX_CARRY_BLOCKS = 4   # سقف البقية المحمولة بين الأجزاء (علامة " شاردة لا تُغلق)
+
+def _env_mb(name, default):
+    try:
+        return max(0.0, float(os.environ.get(name, "").strip() or default))
+    except ValueError:
+        return float(default)
+
+def should_stream(path):
+    try:
+        return os.path.getsize(path) >= _env_mb(STREAM_THRESHOLD_ENV, STREAM_THRESHOLD_MB) * (1 << 20)
+    except OSError:
+        return False
+
+def stream_block_bytes():
+    """حجم الجزء الخام (بايت) بحيث يبقى تحليله تحت سقف الذاكرة CALLCENTER_STREAM_MEMORY_MB."""
+    budget = _env_mb(STREAM_MEMORY_ENV, STREAM_MEMORY_MB) * (1 << 20)
+    return max(STREAM_MIN_BLOCK, int(budget / STREAM_ROW_EXPANSION))
+
+def iter_csv_blocks(f, block_bytes, max_carry_blocks=STREAM_MAX_CARRY_BLOCKS):
+    """
+    يقسم الملف إلى أجزاء من سجلات كاملة: القطع عند آخر سطر جديد خارج علامات التنصيص
+    (عدد " قبل نقطة القطع زوجي)، فلا ينقسم حقل فيه سطر جديد بين جزأين.
+    علامة " شاردة تجعل كل ما بعدها "داخل التنصيص"؛ إذا تجاوزت البقية المحمولة
+    max_carry_blocks جزءًا يُقطع عند آخر سطر جديد بدون فحص التنصيص (مع تحذير في السجل)
+    بدل حمل بقية الملف كله وإعادة عدّها مع كل جزء.
+    يرجع (عدد الأسطر قبل الجزء, بايتات الجزء).
+    """
+    carry = b""
+    lines_before = 0
+    while True:
+        data = f.read(block_bytes)
+        buf = carry + data
+        if not data:
+            if buf:
+                yield lines_before, buf
+            return
+        cut = buf.rfind(b"\n") + 1
+        quotes = buf.count(b'"', 0, cut)
+        while cut > 0 and quotes % 2:
+            prev = buf.rfind(b"\n", 0, cut - 1) + 1
+            quotes -= buf.count(b'"', prev, cut)
+            cut = prev
+        if cut == 0:
+            if len(buf) <= max_carry_blocks * block_bytes or buf.rfind(b"\n") < 0:
+                carry = buf         # سجل أطول من الجزء: نكمل القراءة
+                continue
+            cut = buf.rfind(b"\n") + 1
+            log.warning("علامة تنصيص بلا إغلاق بعد السطر %d: القطع عند السطر الجديد بدون فحص التنصيص",
+                        lines_before + 1)
+        block, carry = buf[:cut], buf[cut:]
+        yield lines_before, block
+        lines_before += block.count(b"\n")
+
+def _record_end(block):
+    """نهاية أول سجل في الجزء (أول سطر جديد خارج علامات التنصيص)."""
+    pos = 0
+    while True:
+        nl = block.find(b"\n", pos)
+        if nl < 0:
+            return len(block)
+        if block.count(b'"', 0, nl + 1) % 2 == 0:
+            return nl + 1
+        pos = nl + 1
+
+def _count_fields(record, sep):
+    text = record.decode("utf-8-sig", errors="replace").rstrip("\r\n")
+    return len(next(csv.reader(io.StringIO(text), delimiter=sep, quotechar='"', skipinitialspace=True), [""]))
+
+def csv_header_line(path, layout):
+    """(بايتات سطر الـ header، عدد حقوله) — للملفات بدون header: (b"", عدد الأسماء المعروفة)."""
+    if layout["header"] != 0:
+        return b"", len(layout["names"] or [])
+    with open(path, "rb") as f:
+        head = f.read(SNIFF_BYTES)
+    header_line = head[:_record_end(head)]
+    return header_line, _count_fields(header_line, layout["sep"])
+
+def parse_csv_block(block, layout, header_line, expected, lines_before):
+    """
+    يحلّل جزءًا من منتصف الملف (سجلات كاملة) قراءةً مستقلة بمحرك C مع سطر الـ header
+    الأصلي في أوله — chunksize في pandas يقصّ الأسطر الزائدة في الأجزاء اللاحقة
+    بصمت بدل تخطّيها. يرجع (df أو None إذا لم يبقَ شيء, [(السطر, المتوقع, الموجود)]).
+    expected=None لأول جزء في الملف (فيه الـ header نفسه ويُحلَّل كما هو).
+    """
+    bad = []
+    # محرك C يعامل سجلًا أطول من الـ header في أول الجزء كأعمدة index بدل
+    # تخطّيه (كما يفعل في منتصف الملف)، لذلك نسجّله سطرًا تالفًا يدويًا
+    while block and expected is not None:
+        end = _record_end(block)
+        saw = _count_fields(block[:end], layout["sep"])
+        if saw <= expected:
+            break
+        bad.append((lines_before + 1, expected, saw))
+        lines_before += block[:end].count(b"\n")
+        block = block[end:]
+    if not block.strip():
+        return None, bad
+    # أرقام الأسطر في التحذيرات نسبية للجزء؛ الـ header المضاف ليس من أسطر الجزء
+    line_offset = lines_before - (1 if header_line else 0)
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter("always", pd.errors.ParserWarning)
+        df = pd.read_csv(
+            io.BytesIO(header_line + block),
+            encoding="utf-8-sig",
+            engine="c",
+            on_bad_lines="warn",
+            sep=layout["sep"],
+            quotechar='"',
+            skipinitialspace=True,
+            header=layout["header"],
+            names=layout["names"],
+            dtype=layout["dtype"],
+        )
+    return df, bad + bad_line_numbers(caught, line_offset)
+
+def stream_provider_csv(path, provider, progress=None):
+    """
+    يرجع (df, bad_lines) بنفس ناتج read_provider_csv + prepare_provider_frame.
+    أول جزء يُحلَّل كما هو (فيه الـ header)، وكل جزء بعده عبر parse_csv_block.
+    progress(done_bytes, total_bytes) يُستدعى بعد كل جزء (لشريط التقدّم في الواجهة).
+    """
+    layout = sniff_csv_layout(path)
+    header_line, expected = csv_header_line(path, layout)
+    total = os.path.getsize(path)
+    parts, bad = [], []
+    rows_before = done = 0
+    with open(path, "rb") as f:
+        for lines_before, block in iter_csv_blocks(f, stream_block_bytes()):
+            done += len(block)
+            if progress is not None:
+                progress(done, total)
+            if lines_before == 0:
+                chunk, chunk_bad = parse_csv_block(block, layout, b"", None, 0)
+            else:
+                chunk, chunk_bad = parse_csv_block(block, layout, header_line, expected, lines_before)
+            bad += chunk_bad
+            if chunk is None:
+                continue
+            chunk.index = pd.RangeIndex(rows_before, rows_before + len(chunk))
+            rows_before += len(chunk)
+            part = prepare_provider_chunk(chunk, provider)
+            del chunk
+            if not part.empty:
+                parts.append(part)
+    bad_lines = bad_lines_report(path, bad)
+    if not parts:
+        return pd.DataFrame(), bad_lines
+    df = pd.concat(unify_categories(parts), sort=False)
+    del parts
+    return finalize_provider_frame(df), bad_lines
+
+# =============== قراءة الأسطر المُلحقة فقط (ملفات تكبر خلال اليوم) ===============
+# الموظفون يضيفون صفوفًا في آخر data/<Agent>.csv خلال اليوم. بصمة الملف تحفظ
+# الحجم وعدد الأسطر و hash آخر TAIL_BYTES؛ إذا كبر الملف وبقيت هذه البايتات كما هي
+# في موضعها فهو إلحاق فقط: نحلّل البايتات الجديدة وحدها وندمجها في إطار الملف.
+# غير ذلك (تعديل أو حذف أو إعادة كتابة) يرجع للتحميل الكامل.
+def read_appended_rows(path, provider, start, stop, lines_before):
+    """
+    يرجع (part, bad_lines) للبايتات [start, stop) فقط: part بعد prepare_provider_chunk
+    (أو None إذا لم تكن فيها صفوف)، و bad_lines تقرير الأسطر التالفة بأرقامها في الملف كاملًا.
+    """
+    layout = sniff_csv_layout(path)
+    header_line, expected = csv_header_line(path, layout)
+    with open(path, "rb") as f:
+        f.seek(start)
+        block = f.read(stop - start)
+    chunk, bad = parse_csv_block(block, layout, header_line, expected, lines_before)
+    # نص الأسطر التالفة من الجزء نفسه بدل المرور على الملف كاملًا (read_bad_lines_text)
+    block_lines = block.decode("utf-8", errors="replace").split("\n")
+    bad_lines = [{"السطر": ln, "المتوقع": exp, "الموجود": saw,
+                  "النص": block_lines[ln - lines_before - 1].rstrip("\r") if 0 < ln - lines_before <= len(block_lines) else ""}
+                 for ln, exp, saw in bad]
+    if chunk is None:
+        return None, bad_lines
+    return prepare_provider_chunk(chunk, provider), bad_lines
+
+def append_provider_rows(df, part):
+    """يدمج صفوفًا مُلحقة في إطار الملف؛ ترقيم الأسابيع يُعاد لأن أسبوعًا جديدًا قد يغيّر ترتيب الشهر."""
+    if part is None or part.empty:
+        return df
+    merged = pd.concat(unify_categories([df, part]), ignore_index=True, sort=False)
+    return finalize_provider_frame(merged)
+
+# =============== تحميل ملف واحد مع تجميع الرسائل ===============
+def load_provider_file(path, progress=None):
+    """
+    يرجع (provider, df, messages, bad_lines):
+    - df = None إذا تعذّرت القراءة أو كان الملف فارغًا.
+    - messages قائمة [(level, text)] بنفس ترتيب st.error/st.warning الأصلي،
+      حتى يُعاد عرضها كما هي عند الاسترجاع من الكاش.
+    - bad_lines تقرير الأسطر التالفة (انظري read_provider_csv_fast).
+    - الملفات الكبيرة (should_stream) تُقرأ على أجزاء، و progress يستقبل تقدّم القراءة.
+    """
+    provider = os.path.splitext(os.path.basename(path))[0].strip()
+    messages = []
+
+    df = None
+    if should_stream(path):
+        try:
+            df, bad_lines = stream_provider_csv(path, provider, progress)
+            err_msg = None
+        except Exception:
+            df = None       # نرجع للقراءة الكاملة (ومسار محرك python الاحتياطي)
+        if df is not None and df.empty:
+            messages.append(("warning", f"الملف {os.path.basename(path)} فارغ بعد التنظيف."))
+            return provider, None, messages, bad_lines
+
+    if df is None:
+        df, err_msg, bad_lines = read_provider_csv(path)
+        if df is None:
+            messages.append(("error", f"تعذّر قراءة {os.path.basename(path)} — {err_msg}"))
+            return provider, None, messages, bad_lines
+
+        if df.empty:
+            messages.append(("warning", f"الملف {os.path.basename(path)} فارغ بعد التنظيف."))
+            return provider, None, messages, bad_lines
+
+        df = prepare_provider_frame(df, provider)
+
+    if err_msg is not None or bad_lines:
+        messages.append(bad_lines_message(path, bad_lines))
+
+    return provider, df, messages, bad_lines
+
+def bad_lines_message(path, bad_lines):
+    detail = f" ({len(bad_lines)} سطر — التفاصيل في حالة كاش تحميل الملفات)" if bad_lines else ""
+    return ("warning", f"تم تخطّي أسطر تالفة في {os.path.basename(path)} للحفاظ على عمل التطبيق{detail}.")
+
+# =============== لقطات عمودية (Arrow) للإطارات بعد المعالجة ===============
+# بعد التنظيف والتوحيد وبناء الأسابيع نحفظ إطار كل مقدّم خدمة في
+# data/.snapshot/<provider>.arrow مع manifest.json فيه بصمات ملفات المصدر.
+# عند التشغيل البارد نقرأ اللقطة بـ memory-map بدل إعادة تحليل CSV،
+# ولا يعود مسار CSV إلا إذا تغيّر ملف المصدر أو INGEST_PIPELINE_VERSION.
+# ⚠️ ارفعي INGEST_PIPELINE_VERSION عند أي تعديل يغيّر ناتج prepare_provider_frame.
+INGEST_PIPELINE_VERSION = 5
+SNAPSHOT_SCHEMA_VERSION = 1
+SNAPSHOT_DIRNAME = ".snapshot"
+
+def snapshot_dir(folder):
+    return os.path.join(folder, SNAPSHOT_DIRNAME)
+
+def read_snapshot_manifest(folder):
+    """يرجع {اسم الملف: بيانات اللقطة}، أو {} إذا كان الـ manifest مفقودًا أو بنسخة قديمة."""
+    path = os.path.join(snapshot_dir(folder), "manifest.json")
+    try:
+        with open(path, encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if (manifest.get("schema_version") != SNAPSHOT_SCHEMA_VERSION
+            or manifest.get("pipeline_version") != INGEST_PIPELINE_VERSION):
+        return {}
+    return manifest.get("files", {})
+
+def write_snapshot_manifest(folder, files_meta):
+    manifest = {
+        "schema_version": SNAPSHOT_SCHEMA_VERSION,
+        "pipeline_version": INGEST_PIPELINE_VERSION,
+        "files": files_meta,
+    }
+    path = os.path.join(snapshot_dir(folder), "manifest.json")
+    try:
+        os.makedirs(snapshot_dir(folder), exist_ok=True)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=1)
+        os.replace(path + ".tmp", path)
+    except OSError:
+        pass  # مجلد البيانات للقراءة فقط: نكمل بدون لقطات
+
+def frame_to_arrow_bytes(df: pd.DataFrame) -> bytes:
+    """الإطار بصيغة Arrow IPC (نفس صيغة ملف اللقطة)، لنقله من العامل بدون pickle للأعمدة."""
+    table = pa.Table.from_pandas(df)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+def frame_from_arrow(source) -> pd.DataFrame:
+    """
+    source: memory map أو buffer بصيغة Arrow IPC.
+    split_blocks يبقي كل عمود في block مستقل بدل دمج الأعمدة المتشابهة في مصفوفة واحدة
+    (الدمج ينسخ كل شيء)، و self_destruct يحرّر أعمدة Arrow أولًا بأول أثناء التحويل.
+    """
+    table = pa.ipc.open_file(source).read_all()
+    df = table.to_pandas(split_blocks=True, self_destruct=True)
+    del table
+    # Arrow يعيد القيم الفارغة في أعمدة النص كـ None؛ نعيدها NaN كما في مسار CSV
+    for col in df.columns[df.dtypes == object]:
+        df[col] = df[col].where(df[col].notna(), np.nan)
+    return df
+
+def write_snapshot(folder, provider, payload):
+    """
+    يكتب اللقطة ويرجع اسم ملفها، أو None إذا تعذّرت الكتابة (يبقى مسار CSV كما هو).
+    payload: إطار pandas أو بايتات Arrow IPC جاهزة من عامل التحميل.
+    """
+    if not _PA_OK:
+        return None
+    name = f"{provider}.arrow"
+    path = os.path.join(snapshot_dir(folder), name)
+    try:
+        os.makedirs(snapshot_dir(folder), exist_ok=True)
+        data = payload if isinstance(payload, bytes) else frame_to_arrow_bytes(payload)
+        with open(path + ".tmp", "wb") as f:
+            f.write(data)
+        os.replace(path + ".tmp", path)
+    except Exception:
+        return None
+    return name
+
+# ما يبقى مقروءًا من الملف المربوط بالذاكرة مباشرة (بدون نسخ، وللقراءة فقط): الأعمدة الرقمية
+# والتواريخ (التاريخ/Date، WeekStart، رقم الجوال/خانات...) ورموز الأعمدة الفئوية.
+# ما يُنسخ حتمًا: أعمدة النص (كائنات Python) وقواميس الفئات والأعمدة القابلة للفراغ
+# (Int64/UInt32 تحتاج قناعًا خاصًا بـ pandas).
+def read_snapshot(folder, name):
+    with pa.memory_map(os.path.join(snapshot_dir(folder), name), "r") as source:
+        return frame_from_arrow(source)
+
+
+# =============== بصمة الملف (للكاش واللقطات) ===============
+TAIL_BYTES = 4096
+
+def _tail_digest(tail):
+    return hashlib.blake2b(tail, digest_size=16).hexdigest()
+
+def is_append_of(path, prev, size):
+    """
+    هل الملف الحالي = النسخة السابقة + بايتات جديدة في آخرها؟ (يقارن آخر TAIL_BYTES في موضعها القديم)
+    prev بصمة سابقة أو مدخل manifest (فيهما size و tail و ends_nl).
+    """
+    if prev is None or "tail" not in prev or size <= prev["size"] or not prev.get("ends_nl"):
+        return False
+    n = min(prev["size"], TAIL_BYTES)
+    with open(path, "rb") as f:
+        f.seek(prev["size"] - n)
+        return _tail_digest(f.read(n)) == prev["tail"]
+
+def file_fingerprint(path, prev=None, chunk_size=1 << 20):
+    """
+    بصمة الملف. إذا لم يتغيّر الحجم ولا mtime نعيد استخدام الـ hash السابق
+    بدل قراءة الملف كاملًا؛ وإذا تغيّر أحدهما نحسب الـ hash من جديد
+    (ملف لُمس فقط دون تعديل محتواه يبقى إصابة في الكاش).
+    إذا كان التغيير إلحاقًا فقط (is_append_of) نكمل الـ hash من حالته السابقة
+    بقراءة البايتات الجديدة وحدها، و append_of = hash النسخة السابقة.
+    """
+    stt = os.stat(path)
+    size, mtime = stt.st_size, stt.st_mtime_ns
+    if prev is not None and prev["size"] == size and prev["mtime"] == mtime:
+        return prev
+    if prev is not None and "_hasher" in prev and is_append_of(path, prev, size):
+        h, start, lines, append_of = prev["_hasher"].copy(), prev["size"], prev["lines"], prev["hash"]
+    else:
+        h, start, lines, append_of = hashlib.blake2b(digest_size=16), 0, 0, None
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = size - start         # الملف قد يكبر أثناء القراءة: البصمة لأول size بايت فقط
+        while remaining > 0:
+            chunk = f.read(min(chunk_size, remaining))
+            if not chunk:
+                break
+            h.update(chunk)
+            lines += chunk.count(b"\n")
+            remaining -= len(chunk)
+        f.seek(max(0, size - TAIL_BYTES))
+        tail = f.read(min(size, TAIL_BYTES))
+    return {"path": path, "size": size, "mtime": mtime, "hash": h.hexdigest(),
+            "lines": lines, "tail": _tail_digest(tail), "ends_nl": tail.endswith(b"\n"),
+            "append_of": append_of, "_hasher": h}
+
+# =============== التحميل المتوازي (ProcessPoolExecutor) ===============
+# عدد العمّال: متغير البيئة CALLCENTER_INGEST_WORKERS إن وُجد، وإلا عدد الأنوية.
+# القيمة 0 أو 1 تعني تحميلًا تسلسليًا داخل العملية نفسها.
+INGEST_WORKERS_ENV = "CALLCENTER_INGEST_WORKERS"
+
+def ingest_worker_count(n_files=None):
+    raw = os.environ.get(INGEST_WORKERS_ENV, "").strip()
+    try:
+        workers = int(raw) if raw else (os.cpu_count() or 1)
+    except ValueError:
+        workers = os.cpu_count() or 1
+    if n_files is not None:
+        workers = min(workers, n_files)
+    return max(0, workers)
+
+def make_ingest_pool(workers):
+    # spawn بدل fork: خادم ستريمليت متعدد الخيوط، و fork مع خيوط قد يعلّق العامل
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+
+def ingest_file(path, as_arrow=True, progress=None):
+    """
+    نقطة دخول العامل: يرجع (provider, payload, messages, bad_lines).
+    payload بايتات Arrow IPC (أرخص في النقل من pickle لأعمدة النص) أو إطار pandas
+    إذا لم تتوفر pyarrow، أو None إذا تعذّرت القراءة.
+    """
+    provider, df, messages, bad_lines = load_provider_file(path, progress)
+    if df is not None and as_arrow and _PA_OK:
+        try:
+            return provider, frame_to_arrow_bytes(df), messages, bad_lines
+        except Exception:
+            pass
+    return provider, df, messages, bad_lines
+
+def ingest_files(paths, pool=None):
+    """
+    يحمّل الملفات ويرجع النتائج بنفس ترتيب paths: [(provider, payload, messages, bad_lines), ...].
+    أخطاء كل ملف تُجمع في رسائله بدل إيقاف البقية. بدون pool يكون التحميل تسلسليًا.
+    إذا تعطّل المجمّع نفسه (BrokenExecutor) يُرفع الاستثناء ليعيد المستدعي المحاولة تسلسليًا.
+    """
+    if pool is None or len(paths) < 2:
+        return [ingest_file(p, as_arrow=False) for p in paths]
+    futures = [pool.submit(ingest_file, p) for p in paths]
+    results = []
+    for path, fut in zip(paths, futures):
+        try:
+            results.append(fut.result())
+        except BrokenExecutor:
+            raise
+        except Exception as e:
+            provider = os.path.splitext(os.path.basename(path))[0].strip()
+            results.append((provider, None, [("error", f"تعذّر قراءة {os.path.basename(path)} — {e}")], []))
+    return results
+
+def payload_to_frame(payload):
+    if isinstance(payload, bytes):
+        return frame_from_arrow(pa.py_buffer(payload))
+    return payload
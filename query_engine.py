@@ -0,0 +1,403 @@
+# -*- coding: utf-8 -*-
+# محرك SQL اختياري فوق بيانات الاتصالات المُطبّعة (مخرجات ingestion.py): DuckDB أو SQLite
+# داخل العملية، أو PostgreSQL عبر مجمّع اتصالات. الإطار الأساسي __ALL__ يُسجَّل جدولًا واحدًا
+# (callcenter_calls) لكل نسخة بيانات، ثم تُنفَّذ أسئلة المرشّحات والمكعب والبحث وصفحات الجدول التفصيلي
+# كاستعلامات SQL مع شروط WHERE بدل المرور على الصفوف في pandas. مثل مكعب العدّ في الذاكرة،
+# يُجمَّع الجدول مرة واحدة عند التسجيل في callcenter_cube (خلية لكل تركيبة أبعاد)، فأسئلة
+# الأشهر والأسابيع وبطاقات KPI تقرأ جدولًا صغيرًا مهما كبر السجل. القاعدة نسخة من إطارات CSV
+# في الذاكرة (لا مصدر بيانات): جداول التطبيق تحمل البادئة callcenter_ ولا يُحذف غيرها.
+# مثل ingestion.py، هذا الملف لا يستورد streamlit.
+import os, io, sqlite3, threading
+from contextlib import contextmanager, nullcontext
+import numpy as np
+import pandas as pd
+
+from ingestion import CUBE_DIMS, SEARCH_COLS, PHONE_COL, phone_values, search_tokens, query_tokens, date_range_bounds
+
+# ========== duckdb اختياري (محرك عمودي أسرع للتجميع) ==========
+_DUCKDB_OK = True
+try:
+    import duckdb
+except Exception:
+    _DUCKDB_OK = False
+# ============================================================
+
+# ========== psycopg + psycopg_pool اختياريان (PostgreSQL) ==========
+_PG_OK = True
+try:
+    import psycopg
+    from psycopg.conninfo import conninfo_to_dict
+    from psycopg_pool import ConnectionPool
+except Exception:
+    _PG_OK = False
+# ============================================================
+
+# =============== مخطط الجدول ===============
+# أسماء SQL لاتينية لأعمدة المكعب (لا حاجة لاقتباس الأسماء العربية في كل استعلام)
+SQL_COLUMNS = {
+    "مقدم الخدمة (ملف)": "provider_file", "مقدم الخدمة": "provider", "الشهر": "month",
+    "وسم الأسبوع": "week", "WeekStart": "week_start", "WeekEnd": "week_end",
+    "التاريخ/Date": "call_date", "المنطقة": "region", "المدينة": "city",
+    "الشركة": "company", "نوع الخدمة": "service_type",
+}
+# أعمدة إضافية للجدول التفصيلي فقط (صفحاته تُقرأ من القاعدة مباشرة)
+DETAIL_COLUMNS = {
+    "اسم العميل": "customer_name", PHONE_COL: "phone", "التاريخ": "day_of_month",
+    "رقم الأسبوع": "week_number", "الخدمه المطلوبه": "requested_service",
+}
+ENGINE_KINDS = ("duckdb", "sqlite", "postgres")
+
+PG_POOL_MAX_ENV = "CALLCENTER_PG_POOL_MAX"
+PG_POOL_MAX = 8
+COPY_CHUNK_ROWS = 50_000
+# يُضاف لمفتاح النسخة المسجلة: تغيير الجداول أو الفهارس يعيد التسجيل في القواعد المحفوظة
+SCHEMA_VERSION = 5
+# جداول التطبيق ببادئة خاصة به (قاعدة postgres قد تكون مشتركة مع تطبيقات أخرى). وجود
+# META_TABLE هو علامة أن التطبيق أنشأ الجداول، فلا يُحذف جدول بهذه الأسماء بدونها
+CALLS_TABLE = "callcenter_calls"
+CUBE_TABLE = "callcenter_cube"
+FTS_TABLE = "callcenter_fts"
+META_TABLE = "callcenter_meta"
+APP_TABLES = (CALLS_TABLE, CUBE_TABLE, FTS_TABLE, META_TABLE)
+
+def available_engines() -> list:
+    return [k for k in ENGINE_KINDS if (k != "duckdb" or _DUCKDB_OK) and (k != "postgres" or _PG_OK)]
+
+def open_engine(kind="auto", path=None) -> dict:
+    """
+    kind: duckdb | sqlite | postgres | auto (DuckDB إن وُجد وإلا SQLite).
+    path: ملف قاعدة البيانات (يبقى بين إعادات التشغيل) أو None للذاكرة؛ مع postgres هو DSN
+    (مثل postgresql://user@host/callcenter) وهو إلزامي.
+    """
+    if kind == "auto":
+        kind = "duckdb" if _DUCKDB_OK else "sqlite"
+    conn = pool = None
+    label = path or "في الذاكرة"
+    if kind == "duckdb":
+        if not _DUCKDB_OK:
+            raise RuntimeError("محرك duckdb غير مثبت (pip install duckdb)")
+        conn = duckdb.connect(path or ":memory:")
+    elif kind == "sqlite":
+        conn = sqlite3.connect(path or ":memory:", check_same_thread=False)
+    elif kind == "postgres":
+        if not _PG_OK:
+            raise RuntimeError("psycopg و psycopg_pool مطلوبان (pip install \"psycopg[binary]\" psycopg_pool)")
+        if not path:
+            raise ValueError("محرك postgres يحتاج DSN في CALLCENTER_QUERY_DB")
+        max_size = max(1, int(os.environ.get(PG_POOL_MAX_ENV, "").strip() or PG_POOL_MAX))
+        pool = ConnectionPool(path, min_size=1, max_size=max_size, kwargs={"autocommit": True},
+                              name="callcenter", open=True)
+        try:
+            pool.wait(timeout=10)   # قاعدة غير متاحة = خطأ الآن (فيعود التطبيق لمسار pandas)
+        except Exception:
+            pool.close()
+            raise
+        info = conninfo_to_dict(path)   # بدون كلمة المرور في العرض
+        label = f"{info.get('host') or 'localhost'}/{info.get('dbname') or ''} (حتى {max_size} اتصالات)"
+    else:
+        raise ValueError(f"محرك غير معروف: {kind} (المتاح: {', '.join(available_engines())})")
+    # اتصال SQLite/DuckDB واحد مشترك بين جلسات streamlit، فكل استعلام يمر عبر القفل؛
+    # مع postgres كل استعلام يأخذ اتصالًا من المجمّع
+    return {"kind": kind, "path": path, "label": label, "conn": conn, "pool": pool,
+            "lock": threading.RLock(), "key": None, "dims": [], "dtypes": {}}
+
+@contextmanager
+def _connection(engine):
+    if engine["pool"] is not None:
+        with engine["pool"].connection() as conn:
+            yield conn
+    else:
+        with engine["lock"]:
+            yield engine["conn"]
+
+def _sql_frame(df: pd.DataFrame, aliases=None) -> pd.DataFrame:
+    """
+    الإطار الذي يُسجَّل جدولًا: rid (موضع الصف في __ALL__)، أعمدة المكعب والجدول التفصيلي
+    (الفئات نصوص، والتواريخ int64 نانوثانية حتى تتطابق المحركات)، وsearch_text: كلمات البحث
+    المُطبّعة لكل الصف مفصولة بمسافات (البحث بالبادئة = LIKE '% كلمة%').
+    """
+    aliases = aliases or {}
+    out = {"rid": np.arange(len(df), dtype=np.int64)}
+    for col, name in {**SQL_COLUMNS, **DETAIL_COLUMNS}.items():
+        if col not in df.columns:
+            continue
+        s = df[col]
+        if pd.api.types.is_datetime64_any_dtype(s.dtype):
+            out[name] = pd.array(s.to_numpy("datetime64[ns]").view("int64"), dtype="Int64").copy()
+            out[name][s.isna().to_numpy()] = pd.NA
+        elif pd.api.types.is_numeric_dtype(s.dtype) and not isinstance(s.dtype, pd.CategoricalDtype):
+            out[name] = s.array
+        else:
+            out[name] = s.astype(object).where(s.notna(), None).to_numpy()
+
+    if PHONE_COL in df.columns:
+        # الجوال كما كُتب (بأصفاره) للبحث والعرض؛ phone الرقمي يبقى للترتيب
+        codes, digits = phone_values(df)
+        out["phone_text"] = np.append(digits, None)[codes]
+
+    # نص البحث يُبنى لكل قيمة مميزة ثم يُوزّع على الصفوف بالأكواد (بدون حلقة على الصفوف)
+    text = np.full(len(df), " ", dtype=object)
+    for col in [c for c in SEARCH_COLS if c in df.columns]:
+        s = df[col]
+        if isinstance(s.dtype, pd.CategoricalDtype):
+            codes, uniques = s.cat.codes.to_numpy(), s.cat.categories
+        else:
+            codes, uniques = pd.factorize(s)
+        alias = aliases.get(col)
+        words = np.array([" ".join(search_tokens(v if alias is None else f"{v} {alias(v)}")) + " "
+                          for v in uniques] + [""], dtype=object)
+        text = text + words[codes]   # الكود -1 (فارغ) يأخذ آخر عنصر ""
+    out["search_text"] = text
+    return pd.DataFrame(out)
+
+def _create_filter_indexes(conn, columns):
+    conn.execute(f"CREATE INDEX {CALLS_TABLE}_rid ON {CALLS_TABLE} (rid)")
+    for col in ("provider_file", "month", "week", "call_date", "region", "city", "company", "service_type"):
+        if col in columns:
+            conn.execute(f"CREATE INDEX {CALLS_TABLE}_{col} ON {CALLS_TABLE} ({col}, rid)")
+    # نطاق أيام داخل مقدّم خدمة واحد: صفوفه متجاورة ومرتبة حسب التاريخ في هذا الفهرس
+    if "provider_file" in columns and "call_date" in columns:
+        conn.execute(f"CREATE INDEX {CALLS_TABLE}_provider_date ON {CALLS_TABLE} (provider_file, call_date, rid)")
+
+def _load_embedded(engine, conn, frame):
+    if engine["kind"] == "duckdb":
+        conn.register("callcenter_frame", frame)
+        conn.execute(f"CREATE TABLE {CALLS_TABLE} AS SELECT * FROM callcenter_frame")
+        conn.unregister("callcenter_frame")
+        return
+    frame.to_sql(CALLS_TABLE, conn, index=False, chunksize=COPY_CHUNK_ROWS)
+    # فهارس على أعمدة المرشّحات (DuckDB يكتفي بـ zone maps على الأعمدة)
+    _create_filter_indexes(conn, frame.columns)
+    # البحث بالبادئة عبر FTS5 بدل LIKE على كل الصفوف (النص مُطبّع مسبقًا)
+    conn.execute(f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(search_text, content='', "
+                 "tokenize='unicode61 remove_diacritics 0')")
+    conn.execute(f"INSERT INTO {FTS_TABLE} (rowid, search_text) SELECT rid, search_text FROM {CALLS_TABLE}")
+
+def _load_postgres(conn, frame):
+    """تحميل جماعي بـ COPY (CSV على دفعات) ثم الفهارس والإحصاءات، داخل معاملة التسجيل."""
+    def sql_type(dtype):
+        if pd.api.types.is_integer_dtype(dtype):
+            return "BIGINT"
+        if pd.api.types.is_float_dtype(dtype):
+            return "DOUBLE PRECISION"
+        return "TEXT"
+    conn.execute(f"CREATE TABLE {CALLS_TABLE} ({', '.join(f'{c} {sql_type(t)}' for c, t in frame.dtypes.items())})")
+    with conn.cursor().copy(f"COPY {CALLS_TABLE} ({', '.join(frame.columns)}) FROM STDIN (FORMAT csv, NULL '\\N')") as copy:
+        for start in range(0, len(frame), COPY_CHUNK_ROWS):
+            buf = io.StringIO()
+            frame.iloc[start:start + COPY_CHUNK_ROWS].to_csv(buf, index=False, header=False, na_rep="\\N")
+            copy.write(buf.getvalue())
+    _create_filter_indexes(conn, frame.columns)
+    # فهرس ثلاثيات pg_trgm يخدم LIKE '% كلمة%' إن سمحت الصلاحيات بالامتداد
+    try:
+        with conn.transaction():
+            conn.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+            conn.execute(f"CREATE INDEX {CALLS_TABLE}_search ON {CALLS_TABLE} USING gin (search_text gin_trgm_ops)")
+            if "phone_text" in frame.columns:
+                conn.execute(f"CREATE INDEX {CALLS_TABLE}_phone ON {CALLS_TABLE} USING gin (phone_text gin_trgm_ops)")
+    except psycopg.Error:
+        pass
+    conn.execute(f"ANALYZE {CALLS_TABLE}")
+
+def _existing_tables(engine, conn) -> set:
+    """أسماء الجداول الموجودة من APP_TABLES (في المخطط الحالي مع postgres/DuckDB)."""
+    if engine["kind"] == "sqlite":
+        sql = "SELECT name FROM sqlite_master WHERE type IN ('table', 'view')"
+    else:
+        sql = "SELECT table_name FROM information_schema.tables WHERE table_schema = current_schema()"
+    return {row[0] for row in conn.execute(sql).fetchall()} & set(APP_TABLES)
+
+def register_calls(engine: dict, df: pd.DataFrame, key: str, aliases=None) -> bool:
+    """
+    يسجّل df جدولًا CALLS_TABLE إن تغيّرت نسخة البيانات (key). مع قاعدة محفوظة (ملف أو postgres)
+    تُقرأ النسخة المسجلة من META_TABLE فلا يُعاد التحميل بعد إعادة تشغيل التطبيق أو من
+    خادم آخر يشارك القاعدة نفسها. يرجع True إن سجّل. جدول باسم من APP_TABLES بدون META_TABLE
+    لم ينشئه التطبيق: خطأ بدل حذفه.
+    """
+    key = f"{SCHEMA_VERSION}:{key}"
+    with engine["lock"]:
+        if engine["key"] == key:
+            return False
+        columns = {**SQL_COLUMNS, **DETAIL_COLUMNS}
+        dims = [SQL_COLUMNS[c] for c in CUBE_DIMS if c in df.columns and c in SQL_COLUMNS]
+        postgres = engine["kind"] == "postgres"
+        with _connection(engine) as conn:
+            existing = _existing_tables(engine, conn)
+            if existing and META_TABLE not in existing:
+                raise RuntimeError(
+                    f"الجداول {', '.join(sorted(existing))} موجودة في القاعدة ولم ينشئها التطبيق "
+                    f"({META_TABLE} غير موجود)؛ استخدم قاعدة أو مخططًا آخر"
+                )
+            stored = None
+            if META_TABLE in existing:
+                stored = conn.execute(f"SELECT data_key FROM {META_TABLE}").fetchone()
+            loaded = stored is None or stored[0] != key
+            if loaded:
+                frame = _sql_frame(df, aliases)
+                # مع postgres: الاستبدال كله معاملة واحدة، فالجلسات الأخرى ترى النسخة القديمة أو الجديدة
+                with (conn.transaction() if postgres else nullcontext()):
+                    for table in (CALLS_TABLE, CUBE_TABLE, FTS_TABLE, META_TABLE):
+                        if table in existing:
+                            conn.execute(f"DROP TABLE {table}")
+                    # علامة الملكية أولًا: تسجيل انقطع في منتصفه يُحذف ويُعاد في المرة التالية
+                    conn.execute(f"CREATE TABLE {META_TABLE} (data_key TEXT)")
+                    if postgres:
+                        _load_postgres(conn, frame)
+                    else:
+                        _load_embedded(engine, conn, frame)
+                    if dims:
+                        cols = ", ".join(dims)
+                        conn.execute(f"CREATE TABLE {CUBE_TABLE} AS SELECT {cols}, COUNT(*) AS n, "
+                                     f"MIN(rid) AS first_rid FROM {CALLS_TABLE} GROUP BY {cols}")
+                    conn.execute(_sql(engine, f"INSERT INTO {META_TABLE} VALUES (?)"), [key])
+                if engine["kind"] == "sqlite":
+                    conn.commit()
+        dtypes = {name: df[col].dtype for col, name in columns.items() if col in df.columns}
+        if PHONE_COL in df.columns:
+            dtypes["phone_text"] = np.dtype(object)
+        engine.update(key=key, dims=dims, dtypes=dtypes)
+        return loaded
+
+# =============== الاستعلامات ===============
+def _sql(engine, sql):
+    """SQLite/DuckDB تستخدم ? و psycopg تستخدم %s."""
+    return sql.replace("?", "%s") if engine["kind"] == "postgres" else sql
+
+def _where(engine, filters=None, query=None, dates=None):
+    """
+    شروط WHERE للمرشّحات والبحث. filters: عمود (بالاسم الأصلي) -> القيم المختارة؛ القيم داخل
+    العمود الواحد اتحاد (IN) والأعمدة تقاطع (AND)، والقائمة الفارغة = بدون شرط. dates نطاق
+    أيام (من، إلى) شاملين، يُقارن بـ call_date (ns) عبر فهرس التاريخ.
+    """
+    clauses, params = [], []
+    for col, values in (filters or {}).items():
+        name = SQL_COLUMNS.get(col)
+        if not values or name not in engine["dims"]:
+            continue
+        if engine["kind"] == "postgres":
+            # مصفوفة واحدة: نص الاستعلام لا يتغير مع عدد القيم (prepared statement واحد)
+            clauses.append(f"{name} = ANY(?)"); params.append(list(values))
+        else:
+            clauses.append(f"{name} IN ({', '.join('?' * len(values))})"); params += list(values)
+    if dates is not None and "call_date" in engine["dims"]:
+        lo, hi = date_range_bounds(*dates)
+        clauses.append("call_date >= ? AND call_date < ?")
+        params += [int(lo.astype(np.int64)), int(hi.astype(np.int64))]
+    for token in (query_tokens(query) if query else []):
+        if engine["kind"] == "sqlite":
+            clause = f"rid IN (SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH ?)"
+            params.append('"' + token + '"*')
+        else:
+            clause = "search_text LIKE ? ESCAPE '\\'"
+            params.append("% " + token.replace("_", "\\_") + "%")
+        if token.isdigit() and "phone_text" in engine["dtypes"]:
+            clause = f"({clause} OR phone_text LIKE ?)"
+            params.append(f"%{token}%")
+        clauses.append(clause)
+    return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+def _fetch(engine, sql, params) -> pd.DataFrame:
+    with _connection(engine) as conn:
+        if engine["kind"] == "postgres":
+            # الاستعلامات نفسها تتكرر مع كل rerun، فتُحضَّر (prepared statements) على كل اتصال
+            cur = conn.execute(_sql(engine, sql), params, prepare=True)
+        else:
+            cur = conn.execute(sql, params)
+        names = [d[0] for d in cur.description]
+        return pd.DataFrame.from_records(cur.fetchall(), columns=names)
+
+def _restore_dtypes(engine, frame: pd.DataFrame) -> pd.DataFrame:
+    """أنواع الأعمدة (الفئات، التواريخ، Int64) كما في الإطار الأصلي، والفارغ NaN."""
+    for col in frame.columns:
+        dtype = engine["dtypes"].get(col)
+        if dtype is None:
+            continue
+        if isinstance(dtype, pd.CategoricalDtype):
+            frame[col] = pd.Categorical(frame[col], dtype=dtype)
+        elif pd.api.types.is_datetime64_any_dtype(dtype):
+            frame[col] = pd.to_datetime(frame[col].astype("Int64"), unit="ns")
+        elif dtype == object:
+            frame[col] = frame[col].where(frame[col].notna(), np.nan)
+        else:
+            frame[col] = frame[col].astype(dtype)
+    return frame
+
+def query_months(engine, filters=None, dates=None) -> set:
+    """الأشهر الموجودة في نطاق المرشّحات (وداخل نطاق الأيام إن وُجد)."""
+    if "month" not in engine["dims"]:
+        return set()
+    where, params = _where(engine, filters, dates=dates)
+    return set(_fetch(engine, f"SELECT DISTINCT month FROM {CUBE_TABLE}{where}", params)["month"].dropna())
+
+def query_week_firsts(engine, filters=None, dates=None) -> list:
+    """[(أول rid، الوسم، WeekStart)] لكل وسم أسبوع في النطاق (مثل أول صف من فهرس الصفوف)."""
+    if "week" not in engine["dims"] or "week_start" not in engine["dims"]:
+        return []
+    where, params = _where(engine, filters, dates=dates)
+    cond = "week IS NOT NULL AND week <> ''"
+    where = f"{where} AND {cond}" if where else f" WHERE {cond}"
+    # أول صف للوسم = أصغر first_rid بين خلاياه، وWeekStart من تلك الخلية نفسها
+    firsts = _fetch(engine, (
+        f"SELECT c.first_rid, c.week, c.week_start FROM {CUBE_TABLE} c JOIN "
+        f"(SELECT week, MIN(first_rid) AS first_rid FROM {CUBE_TABLE}{where} GROUP BY week) f "
+        "ON c.first_rid = f.first_rid"
+    ), params)
+    starts = pd.to_datetime(firsts["week_start"].astype("Int64"), unit="ns")
+    return [(int(r), w, ws) for r, w, ws in zip(firsts["first_rid"], firsts["week"], starts)]
+
+def query_rows(engine, filters=None, query=None, dates=None) -> np.ndarray:
+    """مواضع الصفوف (مرتبة) التي تحقق المرشّحات وكل كلمات البحث."""
+    where, params = _where(engine, filters, query, dates)
+    rows = _fetch(engine, f"SELECT rid FROM {CALLS_TABLE}{where} ORDER BY rid", params)["rid"]
+    return rows.to_numpy(dtype=np.int64)
+
+def query_count(engine, filters=None, query=None, dates=None) -> int:
+    where, params = _where(engine, filters, query, dates)
+    return int(_fetch(engine, f"SELECT COUNT(*) AS n FROM {CALLS_TABLE}{where}", params)["n"].iloc[0])
+
+def _order_by(engine, col, ascending):
+    """ترتيب مثل sort_rows: مستقر (rid)، الفارغ في الآخر، والفئات المرتبة (الشهر) بترتيبها."""
+    name = {**SQL_COLUMNS, **DETAIL_COLUMNS}[col]
+    dtype = engine["dtypes"][name]
+    expr, params = name, []
+    if isinstance(dtype, pd.CategoricalDtype) and dtype.ordered:
+        expr = "CASE " + " ".join(f"WHEN {name} = ? THEN {i}" for i in range(len(dtype.categories))) + " END"
+        params = list(dtype.categories)
+    elif engine["kind"] == "postgres" and not pd.api.types.is_numeric_dtype(dtype) \
+            and not pd.api.types.is_datetime64_any_dtype(dtype):
+        expr = f'{name} COLLATE "C"'   # ترتيب نقاط الترميز مثل بايثون، لا ترتيب اللغة
+    return f" ORDER BY {expr} {'ASC' if ascending else 'DESC'} NULLS LAST, rid", params
+
+def query_page(engine, columns, filters=None, query=None, dates=None,
+               order_by=None, ascending=True, limit=100, offset=0) -> pd.DataFrame:
+    """
+    صفحة من الجدول التفصيلي (الأعمدة بأسمائها الأصلية) مرتبة ومقطوعة في القاعدة نفسها،
+    فلا يُنقل من الصفوف إلا limit صفًا.
+    """
+    names = {**SQL_COLUMNS, **DETAIL_COLUMNS}
+    if "phone_text" in engine["dtypes"]:
+        names[PHONE_COL] = "phone_text"
+    where, params = _where(engine, filters, query, dates)
+    order, order_params = _order_by(engine, order_by, ascending) if order_by else (" ORDER BY rid", [])
+    select = ", ".join(names[c] for c in columns)
+    page = _fetch(engine, f"SELECT {select} FROM {CALLS_TABLE}{where}{order} LIMIT ? OFFSET ?",
+                  params + order_params + [int(limit), int(offset)])
+    if page.empty:
+        page = pd.DataFrame({names[c]: pd.Series([], dtype=object) for c in columns})
+    return _restore_dtypes(engine, page).rename(columns={names[c]: c for c in columns})
+
+def query_cube(engine, filters=None, dates=None) -> pd.DataFrame:
+    """
+    مكعب العدّ للنطاق بنفس شكل build_count_cube: خلية لكل تركيبة بترتيب أول ظهور (first_rid)،
+    وأنواع الأعمدة (الفئات والتواريخ) كما في الإطار الأصلي.
+    """
+    dims = engine["dims"]
+    where, params = _where(engine, filters, dates=dates)
+    if not dims:
+        n = _fetch(engine, f"SELECT COUNT(*) AS n FROM {CALLS_TABLE}{where}", params)["n"]
+        return pd.DataFrame({"n": n[n > 0].to_numpy(dtype=np.int64)})
+    # كل خلية إما داخل المرشّحات كلها أو خارجها (المرشّحات أبعاد)، فلا حاجة لإعادة التجميع
+    cube = _fetch(engine, f"SELECT {', '.join(dims)}, n FROM {CUBE_TABLE}{where} ORDER BY first_rid", params)
+    cube = _restore_dtypes(engine, cube)
+    cube["n"] = cube["n"].astype(np.int64)
+    return cube.rename(columns={v: k for k, v in SQL_COLUMNS.items()})
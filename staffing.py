@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+# احتياج الموظفين بمعادلة Erlang C: أعداد المكالمات المتوقعة لكل فترة (يوم عمل أو فترة 30 دقيقة)
+# مع متوسط مدة المكالمة (AHT) وهدف مستوى الخدمة (نسبة المكالمات المُجابة خلال T ثانية) ->
+# أقل عدد موظفين يحقق الهدف، مع مستوى الخدمة والإشغال ومتوسط الانتظار المتوقعة.
+# Erlang B يُحسب بالتكرار B(k) = A·B(k-1) / (k + A·B(k-1)) (قيمه بين 0 و 1 فلا يفيض مع أعداد
+# موظفين كبيرة كما يفيض A^N/N!)، ومنه Erlang C؛ التكرار على k واحد لكل الفترات معًا، فشهر كامل
+# من الفترات يُحسب دفعة واحدة. مثل ingestion.py، هذا الملف لا يستورد streamlit.
+import numpy as np
+import pandas as pd
+
+DEFAULT_AHT_SECONDS = 240
+DEFAULT_SERVICE_LEVEL = 0.80
+DEFAULT_ANSWER_SECONDS = 20
+DEFAULT_OPEN_HOURS = 8
+MAX_SERVICE_LEVEL = 0.999   # 100% لا يتحقق بعدد منتهٍ من الموظفين
+
+def offered_load(calls, aht_seconds, interval_seconds):
+    """الحمل بوحدة Erlang: ساعات المكالمات لكل ساعة من الفترة (calls × AHT / طول الفترة)."""
+    return np.asarray(calls, dtype=float) * aht_seconds / interval_seconds
+
+def service_level(traffic, agents, prob_wait, aht_seconds, answer_seconds):
+    """نسبة المكالمات المُجابة خلال answer_seconds: 1 - C·exp(-(N-A)·T/AHT)."""
+    A = np.asarray(traffic, dtype=float)
+    N = np.asarray(agents, dtype=float)
+    return np.where(N > A, 1 - prob_wait * np.exp(-(N - A) * answer_seconds / aht_seconds), 0.0)
+
+def required_agents(traffic, aht_seconds=DEFAULT_AHT_SECONDS, target=DEFAULT_SERVICE_LEVEL,
+                    answer_seconds=DEFAULT_ANSWER_SECONDS):
+    """
+    أقل عدد موظفين لكل فترة يحقق هدف مستوى الخدمة. مرور واحد على k = 1، 2، … حتى تتحقق كل
+    الفترات؛ كل خطوة تحدّث Erlang B لكل الفترات معًا. يعيد قاموس مصفوفات: agents، prob_wait
+    (Erlang C)، service_level، occupancy (A/N) و asa (متوسط الانتظار بالثواني).
+    حمل غير منتهٍ (NaN، inf) لا يتحقق هدفه بأي عدد: 0 موظف ومقاييس NaN بدل تكرار بلا نهاية.
+    """
+    A = np.asarray(traffic, dtype=float)
+    shape = A.shape                      # حمل مفرد (رقم واحد) يُحسب كمصفوفة بعنصر واحد
+    A = A.reshape(-1)
+    target = min(float(target), MAX_SERVICE_LEVEL)
+    invalid = ~np.isfinite(A)
+    A = np.where(invalid, 0.0, np.maximum(A, 0.0))   # الحمل السالب صفر (وإلا قسمة على صفر في B عند k = -A)
+    agents = np.zeros(A.shape, dtype=int)
+    prob_wait = np.zeros(A.shape)
+    level = np.ones(A.shape)
+    done = A <= 0                        # فترة بلا مكالمات (أو حمل سالب/غير منتهٍ): 0 موظف
+    B = np.ones(A.shape)
+    k = 0
+    while not done.all():
+        k += 1
+        B = A * B / (k + A * B)
+        active = np.flatnonzero(~done & (k > A))   # الفترات التي يستقر فيها الطابور عند k ولم تتحقق بعد
+        if not len(active):
+            continue
+        a, b = A[active], B[active]
+        C = k * b / (k - a * (1 - b))
+        sl = service_level(a, k, C, aht_seconds, answer_seconds)
+        hit = sl >= target
+        agents[active[hit]], prob_wait[active[hit]], level[active[hit]] = k, C[hit], sl[hit]
+        done[active[hit]] = True
+    staffed = agents > 0
+    occupancy = np.divide(A, agents, out=np.zeros(A.shape), where=staffed)
+    asa = np.divide(prob_wait * aht_seconds, agents - A, out=np.zeros(A.shape), where=staffed)
+    for metric in (prob_wait, level, occupancy, asa):
+        metric[invalid] = np.nan
+    out = {"agents": agents, "prob_wait": prob_wait, "service_level": level, "occupancy": occupancy, "asa": asa}
+    return {name: metric.reshape(shape) for name, metric in out.items()}
+
+def staffing_table(dates, calls, aht_seconds=DEFAULT_AHT_SECONDS, target=DEFAULT_SERVICE_LEVEL,
+                   answer_seconds=DEFAULT_ANSWER_SECONDS, open_hours=DEFAULT_OPEN_HOURS, calls_high=None):
+    """
+    جدول الاحتياج لكل فترة: المكالمات موزّعة بالتساوي على open_hours ساعة عمل في الفترة.
+    calls_high (الحد الأعلى للتوقع) يضيف عمود الموظفين اللازمين له.
+    """
+    interval_seconds = open_hours * 3600
+    load = offered_load(calls, aht_seconds, interval_seconds)
+    need = required_agents(load, aht_seconds, target, answer_seconds)
+    table = pd.DataFrame({
+        "التاريخ": dates,
+        "المكالمات المتوقعة": np.asarray(calls, dtype=float),
+        "الحمل (Erlang)": load,
+        "الموظفون المطلوبون": need["agents"],
+        "مستوى الخدمة %": 100 * need["service_level"],
+        "الإشغال %": 100 * need["occupancy"],
+        "متوسط الانتظار (ث)": need["asa"],
+    })
+    if calls_high is not None:
+        high = offered_load(calls_high, aht_seconds, interval_seconds)
+        table["الموظفون (للحد الأعلى)"] = required_agents(high, aht_seconds, target, answer_seconds)["agents"]
+    return table
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+# قياس توحيد التاريخ والشهر على مليون صف: المسار العمودي على الإطار كله، والمسار الصفّي
+# السابق على عيّنة متباعدة (مع تقدير زمنه للإطار كله)، والتحقق من تطابق العيّنة.
+#   python tests/bench_ingestion.py [عدد الصفوف] [حجم العيّنة]
+import os, sys, time, warnings
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import numpy as np
+import pandas as pd
+
+from test_ingestion import (
+    MONTHS, DAYS, build_date_column, normalize_month_column, reference_dates, reference_months,
+)
+
+def make_frame(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    # معظم الصفوف قيم عادية (شهر معروف ويوم رقمي) وبقيتها من حالات الاختبار
+    common_months = np.array(["Aug", "Sep", "Oct", "Nov", "أكتوبر", "Dec"], dtype=object)
+    common_days = np.array([str(d) for d in range(1, 32)], dtype=object)
+    month = common_months[rng.integers(0, len(common_months), rows)]
+    day = common_days[rng.integers(0, len(common_days), rows)]
+    odd = rng.random(rows) < 0.05
+    month[odd] = np.array(MONTHS, dtype=object)[rng.integers(0, len(MONTHS), odd.sum())]
+    day[odd] = np.array(DAYS, dtype=object)[rng.integers(0, len(DAYS), odd.sum())]
+    return pd.DataFrame({"الشهر": month, "التاريخ": day})
+
+def main(rows=1_000_000, sample=20_000):
+    warnings.simplefilter("ignore")
+    df = make_frame(rows)
+    t = time.perf_counter()
+    dates = build_date_column(df)
+    months = normalize_month_column(df["الشهر"], dates)
+    vector_s = time.perf_counter() - t
+
+    part = df.iloc[:: max(1, rows // sample)]
+    t = time.perf_counter()
+    ref_dates = reference_dates(part)
+    ref_months = reference_months(part["الشهر"], ref_dates)
+    rowwise_s = (time.perf_counter() - t) * rows / len(part)
+
+    same = dates.loc[part.index].equals(ref_dates) and months.loc[part.index].astype(object).equals(ref_months)
+    print(f"{rows:,} صف: عمودي {vector_s:.2f}s، صفّي (تقدير من {len(part):,} صف) {rowwise_s:.1f}s، "
+          f"×{rowwise_s / vector_s:.0f}، تطابق العيّنة: {same}")
+    return same
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:3]]
+    sys.exit(0 if main(*args) else 1)
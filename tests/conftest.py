@@ -0,0 +1,5 @@
+# -*- coding: utf-8 -*-
+# وحدات التطبيق في جذر المستودع (بدون حزمة)، فتُضاف للمسار قبل استيرادها في الاختبارات.
+import os, sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
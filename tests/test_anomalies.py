@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+# كاشف الارتفاعات: التحديث التدريجي (نسخ بيانات متتالية بأسطر مُلحقة، وآخر يوم مفتوح ناقص)
+# يصل إلى نفس الحالة والتنبيهات التي يعطيها البناء من الصفر على البيانات كاملة.
+import numpy as np
+import pandas as pd
+import pytest
+
+from ingestion import DATE_COL
+from anomalies import SERIES_KEYS, PROVIDER_COL, update_detector, anomaly_table, empty_detector
+
+@pytest.fixture(scope="module")
+def cube():
+    rng = np.random.default_rng(21)
+    rows = []
+    for provider, start in [("Reem", "2025-08-01"), ("Ahad", "2025-08-10"), ("Shouq", "2025-09-01")]:
+        days = pd.date_range(start, "2025-10-31")
+        for region in ["الوسطى", "الشرقية", None]:
+            for company in ["جي اويل", "ساسكو"]:
+                n = rng.poisson(4, len(days))
+                if provider == "Reem" and region == "الوسطى" and company == "ساسكو":
+                    n[days.get_loc(pd.Timestamp("2025-10-05"))] = 60        # ارتفاع واضح
+                rows += [(provider, region, company, "طلب خدمة", d, c) for d, c in zip(days, n) if c > 0]
+    return pd.DataFrame(rows, columns=SERIES_KEYS + [DATE_COL, "n"])
+
+def canonical(state):
+    keys = state["keys"].astype(str).agg("|".join, axis=1).to_numpy()
+    order = np.argsort(keys)
+    return keys[order], state["mu"][order], state["var"][order], state["days"][order]
+
+def sorted_flags(state):
+    return anomaly_table(state).sort_values(SERIES_KEYS + ["التاريخ"], kind="stable", ignore_index=True)
+
+def test_incremental_matches_rebuild(cube):
+    full = update_detector(None, cube)
+    state = None
+    for cut in ["2025-08-20", "2025-09-03", "2025-09-04", "2025-10-06", "2025-10-20"]:
+        part = cube[cube[DATE_COL] < cut]
+        # يوم القطع نفسه نصف خلاياه فقط: آخر يوم مفتوح تكتمل أسطره في النسخة التالية
+        day = cube[cube[DATE_COL] == cut]
+        state = update_detector(state, pd.concat([part, day.iloc[: len(day) // 2]]))
+        assert state["last_update"]["rebuilt"] == (cut == "2025-08-20")
+    state = update_detector(state, cube)
+    assert not state["last_update"]["rebuilt"]
+
+    a, b = canonical(full), canonical(state)
+    assert (a[0] == b[0]).all() and (a[3] == b[3]).all()
+    np.testing.assert_allclose(a[1], b[1])
+    np.testing.assert_allclose(a[2], b[2])
+    pd.testing.assert_frame_equal(sorted_flags(full), sorted_flags(state))
+
+def test_spike_is_flagged(cube):
+    table = anomaly_table(update_detector(None, cube))
+    spike = table[(table["التاريخ"] == pd.Timestamp("2025-10-05")) & (table["العدد"] == 60)]
+    assert len(spike) == 1 and spike["z"].iloc[0] >= 3
+    assert spike[PROVIDER_COL].iloc[0] == "Reem"
+
+def test_update_does_not_mutate_state(cube):
+    state = update_detector(None, cube[cube[DATE_COL] < "2025-10-01"])
+    before = {k: state[k].copy() for k in ("mu", "var", "days")}
+    folded, n_flags = dict(state["folded"]), len(state["flags"])
+    update_detector(state, cube)
+    for k, v in before.items():
+        np.testing.assert_array_equal(state[k], v)
+    assert state["folded"] == folded and len(state["flags"]) == n_flags
+
+def test_rewritten_history_rebuilds(cube):
+    state = update_detector(None, cube[cube[DATE_COL] < "2025-10-01"])
+    changed = cube.drop(index=cube.index[3])                  # صف من يوم مطوي حُذف
+    assert update_detector(state, changed)["last_update"]["rebuilt"]
+    assert update_detector(state, cube)["last_update"]["rebuilt"] is False
+
+def test_missing_columns():
+    state = update_detector(None, pd.DataFrame({"n": [1]}))
+    assert len(state["mu"]) == 0 and anomaly_table(state).empty
+    assert anomaly_table(empty_detector()).empty
@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+# فهرس التاريخ: نطاق أيام [من، إلى] شامل للطرفين بنفس نتيجة مقارنة العمود كاملًا،
+# لكل الصفوف ولكل مقدّم خدمة، والصفوف بلا تاريخ لا تدخل أي نطاق.
+import numpy as np
+import pandas as pd
+import pytest
+
+from ingestion import DATE_COL, build_date_index, rows_in_date_range
+
+RANGES = {"Reem": (0, 300), "Ahad": (300, 500)}
+
+@pytest.fixture(scope="module")
+def frame():
+    rng = np.random.default_rng(7)
+    days = pd.Timestamp("2025-08-01") + pd.to_timedelta(rng.integers(0, 92, 500), unit="D")
+    # ساعات داخل اليوم: النطاق باليوم كاملًا وليس عند منتصف الليل فقط
+    dates = pd.Series(days + pd.to_timedelta(rng.integers(0, 24, 500), unit="h"))
+    dates[rng.random(500) < 0.05] = pd.NaT
+    return pd.DataFrame({DATE_COL: dates})
+
+def expected_rows(frame, start, end, lo=0, hi=None):
+    d = frame[DATE_COL].dt.normalize()
+    mask = (d >= pd.Timestamp(start)) & (d <= pd.Timestamp(end))
+    rows = np.flatnonzero(mask.to_numpy())
+    return rows[(rows >= lo) & (rows < (len(frame) if hi is None else hi))]
+
+@pytest.mark.parametrize("start, end", [
+    ("2025-08-01", "2025-10-31"), ("2025-09-10", "2025-09-10"), ("2025-09-01", "2025-09-30"),
+    ("2025-07-01", "2025-07-31"), ("2025-10-15", "2025-12-31"),
+])
+def test_date_range_matches_mask(frame, start, end):
+    index = build_date_index(frame, RANGES)
+    assert np.array_equal(rows_in_date_range(index, "__ALL__", start, end), expected_rows(frame, start, end))
+    for provider, (lo, hi) in RANGES.items():
+        got = rows_in_date_range(index, provider, start, end)
+        assert np.array_equal(got, expected_rows(frame, start, end, lo, hi))
+
+def test_date_range_edge_cases(frame):
+    index = build_date_index(frame, RANGES)
+    assert len(rows_in_date_range(index, "__ALL__", "2025-09-30", "2025-09-01")) == 0   # من بعد إلى
+    assert len(rows_in_date_range(index, "Shouq", "2025-08-01", "2025-10-31")) == 0     # نطاق غير موجود
+    n_dated = frame[DATE_COL].notna().sum()
+    assert len(rows_in_date_range(index, "__ALL__", "2000-01-01", "2100-01-01")) == n_dated
+    assert build_date_index(frame.drop(columns=DATE_COL), RANGES) == {}
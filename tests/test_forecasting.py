@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+# التنبؤ: الملاءمة الدفعية لكل السلاسل (fit_month_batch) تطابق fit_month_forecast لكل سلسلة
+# على حدة، بما فيها السلاسل بأشهر ناقصة أو بشهر واحد. والاختبار الرجعي: توقعات كل نقاط القطع
+# دفعة واحدة تساوي توقع كل نقطة قطع من y[:t] وحدها (بدون تسرّب من المستقبل).
+import numpy as np
+import pandas as pd
+import pytest
+
+from ingestion import MONTH_ORDER
+from forecasting import (
+    BATCH_KEYS, fit_month_forecast, fit_month_batch, batch_month_forecast, month_matrix,
+    DATE_COL, GRANULARITIES, MODELS, holt_winters_grid, backtest, forecast_errors, fit_period_forecast,
+)
+
+@pytest.fixture(scope="module")
+def cube():
+    rng = np.random.default_rng(11)
+    rows = []
+    for provider in ["Reem", "Ahad", "Shouq"]:
+        for region in ["الوسطى", "الشرقية", None]:
+            for service in ["طلب خدمة", "شكوى"]:
+                # أشهر عشوائية من MONTH_ORDER (فجوات، وأحيانًا شهر واحد فقط)
+                months = rng.choice(MONTH_ORDER, size=rng.integers(1, len(MONTH_ORDER) + 1), replace=False)
+                for month in months:
+                    for _ in range(rng.integers(1, 3)):      # أكثر من خلية للشهر نفسه
+                        rows.append((provider, region, service, month, int(rng.integers(1, 40))))
+    return pd.DataFrame(rows, columns=BATCH_KEYS + ["الشهر", "n"])
+
+def test_batch_matches_per_series(cube):
+    table = batch_month_forecast(cube)
+    assert len(table) == len(cube.groupby(BATCH_KEYS, dropna=False))
+    assert table["الأشهر"].eq(1).any() and table["الأشهر"].gt(1).any()
+    for _, row in table.iterrows():
+        sel = np.ones(len(cube), dtype=bool)
+        for key in BATCH_KEYS:
+            sel &= cube[key].isna().to_numpy() if pd.isna(row[key]) else (cube[key] == row[key]).to_numpy()
+        fit = fit_month_forecast(cube[sel])
+        assert row["الأشهر"] == len(fit["months"])
+        assert row["آخر شهر"] == fit["months"][-1] and row["الشهر القادم"] == fit["next_month"]
+        if fit["pred"] is None:
+            assert np.isnan(row["التوقع"]) and np.isnan(row["الميل الشهري"])
+            continue
+        np.testing.assert_allclose(
+            [row["التوقع"], row["الميل الشهري"], row["الحد الأدنى"], row["الحد الأعلى"]],
+            [fit["pred"], fit["slope"], fit["ci_low"], fit["ci_high"]], rtol=1e-9, atol=1e-9,
+        )
+
+def test_fit_month_batch_exact_line():
+    # خط تام على أشهر متفرقة: الميل والتقاطع بالضبط و sigma = 0
+    Y = np.zeros((2, len(MONTH_ORDER)))
+    Y[0, [0, 2, 3]] = [10, 30, 40]
+    Y[1, 4] = 7
+    fit = fit_month_batch(Y)
+    np.testing.assert_allclose([fit["slope"][0], fit["intercept"][0], fit["sigma"][0], fit["pred"][0]], [10, 10, 0, 50],
+                               atol=1e-9)
+    assert list(fit["months"]) == [3, 1] and list(fit["last"]) == [3, 4]
+    assert np.isnan(fit["pred"][1])
+
+def test_month_matrix_empty():
+    labels, Y = month_matrix(pd.DataFrame(columns=BATCH_KEYS + ["الشهر", "n"]))
+    assert Y.shape == (0, len(MONTH_ORDER))
+    assert batch_month_forecast(pd.DataFrame(columns=BATCH_KEYS + ["الشهر", "n"])).empty
+
+@pytest.fixture(scope="module")
+def daily():
+    rng = np.random.default_rng(5)
+    t = np.arange(70)
+    return np.maximum(0, 20 + 0.2 * t + 8 * (t % 7 == 5) - 6 * (t % 7 == 4) + rng.normal(0, 3, len(t))).round()
+
+@pytest.mark.parametrize("name", sorted(MODELS))
+def test_models_use_only_past_values(daily, name):
+    period, horizon, min_train = GRANULARITIES["daily"]
+    origins = np.arange(min_train, len(daily) - horizon + 1)
+    fc = MODELS[name](daily, origins, horizon, period)
+    for i, t in enumerate(origins):
+        # القيم بعد نقطة القطع لا تغيّر توقعها
+        future = np.concatenate([daily[:t], np.full(len(daily) - t, 1e6)])
+        np.testing.assert_allclose(MODELS[name](future, np.array([t]), horizon, period)[0], fc[i])
+
+def test_holt_winters_uses_only_past_values(daily):
+    period, horizon, min_train = GRANULARITIES["daily"]
+    origins = np.arange(min_train, len(daily) - horizon + 1)
+    fc, params = holt_winters_grid(daily, origins, horizon, period)
+    for i in (0, len(origins) // 2, len(origins) - 1):
+        t = origins[i]
+        alone, alone_params = holt_winters_grid(daily[:t], np.array([t]), horizon, period)
+        np.testing.assert_array_equal(alone_params, params)
+        np.testing.assert_allclose(alone[:, 0], fc[:, i])
+
+def test_backtest_picks_exact_model():
+    y = 5 + 2 * np.arange(40, dtype=float)          # خط تام: الانجراف بلا خطأ
+    table, best = backtest(y)
+    assert best["model"] == "drift" and table.iloc[0]["mae"] == pytest.approx(0)
+    assert set(table["model"]) == {"naive", "seasonal_naive", "moving_average", "drift", "holt_winters"}
+    assert table["mae"].is_monotonic_increasing
+    assert table["origins"].iloc[0] == len(y) - 28 - 7 + 1
+    np.testing.assert_allclose(best["rmse"], 0, atol=1e-9)
+    assert "seasonal_naive" not in set(backtest(y, "weekly")[0]["model"])   # بدون موسمية أسبوعية
+    assert backtest(y[:34]) is None                                        # أقصر من تدريب + أفق
+
+def test_forecast_errors():
+    actual = np.array([[10.0, 0.0], [5.0, 20.0]])
+    fc = np.array([[12.0, 3.0], [5.0, 10.0]])
+    mae, mape = forecast_errors(actual, fc)
+    assert mae == pytest.approx(15 / 4)
+    assert mape == pytest.approx(100 * (0.2 + 0 + 0.5) / 3)      # اليوم الصفري لا يدخل MAPE
+
+def test_fit_period_forecast(daily):
+    days = pd.date_range("2025-08-01", periods=len(daily), freq="D")
+    cube = pd.DataFrame({DATE_COL: days.repeat(2), "n": np.repeat(daily, 2) / 2})
+    fit = fit_period_forecast(cube)
+    assert len(fit["pred"]) == 7 and (fit["pred"] >= 0).all()
+    assert fit["dates"][0] == days[-1] + pd.Timedelta(days=1)
+    assert (fit["ci_low"] <= fit["pred"]).all() and (fit["pred"] <= fit["ci_high"]).all()
+    assert fit["model"] == fit["backtest"].iloc[0]["model"]
+    assert fit_period_forecast(cube, "weekly") is None         # 10 أسابيع أقل من 8 تدريب + 4 أفق
@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+# تطابق التوحيد العمودي (normalize_month_column و build_date_column) مع الدوال الصفّية
+# السابقة: normalize_month_value محفوظة هنا كما كانت في app.py مرجعًا للمقارنة، و
+# build_date_from_month_day ما زالت في ingestion.py. القياس على مليون صف في bench_ingestion.py.
+# وفي الآخر: الجوال Int64 مع خاناته يحفظ الأصفار في أوله للعرض والبحث، في القراءة الكاملة
+# والمتدفّقة على السواء.
+import glob, itertools, os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from ingestion import (
+    MONTH_ORDER, MONTH_MAP, INV_MONTH_MAP, MONTH_SYNONYMS,
+    normalize_columns, normalize_month_column, build_date_column, build_date_from_month_day,
+    read_provider_csv, phone_to_int, phone_digits, PHONE_COL, PHONE_WIDTH_COL,
+    build_search_index, search_rows, prepare_provider_frame, stream_provider_csv,
+)
+import ingestion
+
+pytestmark = pytest.mark.filterwarnings("ignore:Parsing dates:UserWarning")
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+
+# قيم الشهر: لاتيني بأشكاله، عربي، أرقام، أشهر خارج MONTH_ORDER، فارغ و NaN
+MONTHS = [
+    "Aug", " aug ", "AUG", "August", "Sept", "Oct.", "october", "Dec", "DECEMBER",
+    "أغسطس", "اغسطس", "أكتوبر", "ديسمبر", "يوليو", "Jan", "January", "Jun",
+    "9", "10", 9, 10.0, "", "   ", "nan", "None", None, np.nan, "xyz", "Au",
+]
+# قيم التاريخ/اليوم: أرقام صحيحة، أيام خارج الشهر أو النطاق، تواريخ كاملة، أرقام عربية، NaN
+DAYS = [
+    "3", 3, 3.0, "15", "29", "30", "31", "0", "45", "7.5", " 12 ",
+    "15/09/2025", "2025-10-15", "31/09/2025", "1-8", "abc", "", "٣", None, np.nan,
+]
+
+def normalize_month_value(val, dt):
+    """المرجع: التوحيد الصفّي السابق (كما كان في app.py)."""
+    if pd.isna(val) or val is None:
+        if pd.notna(dt):
+            canon = INV_MONTH_MAP.get(int(dt.month))
+            return canon if canon and canon in MONTH_ORDER else np.nan
+        return np.nan
+    s = str(val).strip()
+    if not s or s.lower() in ["nan", "none", ""]:
+        if pd.notna(dt):
+            canon = INV_MONTH_MAP.get(int(dt.month))
+            return canon if canon and canon in MONTH_ORDER else np.nan
+        return np.nan
+    if s in MONTH_ORDER:
+        return s
+    s_lower = s.lower()
+    if s_lower in MONTH_SYNONYMS:
+        canon = MONTH_SYNONYMS[s_lower]
+        return canon if canon in MONTH_ORDER else np.nan
+    if len(s) >= 3:
+        s_3 = s[:3].title()
+        if s_3 in MONTH_MAP:
+            return s_3 if s_3 in MONTH_ORDER else np.nan
+    if pd.notna(dt):
+        canon = INV_MONTH_MAP.get(int(dt.month))
+        return canon if canon and canon in MONTH_ORDER else np.nan
+    return np.nan
+
+def reference_dates(df: pd.DataFrame) -> pd.Series:
+    return pd.to_datetime(df.apply(build_date_from_month_day, axis=1), errors="coerce")
+
+def reference_months(month: pd.Series, dates: pd.Series) -> pd.Series:
+    out = pd.Series([
+        normalize_month_value(m if pd.notna(m) else None, d if pd.notna(d) else pd.NaT)
+        for m, d in zip(month, dates)
+    ], index=month.index, dtype=object)
+    return out.where(out.isin(MONTH_ORDER), np.nan)
+
+def assert_same_months(got: pd.Series, expected: pd.Series):
+    pd.testing.assert_series_equal(got.astype(object), expected.astype(object), check_names=False)
+
+@pytest.fixture(scope="module")
+def grid():
+    """كل تركيبات (شهر، يوم)."""
+    pairs = list(itertools.product(MONTHS, DAYS))
+    return pd.DataFrame({
+        "الشهر": pd.Series([m for m, _ in pairs], dtype=object),
+        "التاريخ": pd.Series([d for _, d in pairs], dtype=object),
+    })
+
+def test_build_date_column_matches_rowwise(grid):
+    got = build_date_column(grid)
+    pd.testing.assert_series_equal(got, reference_dates(grid), check_names=False)
+
+def test_build_date_column_edge_values(grid):
+    got = build_date_column(grid)
+    at = lambda m, d: got[(grid["الشهر"].astype(str) == str(m)) & (grid["التاريخ"].astype(str) == str(d))].iloc[0]
+    assert at("Aug", "3") == pd.Timestamp(2025, 8, 3)
+    assert pd.isna(at("Sept", "3"))                           # التاريخ لا يقبل البادئة (الشهر يقبلها)
+    assert at("أكتوبر", "15") == pd.Timestamp(2025, 10, 15)
+    assert at("Aug", "0") == pd.Timestamp(2025, 8, 1)       # اليوم محصور في 1..31
+    assert at("Aug", "45") == pd.Timestamp(2025, 8, 31)
+    assert at("Aug", "abc") == pd.Timestamp(2025, 8, 1)
+    assert at("october", "31") == pd.Timestamp(2025, 10, 31)
+    assert pd.isna(at("9", "31"))                              # الشهر الرقمي لا يُقرأ
+    assert pd.isna(build_date_column(pd.DataFrame({"الشهر": ["Sep"], "التاريخ": ["31"]}))[0])   # 31 سبتمبر
+    assert at("xyz", "15/09/2025") == pd.Timestamp(2025, 9, 15)
+    assert pd.isna(at("xyz", "3"))
+
+def test_build_date_column_missing_columns():
+    frame = pd.DataFrame({"التاريخ": ["5", "2025-08-05"]})
+    pd.testing.assert_series_equal(build_date_column(frame), reference_dates(frame), check_names=False)
+    assert build_date_column(frame.iloc[:0]).empty
+
+def test_normalize_month_column_matches_rowwise(grid):
+    dates = build_date_column(grid)
+    assert_same_months(normalize_month_column(grid["الشهر"], dates), reference_months(grid["الشهر"], dates))
+
+def test_normalize_month_column_values():
+    month = pd.Series(["August", "أكتوبر", "Jan", "10", np.nan, "xyz"], dtype=object)
+    dates = pd.Series(pd.to_datetime(["2025-08-01", None, "2025-01-05", "2025-10-02", "2025-09-09", None]))
+    got = normalize_month_column(month, dates)
+    assert_same_months(got, pd.Series(["Aug", "Oct", np.nan, "Oct", "Sep", np.nan], dtype=object))
+    assert_same_months(got, reference_months(month, dates))
+
+@pytest.mark.parametrize("path", sorted(glob.glob(os.path.join(DATA_DIR, "*.csv"))), ids=os.path.basename)
+def test_provider_files_match_rowwise(path):
+    df = read_provider_csv(path)[0]
+    df = normalize_columns(df.dropna(how="all"))
+    dates = build_date_column(df)
+    pd.testing.assert_series_equal(dates, reference_dates(df), check_names=False)
+    if "الشهر" in df.columns:
+        assert_same_months(normalize_month_column(df["الشهر"], dates), reference_months(df["الشهر"], dates))
+
+def test_phone_keeps_leading_zeros():
+    raw = pd.Series(["0501234567", "501234567", "+966 50 123 4567", "9.66113E+11", "00", "شات", np.nan], dtype=object)
+    phones, widths = phone_to_int(raw)
+    assert phones.dtype == "Int64" and widths.dtype == np.uint8
+    assert phones[0] == phones[1] == 501234567
+    assert list(phone_digits(phones, widths)[:5]) == ["0501234567", "501234567", "966501234567", "966113000000", "00"]
+    assert phones[5:].isna().all() and pd.isna(phone_digits(phones, widths)[5:]).all()
+
+def test_phone_search_matches_leading_zeros():
+    phones, widths = phone_to_int(pd.Series(["0501234567", "501234567", "0555000111", None], dtype=object))
+    df = pd.DataFrame({PHONE_COL: phones, PHONE_WIDTH_COL: widths, "الشركة": ["أ", "ب", "ج", "د"]})
+    index = build_search_index(df)
+    assert list(search_rows(index, "0501")) == [0]
+    assert list(search_rows(index, "05")) == [0, 2]
+    assert list(search_rows(index, "5012")) == [0, 1]
+
+def write_digit_phones_csv(path, rows=400):
+    """ملف أعمدة الجوال فيه أرقام فقط بأصفار في أولها؛ النصف الثاني أغلبه فارغ (يستنتجه pandas float)."""
+    header = "اسم العميل ,رقم الجوال ,المنطقة,المدينه ,الشركة,نوع الخدمة,الخدمه المطلوبه,المسؤول,الملاحظات,الشهر,التاريخ \n"
+    lines = []
+    for i in range(rows):
+        phone = f"05{i:08d}" if i < rows // 2 or i % 50 == 0 else ""
+        lines.append(f"عميل {i},{phone},الوسطى,الرياض,جي اويل,طلب خدمة,استئجار,حازم,,Oct,{i % 28 + 1}\n")
+    path.write_text(header + "".join(lines), encoding="utf-8")
+    return path
+
+def test_digit_phone_file_keeps_widths(tmp_path):
+    path = write_digit_phones_csv(tmp_path / "Digits.csv")
+    df = prepare_provider_frame(read_provider_csv(str(path))[0], "Digits")
+    assert (df[PHONE_WIDTH_COL][df[PHONE_COL].notna()] == 10).all()
+    assert phone_digits(df[PHONE_COL], df[PHONE_WIDTH_COL])[0] == "0500000000"
+    assert list(search_rows(build_search_index(df), "0500000001")) == [1]
+
+def test_streamed_phone_widths_match_full_read(tmp_path, monkeypatch):
+    path = write_digit_phones_csv(tmp_path / "Digits.csv")
+    full = prepare_provider_frame(read_provider_csv(str(path))[0], "Digits")
+    monkeypatch.setattr(ingestion, "stream_block_bytes", lambda: 4096)   # أجزاء كثيرة صغيرة
+    streamed = stream_provider_csv(str(path), "Digits")[0]
+    pd.testing.assert_series_equal(streamed[PHONE_WIDTH_COL], full[PHONE_WIDTH_COL])
+    pd.testing.assert_series_equal(streamed[PHONE_COL], full[PHONE_COL])
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+# فهرس الصفوف ومكعب العدّ يعطيان نفس نتيجة التصفية بالقناع على الإطار كاملًا:
+# اتحاد قيم العمود الواحد، وتقاطع الأعمدة، وقصر النتيجة على مديات مقدّمي الخدمة.
+import numpy as np
+import pandas as pd
+import pytest
+
+from ingestion import (
+    build_row_index, rows_in_ranges, union_rows, intersect_rows, build_count_cube,
+)
+
+@pytest.fixture(scope="module")
+def frame():
+    rng = np.random.default_rng(3)
+    n = 2000
+    region = np.array(["الوسطى", "الشرقية", "الغربية", None], dtype=object)[rng.integers(0, 4, n)]
+    return pd.DataFrame({
+        # مقدّمو الخدمة مديات متصلة كما في "__ALL__"
+        "مقدم الخدمة (ملف)": pd.Categorical(np.repeat(["Reem", "Ahad", "Shouq"], [700, 500, 800])),
+        "الشهر": pd.Categorical(np.array(["Aug", "Sep", "Oct"])[rng.integers(0, 3, n)]),
+        "المنطقة": pd.Categorical(region),
+        "نوع الخدمة": np.array(["طلب خدمة", "شكوى", "استفسار"], dtype=object)[rng.integers(0, 3, n)],
+    })
+
+RANGES = {"Reem": (0, 700), "Ahad": (700, 1200), "Shouq": (1200, 2000)}
+
+def test_row_index_postings(frame):
+    index = build_row_index(frame)
+    assert set(index) == {"الشهر", "المنطقة", "نوع الخدمة"}
+    for col, postings in index.items():
+        for value, rows in postings.items():
+            assert np.array_equal(rows, np.flatnonzero((frame[col] == value).to_numpy()))
+    assert sum(len(r) for r in index["المنطقة"].values()) == frame["المنطقة"].notna().sum()
+
+def test_union_intersect_match_masks(frame):
+    index = build_row_index(frame)
+    months = union_rows([index["الشهر"]["Aug"], index["الشهر"]["Oct"]])
+    regions = union_rows([index["المنطقة"]["الشرقية"]])
+    services = union_rows([index["نوع الخدمة"][v] for v in ["شكوى", "استفسار"]])
+    got = rows_in_ranges(intersect_rows(months, regions, services), [RANGES["Reem"], RANGES["Shouq"]])
+
+    mask = (frame["الشهر"].isin(["Aug", "Oct"]) & (frame["المنطقة"] == "الشرقية")
+            & frame["نوع الخدمة"].isin(["شكوى", "استفسار"])
+            & frame["مقدم الخدمة (ملف)"].isin(["Reem", "Shouq"]))
+    assert np.array_equal(got, np.flatnonzero(mask.to_numpy()))
+    assert np.all(np.diff(got) > 0)
+
+def test_union_intersect_edge_cases():
+    empty = np.empty(0, dtype=np.int32)
+    a = np.array([1, 4, 9], dtype=np.int32)
+    assert len(union_rows([])) == 0
+    assert union_rows([empty, a]) is a
+    assert np.array_equal(union_rows([a, np.array([2, 5])]), [1, 2, 4, 5, 9])
+    assert np.array_equal(intersect_rows(a), a)
+    assert np.array_equal(intersect_rows(a, np.array([0, 4, 9, 12])), [4, 9])
+    assert len(intersect_rows(a, empty)) == 0
+    assert len(rows_in_ranges(a, [])) == 0
+
+def test_count_cube_matches_rows(frame):
+    cube = build_count_cube(frame)
+    assert cube["n"].sum() == len(frame)
+    # الفراغ خلية مستقلة
+    assert cube.loc[cube["المنطقة"].isna(), "n"].sum() == frame["المنطقة"].isna().sum()
+    got = cube[cube["الشهر"] == "Sep"].groupby("مقدم الخدمة (ملف)", observed=True)["n"].sum()
+    expected = frame[frame["الشهر"] == "Sep"].groupby("مقدم الخدمة (ملف)", observed=True).size()
+    pd.testing.assert_series_equal(got, expected, check_names=False)
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+# فهرس البحث العربي: الهمزات والتاء المربوطة والألف المقصورة والتشكيل والأرقام العربية
+# تُوحَّد في الفهرس والاستعلام، وكل كلمة في الاستعلام تطابق بداية كلمة (لا وسطها).
+import numpy as np
+import pandas as pd
+import pytest
+
+from ingestion import build_search_index, search_rows, normalize_search_text, query_tokens
+
+@pytest.fixture(scope="module")
+def index():
+    df = pd.DataFrame({
+        "اسم العميل": ["أحمد علي", "احمد سالم", "إيمان", "مُحَمَّد", "عميل", "مصطفى"],
+        "المدينة": pd.Categorical(["مكة", "مكه", "الرياض", "لتبوك", "والرياض", "جدة"]),
+        "الشركة": ["جي اويل", "ساسكو", "جي اويل", "ساسكو", "الدريس", "ساسكو"],
+        "الخدمه المطلوبه": ["طلب ٣ محطات", "استئجار", None, "شكوى", "طلب خدمة", "استفسار"],
+    })
+    return build_search_index(df)
+
+def hits(index, query):
+    return list(search_rows(index, query))
+
+def test_normalize_search_text():
+    assert normalize_search_text("أإآٱ") == "اااا"
+    assert normalize_search_text("مكة مصطفى") == "مكه مصطفي"
+    assert normalize_search_text("مُحَمَّـد") == "محمد"
+    assert normalize_search_text("٣٤ ۵") == "34 5"
+    assert query_tokens("أحمد  احمد، علي") == ["احمد", "علي"]
+
+@pytest.mark.parametrize("query, expected", [
+    ("احمد", [0, 1]), ("أحمد", [0, 1]), ("إحمد", [0, 1]),        # الهمزات
+    ("مكة", [0, 1]), ("مكه", [0, 1]),                           # التاء المربوطة
+    ("مصطفي", [5]), ("ايمان", [2]), ("محمد", [3]),               # الألف المقصورة والتشكيل
+    ("3", [0]), ("٣", [0]),                                      # الأرقام العربية
+    ("الري", [2, 4]), ("رياض", [2, 4]), ("تبوك", [3]),           # البادئة والسوابق الملتصقة
+    ("احمد ساسكو", [1]), ("جي اويل ايمان", [2]),                   # الكلمات معًا تتقاطع
+])
+def test_folded_prefix_search(index, query, expected):
+    assert hits(index, query) == expected
+
+def test_search_matches_word_starts_only(index):
+    assert hits(index, "ياض") == []          # وسط الكلمة لا يطابق
+    assert hits(index, "مد") == []
+    assert hits(index, "احمد غير") == []
+    assert search_rows(index, "  ،، ") is None
+    assert isinstance(search_rows(index, "ساسكو"), np.ndarray)
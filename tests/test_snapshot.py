@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+# اللقطات العمودية: إطار المقدّم يرجع من data/.snapshot كما كُتب تمامًا (أنواع الأعمدة
+# والفراغات والفئات)، و manifest لا يُعتمد إذا تغيّر ملف المصدر أو نسخة المعالجة.
+import os, shutil
+
+import pandas as pd
+import pytest
+
+pytest.importorskip("pyarrow")
+
+import ingestion
+from ingestion import (
+    load_provider_file, write_snapshot, read_snapshot, frame_to_arrow_bytes,
+    read_snapshot_manifest, write_snapshot_manifest, file_fingerprint,
+)
+
+pytestmark = pytest.mark.filterwarnings("ignore:Parsing dates:UserWarning")
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+
+@pytest.fixture()
+def provider_csv(tmp_path):
+    path = tmp_path / "Reem.csv"
+    shutil.copy(os.path.join(DATA_DIR, "Reem.csv"), path)
+    return str(path)
+
+def test_snapshot_round_trip(provider_csv, tmp_path):
+    provider, df, _, _ = load_provider_file(provider_csv)
+    name = write_snapshot(str(tmp_path), provider, df)
+    assert name == "Reem.arrow"
+    pd.testing.assert_frame_equal(read_snapshot(str(tmp_path), name), df)
+    # بايتات Arrow الجاهزة من عامل التحميل تُكتب كما هي
+    write_snapshot(str(tmp_path), provider, frame_to_arrow_bytes(df))
+    pd.testing.assert_frame_equal(read_snapshot(str(tmp_path), name), df)
+
+def test_manifest_mismatch_forces_reparse(provider_csv, tmp_path, monkeypatch):
+    folder = str(tmp_path)
+    provider, df, messages, bad_lines = load_provider_file(provider_csv)
+    fp = file_fingerprint(provider_csv)
+    write_snapshot_manifest(folder, {"Reem.csv": {
+        "hash": fp["hash"], "size": fp["size"], "provider": provider,
+        "snapshot": write_snapshot(folder, provider, df), "messages": messages, "bad_lines": bad_lines,
+    }})
+    assert read_snapshot_manifest(folder)["Reem.csv"]["hash"] == fp["hash"]
+
+    # تعديل ملف المصدر: البصمة لا تطابق اللقطة، والقراءة من CSV ترى الصف الجديد
+    with open(provider_csv, "a", encoding="utf-8") as f:
+        f.write("عميل جديد,0551112222,الوسطى,الرياض,جي اويل,طلب خدمة,استئجار,حازم,,Oct,20\n")
+    assert file_fingerprint(provider_csv)["hash"] != read_snapshot_manifest(folder)["Reem.csv"]["hash"]
+    assert len(load_provider_file(provider_csv)[1]) == len(df) + 1
+
+    # نسخة معالجة مختلفة: الـ manifest كله يُتجاهل
+    monkeypatch.setattr(ingestion, "INGEST_PIPELINE_VERSION", ingestion.INGEST_PIPELINE_VERSION + 1)
+    assert read_snapshot_manifest(folder) == {}
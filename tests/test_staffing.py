@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+# Erlang C: قيمة معروفة (10 Erlang، AHT 180 ث، هدف 80% خلال 20 ث -> 14 موظفًا بمستوى 88.8%)،
+# ومطابقة التكرار مع الصيغة المباشرة A^N/N! لكل فترة، والحمل غير المنتهي لا يعلّق الحساب.
+import math
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from staffing import offered_load, service_level, required_agents, staffing_table
+
+def reference_erlang_c(A, N):
+    """الصيغة المباشرة (صالحة لأعداد صغيرة فقط)."""
+    top = A ** N / math.factorial(N) * N / (N - A)
+    return top / (sum(A ** k / math.factorial(k) for k in range(N)) + top)
+
+def reference_agents(A, aht, target, answer):
+    N = math.floor(A) + 1
+    while True:
+        C = reference_erlang_c(A, N)
+        sl = 1 - C * math.exp(-(N - A) * answer / aht)
+        if sl >= target:
+            return N, C, sl
+        N += 1
+
+def test_known_erlang_c_value():
+    need = required_agents(10, 180, 0.8, 20)
+    assert int(need["agents"]) == 14
+    assert float(need["service_level"]) == pytest.approx(0.888, abs=5e-4)
+    assert float(need["prob_wait"]) == pytest.approx(reference_erlang_c(10, 14))
+    assert float(need["occupancy"]) == pytest.approx(10 / 14)
+    assert float(need["asa"]) == pytest.approx(reference_erlang_c(10, 14) * 180 / 4)
+
+@pytest.mark.parametrize("aht, target, answer", [(180, 0.8, 20), (240, 0.9, 30), (300, 0.95, 10)])
+def test_matches_direct_formula(aht, target, answer):
+    loads = np.array([0.05, 0.5, 1.0, 2.7, 7.5, 10.0, 23.4])
+    need = required_agents(loads, aht, target, answer)
+    for i, A in enumerate(loads):
+        N, C, sl = reference_agents(A, aht, target, answer)
+        assert need["agents"][i] == N
+        assert need["prob_wait"][i] == pytest.approx(C)
+        assert need["service_level"][i] == pytest.approx(sl)
+
+def test_non_finite_and_empty_loads():
+    need = required_agents([np.nan, np.inf, 0.0, -1.0, 2.0], target=1.0)      # هدف 100% يُقصّ إلى 99.9%
+    assert list(need["agents"][:4]) == [0, 0, 0, 0] and need["agents"][4] > 2
+    assert np.isnan(need["service_level"][:2]).all() and need["service_level"][2] == 1.0
+    assert need["service_level"][4] >= 0.999
+    assert required_agents(np.array([]))["agents"].shape == (0,)
+
+def test_service_level_below_load_is_zero():
+    assert service_level(5.0, 5, 1.0, 180, 20) == 0.0
+    assert service_level(5.0, 4, 1.0, 180, 20) == 0.0
+
+def test_staffing_table():
+    dates = pd.date_range("2025-10-20", periods=3)
+    table = staffing_table(dates, [400, 0, 800], aht_seconds=180, open_hours=8, calls_high=[500, 10, 900])
+    assert table["الحمل (Erlang)"].tolist() == pytest.approx(offered_load([400, 0, 800], 180, 8 * 3600).tolist())
+    assert table["الموظفون المطلوبون"].tolist()[1] == 0
+    assert (table["الموظفون (للحد الأعلى)"] >= table["الموظفون المطلوبون"]).all()
+    assert (table.loc[[0, 2], "مستوى الخدمة %"] >= 80).all()
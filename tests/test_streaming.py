@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+# تقسيم ملفات CSV الكبيرة إلى أجزاء من سجلات كاملة (iter_csv_blocks).
+import io, logging
+
+from ingestion import iter_csv_blocks
+
+HEADER = "اسم العميل,رقم الجوال,المنطقة,الشهر,التاريخ\n"
+
+def _rows(n, start=0):
+    return "".join(f"عميل {i},5{i:08d},المنطقة الوسطى,Aug,{i % 28 + 1}\n" for i in range(start, start + n))
+
+def _blocks(data, block_bytes, **kw):
+    return list(iter_csv_blocks(io.BytesIO(data), block_bytes, **kw))
+
+def test_blocks_cover_file_and_count_lines():
+    data = (HEADER + _rows(500)).encode("utf-8")
+    blocks = _blocks(data, 1000)
+    assert len(blocks) > 5
+    assert b"".join(b for _, b in blocks) == data
+    for (before, block), (after, _) in zip(blocks, blocks[1:]):
+        assert block.endswith(b"\n")
+        assert after == before + block.count(b"\n")
+
+def test_quoted_newline_stays_in_one_block():
+    field = '"سطر أول\nسطر ثان\nسطر ثالث"'
+    data = (HEADER + _rows(40) + f"عميل,500000000,{field},Aug,3\n" + _rows(40, 40)).encode("utf-8")
+    for block_bytes in (64, 100, 333, 1000):
+        blocks = _blocks(data, block_bytes)
+        assert b"".join(b for _, b in blocks) == data
+        assert all(b.count(b'"') % 2 == 0 for _, b in blocks)
+
+def test_stray_quote_caps_carry(caplog):
+    # علامة " بلا إغلاق: بدون السقف تُحمل بقية الملف كلها مع كل جزء
+    data = (HEADER + _rows(20) + 'عميل "شارد,500000000,الوسطى,Aug,3\n' + _rows(5000, 20)).encode("utf-8")
+    block_bytes, max_carry = 1000, 4
+    with caplog.at_level(logging.WARNING, logger="ingestion"):
+        blocks = _blocks(data, block_bytes, max_carry_blocks=max_carry)
+    assert b"".join(b for _, b in blocks) == data
+    assert len(blocks) > len(data) // ((max_carry + 1) * block_bytes)
+    assert max(len(b) for _, b in blocks) <= (max_carry + 1) * block_bytes
+    assert all(b.endswith(b"\n") for _, b in blocks)
+    assert any("تنصيص" in r.getMessage() for r in caplog.records)